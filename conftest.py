@@ -0,0 +1,24 @@
+import pytest
+from django.core.cache import caches
+
+from pra_app.genres import genre_registry
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """
+    Cached pages and their tag versions live in the (process wide) caches, and the genres in the genre
+    registry, so they would otherwise leak from one test into the next one
+    """
+    for cache in caches.all():
+        cache.clear()
+    genre_registry.reset()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def raise_on_repeated_queries(settings):
+    """
+    Pages running N+1 queries fail the tests requesting them (see pra_app.querycheck)
+    """
+    settings.PRA_QUERY_CHECK = 'raise'
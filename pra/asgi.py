@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pra.settings')
+# the read only views have async variants, see PRA_ASYNC_VIEWS in the settings
+os.environ.setdefault('PRA_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,134 @@
+"""
+Database configuration read from the environment, and the connection pools of the pooled PostgreSQL backend.
+
+Without a pool, connections are kept open between requests for PRA_DB_CONN_MAX_AGE seconds and checked before
+being reused. With PRA_DB_POOL=1 the pra.db_backends.pooled_postgresql backend takes the connections from an
+in-process psycopg pool instead (a pool per database alias and process), which also keeps the connections of the
+ASGI entry point, where every request gets a new thread, from being opened anew for each request.
+
+    PRA_DB_ENGINE              database backend (default django.db.backends.postgresql)
+    PRA_DB_NAME, PRA_DB_HOST, PRA_DB_PORT, PRA_DB_USER, PRA_DB_PASSWORD     where to connect
+    PRA_DB_CONN_MAX_AGE        seconds to keep a connection open, 'none' for unlimited (default 60)
+    PRA_DB_CONN_HEALTH_CHECKS  check persistent connections before reusing them (default 1)
+    PRA_DB_POOL                use the pool (default 0)
+    PRA_DB_POOL_MIN_SIZE       connections the pool keeps open (default 2)
+    PRA_DB_POOL_MAX_SIZE       connections the pool opens at most (default 10)
+    PRA_DB_POOL_TIMEOUT        seconds to wait for a free connection before failing (default 30)
+    PRA_DB_POOL_MAX_IDLE       seconds before idle connections above the minimum are closed (default 600)
+
+Read replicas are listed in PRA_DB_REPLICAS (comma separated aliases, e.g. replica1,replica2). A replica takes
+its settings from the same variables with the alias in the prefix (PRA_DB_REPLICA1_HOST, ...), falling back to
+the ones of the primary, plus PRA_DB_<ALIAS>_WEIGHT, its share of the reads (default 1), see pra_app.routers.
+"""
+import os
+import threading
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def database_from_env(environ=None, prefix='PRA_DB_'):
+    """
+    Returns the settings of one database (an entry of DATABASES) from the environment variables above
+    """
+    environ = os.environ if environ is None else environ
+
+    def get(name, default):
+        # the settings of replicas fall back to the ones of the primary
+        return environ.get(prefix + name, environ.get('PRA_DB_' + name, default))
+
+    def flag(name, default):
+        return str(get(name, default)).lower() in ('1', 'true', 'yes', 'on')
+
+    conn_max_age = get('CONN_MAX_AGE', '60')
+    database = {
+        'ENGINE': get('ENGINE', 'django.db.backends.postgresql'),
+        'NAME': get('NAME', 'pra_app'),
+        'HOST': get('HOST', 'localhost'),
+        'PORT': int(get('PORT', '5432')),
+        'USER': get('USER', 'postgres'),
+        'PASSWORD': get('PASSWORD', 'coderslab'),
+        'CONN_MAX_AGE': None if conn_max_age.lower() == 'none' else int(conn_max_age),
+        'CONN_HEALTH_CHECKS': flag('CONN_HEALTH_CHECKS', True),
+    }
+    if flag('POOL', False):
+        # connections go back to the pool when Django closes them, the pool checks them before handing them out
+        database.update(ENGINE='pra.db_backends.pooled_postgresql', CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+        database['OPTIONS'] = {'pool': {
+            'min_size': int(get('POOL_MIN_SIZE', '2')),
+            'max_size': int(get('POOL_MAX_SIZE', '10')),
+            'timeout': float(get('POOL_TIMEOUT', '30')),
+            'max_idle': float(get('POOL_MAX_IDLE', '600')),
+        }}
+    return database
+
+
+def replica_aliases(environ=None):
+    environ = os.environ if environ is None else environ
+    return [alias.strip() for alias in environ.get('PRA_DB_REPLICAS', '').split(',') if alias.strip()]
+
+
+def replicas_from_env(environ=None):
+    """
+    Returns the settings of the read replicas, by alias, to be added to DATABASES next to the primary
+    """
+    replicas = {}
+    for alias in replica_aliases(environ):
+        replicas[alias] = database_from_env(environ, prefix=f'PRA_DB_{alias.upper()}_')
+        # tests read the replicas through the connection to the test database of the primary
+        replicas[alias]['TEST'] = {'MIRROR': 'default'}
+    return replicas
+
+
+def replica_weights_from_env(environ=None):
+    """
+    Returns the share of the reads of every replica, by alias (the PRA_DB_REPLICAS setting)
+    """
+    environ = os.environ if environ is None else environ
+    return {alias: int(environ.get(f'PRA_DB_{alias.upper()}_WEIGHT', '1')) for alias in replica_aliases(environ)}
+
+
+def get_pool(alias, create=None):
+    """
+    Returns the pool of the database alias, created with create() the first time it is asked for
+    """
+    with _pools_lock:
+        if alias not in _pools and create is not None:
+            _pools[alias] = create()
+        return _pools.get(alias)
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """
+    Returns the sizes and counters of the pools of this process, by database alias: connections open, in use
+    and idle, requests waiting for a connection, connections created since the start and requests that timed out
+    """
+    with _pools_lock:
+        pools = dict(_pools)
+    stats = {}
+    for alias, pool in pools.items():
+        # psycopg_pool leaves out the counters that are still zero
+        counters = pool.get_stats()
+        size = counters.get('pool_size', 0)
+        available = counters.get('pool_available', 0)
+        stats[alias] = {
+            'min_size': pool.min_size,
+            'max_size': pool.max_size,
+            'size': size,
+            'in_use': size - available,
+            'idle': available,
+            'waiting': counters.get('requests_waiting', 0),
+            'created': counters.get('connections_num', 0),
+            'requests': counters.get('requests_num', 0),
+            'wait_ms': counters.get('requests_wait_ms', 0),
+            'timeouts': counters.get('requests_errors', 0),
+        }
+    return stats
@@ -0,0 +1,56 @@
+"""
+PostgreSQL backend taking its connections from an in-process psycopg_pool.ConnectionPool (psycopg 3 only).
+
+The pool is configured with OPTIONS['pool'] (min_size, max_size, timeout, max_idle and the other arguments of
+ConnectionPool), see pra.database. Closing a connection gives it back to the pool, so CONN_MAX_AGE has to be 0.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+
+from pra.database import get_pool
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        if not is_psycopg3 or ConnectionPool is None:
+            raise ImproperlyConfigured('The pooled PostgreSQL backend requires psycopg 3 and psycopg_pool')
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured('Pooled connections are given back after every request, set CONN_MAX_AGE to 0')
+
+        pool = get_pool(self.alias, lambda: self.create_pool(conn_params))
+        connection = pool.getconn()
+        # same isolation level handling as the postgresql backend
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        try:
+            self.isolation_level = IsolationLevel(isolation_level or IsolationLevel.READ_COMMITTED)
+        except ValueError:
+            pool.putconn(connection)
+            raise ImproperlyConfigured(f'Invalid transaction isolation level {isolation_level} specified.')
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def create_pool(self, conn_params):
+        options = {'min_size': 2, 'max_size': 10, 'timeout': 30, **self.settings_dict['OPTIONS'].get('pool', {})}
+        # check_connection makes sure a connection still works before it is handed out
+        return ConnectionPool(kwargs=conn_params, name=self.alias, check=ConnectionPool.check_connection,
+                              open=True, **options)
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # the pool rolls back what is left open and drops broken connections
+                get_pool(self.alias).putconn(self.connection)
+            self.connection = None
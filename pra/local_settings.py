@@ -1,12 +1,8 @@
-# Database
-# https://docs.djangoproject.com/en/2.1/ref/settings/#databases
+from pra.database import database_from_env, replicas_from_env
+
+# Database and its read replicas, configured with the PRA_DB_* environment variables (see pra/database.py)
+# https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'pra_app',
-        'HOST': 'localhost',
-        'PASSWORD': 'coderslab',
-        'USER': 'postgres',
-        'PORT': 5432
-    }
+    'default': database_from_env(),
+    **replicas_from_env(),
 }
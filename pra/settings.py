@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
+from pra.database import replica_weights_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -39,13 +43,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'pra_app.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
+    'pra_app.querycheck.repeated_query_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'pra_app.routers.primary_stickiness_middleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'pra_app.profiling.profiling_middleware',
 ]
 
 ROOT_URLCONF = 'pra.urls'
@@ -112,6 +120,102 @@ APPEND_SLASH = False
 
 STATIC_URL = 'static/'
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The 'default' cache is kept by every process for itself. The 'shared' one is read and written by all the workers
+# of the host (file-based, in PRA_CACHE_DIR), Redis or Memcached can take its place for several hosts
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pra',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('PRA_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'pra_cache'),
+    },
+}
+
+# Cache of the rendered catalog pages, see pra_app.cache (None turns it off). The pages and the versions of their
+# tags have to be in a cache shared by all workers, so a write made through one of them invalidates the pages of
+# all of them: a local-memory cache is only used with 'PER_PROCESS': True (a single process, e.g. runserver)
+
+PRA_RESPONSE_CACHE = {
+    'ALIAS': 'shared',
+    'TIMEOUT': 300,
+}
+
+# Search backend (dotted path to a pra_app.search.BaseSearchBackend subclass)
+# None picks the full-text search backend on PostgreSQL and the in-memory index on other databases
+
+PRA_SEARCH_BACKEND = None
+
+# Keyset pagination of the game and movie lists (no COUNT(*) and no OFFSET), see pra_app.pagination
+# When off, lists can still be paged this way with ?paginate=cursor
+
+PRA_CURSOR_PAGINATION = False
+
+# Serve the read only pages with their async variants (see pra_app.async_views), turned on by pra/asgi.py
+# so that the ASGI entry point does not tie up a thread per request
+
+PRA_ASYNC_VIEWS = os.environ.get('PRA_ASYNC_VIEWS', '') == '1'
+
+# Read replicas of the default database (alias -> share of the reads), the reads of the app's models are spread
+# over them by pra_app.routers.ReplicaRouter. Configured with PRA_DB_REPLICAS (see pra/database.py), none by default
+
+PRA_DB_REPLICAS = replica_weights_from_env()
+
+DATABASE_ROUTERS = ['pra_app.routers.ReplicaRouter']
+
+# Seconds during which the reads of a client that just wrote something go to the default database,
+# so that it sees its own writes despite the replication lag
+
+PRA_DB_REPLICA_STICKINESS = 10
+
+# Leaderboards of the best rated games and movies (see pra_app.leaderboards): the weighted rating of a title
+# counts this many reviews at the average rating of all titles of its kind next to its own reviews
+
+PRA_LEADERBOARD_MIN_REVIEWS = 5
+
+# Seconds between the checks of the genre registry of the forms against the database (see pra_app.genres): a genre
+# added through one worker is listed by the others at most this late
+
+PRA_GENRE_REGISTRY_CHECK_INTERVAL = 5
+
+# Seconds the title counts of the genre pages are cached (see pra_app.genres), the longest the processes that did
+# not make a change show the old counts with a cache that is not shared
+
+PRA_GENRE_COUNTS_TIMEOUT = 60
+
+# Request and SQL timings exposed at /metrics in the Prometheus text format (see pra_app.metrics), turned on with
+# PRA_METRICS=1. With PRA_METRICS_DIR the worker processes keep their values in files in that directory (emptied
+# when the server starts), so /metrics shows the values of all of them; without it each process shows its own
+
+PRA_METRICS = os.environ.get('PRA_METRICS', '') == '1'
+
+PRA_METRICS_DIR = os.environ.get('PRA_METRICS_DIR') or None
+
+# Detection of N+1 queries (see pra_app.querycheck): 'log' warns about the queries a request repeats with other
+# parameters PRA_QUERY_CHECK_THRESHOLD times or more, 'raise' fails the request (used by the tests), None turns the
+# check off
+
+PRA_QUERY_CHECK = os.environ.get('PRA_QUERY_CHECK') or None
+
+PRA_QUERY_CHECK_THRESHOLD = 3
+
+# Tools for slow pages, all off by default (see pra_app.profiling): a Server-Timing header splitting the time of
+# every response into SQL, templates and the rest, profiling of a request by staff members with ?profile=1
+# (the raw profiles are stored in PRA_PROFILE_DIR if set), and a log of the queries slower than PRA_SLOW_QUERY_MS
+# milliseconds with their EXPLAIN plan
+
+PRA_SERVER_TIMING = os.environ.get('PRA_SERVER_TIMING', '') == '1'
+
+PRA_PROFILING = os.environ.get('PRA_PROFILING', '') == '1'
+
+PRA_PROFILE_DIR = os.environ.get('PRA_PROFILE_DIR') or None
+
+PRA_SLOW_QUERY_MS = float(os.environ['PRA_SLOW_QUERY_MS']) if os.environ.get('PRA_SLOW_QUERY_MS') else None
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
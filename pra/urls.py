@@ -14,18 +14,24 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.views import LogoutView
-from django.urls import path
+from django.urls import path, re_path
 
+from pra_app.async_views import ASYNC_VARIANTS, swap_views
+from pra_app.api import GameApiView, MovieApiView, GenreApiView, ReviewApiView
 from pra_app.views import LandingPageView, LoginView, GamesView, MoviesView, RegisterView, AddGameReviewView, \
     GameDetailsView, ViewGameReviewsView, GameAddView, MovieDetailsView, MovieReviewAddView, MovieReviewsView, \
-    MovieAddView, AddGenreView, SearchResultsView, GameEditView, MovieEditView
+    MovieAddView, AddGenreView, SearchResultsView, GameEditView, MovieEditView, AutocompleteView, \
+    CacheStatsView, UserHeaderView, ExportView, DatabasePoolStatsView, LeaderboardView, \
+    GenresView, GenreDetailsView, MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', LandingPageView.as_view(), name='main'),
     path('login/', LoginView.as_view(), name='login'),
+    path('user-header/', UserHeaderView.as_view(), name='user_header'),
     path('games/', GamesView.as_view(), name='game_list'),
     path('games/<game_id>', GameDetailsView.as_view(), name='game_details'),
     path('view-game-reviews/<game_id>', ViewGameReviewsView.as_view(), name='view_game_reviews'),
@@ -39,8 +45,29 @@ urlpatterns = [
     path('movies/add/', MovieAddView.as_view(), name='movie_add'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('genre/add/', AddGenreView.as_view(), name='genre_add'),
+    path('genres/', GenresView.as_view(), name='genre_list'),
+    path('genres/<int:genre_id>/', GenreDetailsView.as_view(), name='genre_details'),
+    path('leaderboards/games/', LeaderboardView.as_view(kind='game'), name='game_leaderboard'),
+    path('leaderboards/movies/', LeaderboardView.as_view(kind='movie'), name='movie_leaderboard'),
     path('search/', SearchResultsView.as_view(), name='search_results'),
+    path('search/autocomplete/', AutocompleteView.as_view(), name='search_autocomplete'),
     path('games/<game_id>/edit', GameEditView.as_view(), name='game_edit'),
     path('movies/<movie_id>/edit', MovieEditView.as_view(), name='movie_edit'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache_stats'),
+    path('db/pool/stats/', DatabasePoolStatsView.as_view(), name='db_pool_stats'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    re_path(r'^export/(?P<export>games|movies|reviews)\.(?P<file_format>csv|jsonl)(?P<compressed>\.gz)?$',
+            ExportView.as_view(), name='export'),
+    path('api/games/', GameApiView.as_view(), name='api_games'),
+    path('api/games/<int:pk>/', GameApiView.as_view(), name='api_game'),
+    path('api/movies/', MovieApiView.as_view(), name='api_movies'),
+    path('api/movies/<int:pk>/', MovieApiView.as_view(), name='api_movie'),
+    path('api/genres/', GenreApiView.as_view(), name='api_genres'),
+    path('api/genres/<int:pk>/', GenreApiView.as_view(), name='api_genre'),
+    path('api/reviews/', ReviewApiView.as_view(), name='api_reviews'),
+    path('api/reviews/<int:pk>/', ReviewApiView.as_view(), name='api_review'),
 
 ]
+
+if settings.PRA_ASYNC_VIEWS:
+    urlpatterns = swap_views(urlpatterns, ASYNC_VARIANTS)
@@ -1,3 +1,26 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Game, Genre, Movie, Review
+
+
+@admin.register(Genre)
+class GenreAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+
+
+@admin.register(Game, Movie)
+class TitleAdmin(admin.ModelAdmin):
+    """
+    Admin of games and movies. The rating aggregates are maintained from the reviews, so they are read only.
+    """
+    list_display = ('title', 'release_date', 'review_count', 'average_rating')
+    search_fields = ('title',)
+    readonly_fields = ('review_count', 'rating_sum', 'average_rating')
+
+
+@admin.register(Review)
+class ReviewAdmin(admin.ModelAdmin):
+    list_display = ('user', 'title', 'rating')
+    list_select_related = ('user', 'title')
+    raw_id_fields = ('user', 'title')
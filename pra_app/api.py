@@ -0,0 +1,191 @@
+"""
+Read-only JSON API of the catalog: lists and details of the games, movies, genres and reviews.
+
+Rows are read with values() and turned into JSON in one loop, without building model instances, and ?fields=
+limits the columns the database selects. Lists are cursor paginated by id (?after=, ?before=, ?limit=).
+
+Every response carries an ETag and a Last-Modified made of the ids and updated_at of its rows. They are read by
+a first query of just those two columns, so a client sending If-None-Match or If-Modified-Since for an unchanged
+resource gets a 304 before the full rows are read and serialized.
+"""
+import hashlib
+
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views import View
+
+from .models import Game, Genre, Movie, Review
+from .pagination import CursorPaginator, InvalidCursor
+
+
+class ApiError(Exception):
+    pass
+
+
+class ApiResourceView(View):
+    """
+    List (without pk) or detail (with pk) of one model. Subclasses give the model and the fields of the
+    resource, as field name -> column read with values(), and can accept filters of the list as
+    parameter -> lookup.
+    """
+    model = None
+    fields = {}
+    genres = False
+    filters = {}
+    default_limit = 50
+    max_limit = 200
+
+    def get(self, request, pk=None):
+        try:
+            fields = self.get_fields(request)
+            if pk is None:
+                return self.get_list(request, fields)
+            return self.get_detail(request, fields, pk)
+        except ApiError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+
+    def get_fields(self, request):
+        """
+        Fields selected with ?fields=a,b (all of them by default), the id is always included
+        """
+        requested = [name.strip() for name in request.GET.get('fields', '').split(',') if name.strip()]
+        unknown = [name for name in requested if name not in self.fields and name != 'genres']
+        if unknown or ('genres' in requested and not self.genres):
+            raise ApiError(f'Unknown fields: {", ".join(unknown or ["genres"])}')
+        if not requested:
+            requested = [*self.fields, *(['genres'] if self.genres else [])]
+        return list(dict.fromkeys(['id', *requested]))
+
+    def get_base_queryset(self):
+        return self.model.objects.all()
+
+    def get_queryset(self, request):
+        queryset = self.get_base_queryset()
+        for parameter, lookup in self.filters.items():
+            if parameter in request.GET:
+                try:
+                    queryset = queryset.filter(**{lookup: int(request.GET[parameter])})
+                except ValueError:
+                    raise ApiError(f'Invalid {parameter}')
+        return queryset
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.GET.get('limit', self.default_limit))
+        except ValueError:
+            raise ApiError('Invalid limit')
+        return max(1, min(limit, self.max_limit))
+
+    def get_list(self, request, fields):
+        paginator = CursorPaginator(self.get_queryset(request).values('id', 'updated_at'),
+                                    self.get_limit(request), ('id',))
+        try:
+            page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+        except InvalidCursor:
+            raise ApiError('Invalid cursor')
+
+        def build():
+            return {
+                'results': self.serialize([row['id'] for row in page], fields),
+                'next': page.next_cursor,
+                'previous': page.previous_cursor,
+            }
+
+        return self.conditional_response(request, page.object_list, build)
+
+    def get_detail(self, request, fields, pk):
+        signature = list(self.get_base_queryset().filter(pk=pk).values('id', 'updated_at'))
+        if not signature:
+            raise Http404
+        return self.conditional_response(request, signature, lambda: self.serialize([pk], fields)[0])
+
+    def conditional_response(self, request, signature, build):
+        """
+        Answers with a 304 when the client has the version of the rows in the signature (their ids and
+        updated_at), otherwise with the JSON built by build()
+        """
+        digest = hashlib.md5(request.get_full_path().encode())
+        for row in signature:
+            digest.update(f'{row["id"]}:{row["updated_at"].isoformat()};'.encode())
+        etag = quote_etag(digest.hexdigest())
+        last_modified = max((row['updated_at'] for row in signature), default=None)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = JsonResponse(build(), json_dumps_params={'separators': (',', ':')})
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def serialize(self, pks, fields):
+        """
+        Rows of the given primary keys as dicts of the fields, in the order of the primary keys
+        """
+        columns = {name: self.fields.get(name, name) for name in fields if name != 'genres'}
+        rows = self.get_base_queryset().filter(pk__in=pks).values(*columns.values())
+        by_pk = {row['id']: {name: row[column] for name, column in columns.items()} for row in rows}
+        if 'genres' in fields:
+            for data in by_pk.values():
+                data['genres'] = []
+            field = self.model._meta.get_field('genres')
+            title, genre = f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+            links = field.remote_field.through.objects.filter(**{f'{title}__in': pks}).order_by(genre)
+            for title_id, genre_id in links.values_list(title, genre):
+                by_pk[title_id]['genres'].append(genre_id)
+        return [by_pk[pk] for pk in pks if pk in by_pk]
+
+
+TITLE_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'release_date': 'release_date',
+    'description': 'description',
+    'review_count': 'review_count',
+    'average_rating': 'average_rating',
+    'updated_at': 'updated_at',
+}
+
+
+class GameApiView(ApiResourceView):
+    model = Game
+    fields = TITLE_FIELDS
+    genres = True
+
+
+class MovieApiView(ApiResourceView):
+    model = Movie
+    fields = TITLE_FIELDS
+    genres = True
+
+
+class GenreApiView(ApiResourceView):
+    model = Genre
+    fields = {'id': 'id', 'name': 'name', 'updated_at': 'updated_at'}
+
+
+class ReviewApiView(ApiResourceView):
+    model = Review
+    fields = {
+        'id': 'id',
+        'user': 'user__username',
+        'game': 'reviewed_game_id',
+        'movie': 'reviewed_movie_id',
+        'rating': 'rating',
+        'description': 'description',
+        'updated_at': 'updated_at',
+    }
+    # ids of games and movies do not overlap, the kind only keeps ?game= from matching the reviews of a movie
+    filters = {'game': 'title_id', 'movie': 'title_id'}
+
+    def get_base_queryset(self):
+        return Review.objects.with_kind_ids()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        for kind in ('game', 'movie'):
+            if kind in request.GET:
+                queryset = queryset.filter(title__kind=kind)
+        return queryset
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PraAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pra_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
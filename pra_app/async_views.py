@@ -0,0 +1,155 @@
+"""
+Async variants of the read only views, served by the ASGI entry point (see pra/asgi.py and the PRA_ASYNC_VIEWS
+setting).
+
+They build the same pages as their sync counterparts in views.py, reading the database with the async ORM API
+(aget(), acount() and async iteration), so a worker waiting on a slow client or query does not hold a thread.
+Everything the templates show is read before rendering, as rendering runs in the event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import render
+from django.urls import URLPattern
+
+from .models import Game, Genre, Movie
+from .pagination import acursor_page, apaginate, sort_expressions, wants_cursor_pagination
+from .ratings import RatingDistribution
+from .views import LEADERBOARD_ORDER, REVIEW_SORT_ORDERS, SORT_ORDERS, GameDetailsView, GamesView, \
+    LeaderboardView, MovieDetailsView, MoviesView, MovieReviewsView, SearchResultsView, ViewGameReviewsView, \
+    get_sort_order, sort_links_query
+
+
+async def aget_object_or_404(model, **kwargs):
+    try:
+        return await model.objects.aget(**kwargs)
+    except (model.DoesNotExist, ValueError):
+        raise Http404(f'No {model._meta.object_name} matches the given query.')
+
+
+class AsyncGamesView(GamesView):
+
+    async def get(self, request):
+        sort_by = get_sort_order(request)
+        ordering = SORT_ORDERS[sort_by]
+        if wants_cursor_pagination(request):
+            games = await acursor_page(request, Game.objects.all(), self.games_per_page, ordering)
+            return render(request, self.template_name,
+                          {'games': games, 'sort_by': sort_by, 'cursor_pagination': True,
+                           'links_query': sort_links_query(request, True)})
+
+        games = await apaginate(Game.objects.order_by(*sort_expressions(Game, ordering)), self.games_per_page,
+                                request.GET.get('page'))
+        return render(request, self.template_name,
+                      {'games': games, 'sort_by': sort_by, 'links_query': sort_links_query(request, False)})
+
+
+class AsyncGameDetailsView(GameDetailsView):
+
+    async def get(self, request, game_id):
+        game = await aget_object_or_404(Game, pk=game_id)
+        genres = [genre async for genre in game.genres.all()]
+        self.add_cache_tags(*(f'genre:{genre.pk}' for genre in genres))
+        return render(request, self.template_name,
+                      {'game': game, 'average_score': game.average_rating, 'genres': genres,
+                       'ratings': RatingDistribution.of(game)})
+
+
+class AsyncReviewListMixin:
+    """
+    The page of reviews read with async iteration. Streamed pages are rendered from the rows already read.
+    """
+
+    async def aget_reviews_page(self, request, title):
+        sort_by, summary = self.get_review_options(request)
+        reviews = await acursor_page(request, self.get_review_queryset(title, summary), self.reviews_per_page,
+                                     REVIEW_SORT_ORDERS[sort_by])
+        return self.get_review_context(request, reviews, sort_by, summary)
+
+
+class AsyncViewGameReviewsView(AsyncReviewListMixin, ViewGameReviewsView):
+
+    async def get(self, request, game_id):
+        game = await aget_object_or_404(Game, pk=game_id)
+        return self.render_reviews(request, {'game': game, **await self.aget_reviews_page(request, game)})
+
+
+class AsyncMoviesView(MoviesView):
+
+    async def get(self, request):
+        sort_by = get_sort_order(request)
+        ordering = SORT_ORDERS[sort_by]
+        if wants_cursor_pagination(request):
+            movies = await acursor_page(request, Movie.objects.all(), self.movies_per_page, ordering)
+            return render(request, self.template_name,
+                          {'movies': movies, 'sort_by': sort_by, 'cursor_pagination': True,
+                           'links_query': sort_links_query(request, True)})
+
+        movies = await apaginate(Movie.objects.order_by(*sort_expressions(Movie, ordering)),
+                                 self.movies_per_page, request.GET.get('page'))
+        return render(request, self.template_name,
+                      {'movies': movies, 'sort_by': sort_by, 'links_query': sort_links_query(request, False)})
+
+
+class AsyncMovieDetailsView(MovieDetailsView):
+
+    async def get(self, request, movie_id):
+        movie = await aget_object_or_404(Movie, pk=movie_id)
+        genres = [genre async for genre in movie.genres.all()]
+        self.add_cache_tags(*(f'genre:{genre.pk}' for genre in genres))
+        return render(request, self.template_name,
+                      {'movie': movie, 'average_score': movie.average_rating, 'genres': genres,
+                       'ratings': RatingDistribution.of(movie)})
+
+
+class AsyncMovieReviewsView(AsyncReviewListMixin, MovieReviewsView):
+
+    async def get(self, request, movie_id):
+        movie = await aget_object_or_404(Movie, pk=movie_id)
+        return self.render_reviews(request, {'movie': movie, **await self.aget_reviews_page(request, movie)})
+
+
+class AsyncLeaderboardView(LeaderboardView):
+
+    async def get(self, request):
+        genre = self.get_genre(request)
+        entries = await acursor_page(request, self.get_entries(genre), self.titles_per_page, LEADERBOARD_ORDER)
+        genres = [genre_row async for genre_row in Genre.objects.order_by('name').values_list('pk', 'name')]
+        return render(request, self.template_name, self.get_context(entries, genres, genre))
+
+
+class AsyncSearchResultsView(SearchResultsView):
+    """
+    The search backends are synchronous, they are called from a thread
+    """
+
+    async def get(self, request):
+        context = await sync_to_async(self.get_search_context)(request)
+        return render(request, self.template_name, context)
+
+
+# sync view -> its async variant
+ASYNC_VARIANTS = {
+    GamesView: AsyncGamesView,
+    GameDetailsView: AsyncGameDetailsView,
+    ViewGameReviewsView: AsyncViewGameReviewsView,
+    MoviesView: AsyncMoviesView,
+    MovieDetailsView: AsyncMovieDetailsView,
+    MovieReviewsView: AsyncMovieReviewsView,
+    SearchResultsView: AsyncSearchResultsView,
+    LeaderboardView: AsyncLeaderboardView,
+}
+
+
+def swap_views(urlpatterns, variants):
+    """
+    Copy of the url patterns with the views found in variants (view class -> view class) replaced,
+    e.g. swap_views(urlpatterns, ASYNC_VARIANTS) routes the read only pages to the async views
+    """
+    swapped = []
+    for pattern in urlpatterns:
+        view_class = getattr(getattr(pattern, 'callback', None), 'view_class', None)
+        if isinstance(pattern, URLPattern) and view_class in variants:
+            view = variants[view_class].as_view(**pattern.callback.view_initkwargs)
+            pattern = URLPattern(pattern.pattern, view, pattern.default_args, pattern.name)
+        swapped.append(pattern)
+    return swapped
@@ -0,0 +1,123 @@
+"""
+Title prefix index answering the typeahead of the search box.
+
+Every process keeps a sorted array of normalized titles (and of the title tails starting at every further
+word, so "witch" also suggests "The Witcher 3") and answers prefix lookups with a binary search, without
+touching the database. The index is built at the first lookup and updated from the save and delete signals
+of games and movies.
+"""
+import threading
+from bisect import bisect_left, insort
+
+from django.urls import reverse
+
+from .models import Game, Movie, Title
+
+# kind of the suggestions -> model and name of its detail url
+SUGGESTED = {
+    'game': (Game, 'game_details'),
+    'movie': (Movie, 'movie_details'),
+}
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+class TitlePrefixIndex:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        # sorted (normalized key, kind, pk) tuples, titles starting with the prefix are suggested first
+        self._title_keys = []
+        self._word_keys = []
+        self._entries = {}
+
+    def reset(self):
+        """
+        Drops the index, it is built again at the next lookup
+        """
+        with self._lock:
+            self._built = False
+            self._title_keys = []
+            self._word_keys = []
+            self._entries = {}
+
+    def lookup(self, prefix, limit=10):
+        """
+        Returns up to limit {'title', 'kind', 'url'} dicts of the titles with a word starting with the prefix
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            self._ensure_built()
+            found = {}
+            for keys in (self._title_keys, self._word_keys):
+                position = bisect_left(keys, (prefix,))
+                while len(found) < limit and position < len(keys) and keys[position][0].startswith(prefix):
+                    _, kind, pk = keys[position]
+                    found.setdefault((kind, pk), self._entries[kind, pk][0])
+                    position += 1
+            return list(found.values())
+
+    def add(self, instance):
+        with self._lock:
+            if self._built:
+                self._add(self._kind(instance), instance.pk, instance.title)
+
+    def remove(self, instance):
+        with self._lock:
+            if self._built:
+                self._discard(self._kind(instance), instance.pk)
+
+    def _ensure_built(self):
+        if self._built:
+            return
+        # the keys of all titles are sorted once, inserting them one by one would be quadratic
+        entries = {}
+        title_keys = []
+        word_keys = []
+        for pk, kind, title in Title.objects.filter(kind__in=SUGGESTED).values_list('pk', 'kind', 'title').iterator():
+            entry = entries[kind, pk] = self._entry(kind, pk, title)
+            keys = entry[1]
+            title_keys.append(keys[0])
+            word_keys.extend(keys[1:])
+        title_keys.sort()
+        word_keys.sort()
+        self._entries, self._title_keys, self._word_keys = entries, title_keys, word_keys
+        self._built = True
+
+    def _kind(self, instance):
+        return instance.kind
+
+    @staticmethod
+    def _entry(kind, pk, title):
+        """
+        The suggestion of a title and its keys, the whole title first, then the tails starting at its other words
+        """
+        words = normalize(title).split(' ')
+        keys = [(' '.join(words[start:]), kind, pk) for start in range(len(words))]
+        suggestion = {'title': title, 'kind': kind, 'url': reverse(SUGGESTED[kind][1], args=[pk])}
+        return suggestion, keys
+
+    def _add(self, kind, pk, title):
+        self._discard(kind, pk)
+        _, keys = self._entries[kind, pk] = self._entry(kind, pk, title)
+        insort(self._title_keys, keys[0])
+        for key in keys[1:]:
+            insort(self._word_keys, key)
+
+    def _discard(self, kind, pk):
+        entry = self._entries.pop((kind, pk), None)
+        if entry is None:
+            return
+        _, keys = entry
+        for sorted_keys, removed in ((self._title_keys, keys[:1]), (self._word_keys, keys[1:])):
+            for key in removed:
+                del sorted_keys[bisect_left(sorted_keys, key)]
+
+
+title_index = TitlePrefixIndex()
@@ -0,0 +1,292 @@
+"""
+Synthetic catalog and per page benchmarks, used by the seed_catalog and benchmark_pages commands.
+
+seed_catalog() fills the database with generated genres, users, games, movies and reviews, written in batches
+with bulk_create (so without signals). The titles are written with the rating aggregates of the reviews generated
+for them, and the leaderboards are refreshed at the end. The same seed gives the same catalog. Reviews are spread
+over the titles with a Zipf-like skew, so a few titles have very long review lists, like in a real catalog.
+
+run_benchmarks() requests the pages of PAGES through the test client, with the page cache off, and records the
+median wall time and the number of SQL queries of every page. check_results() fails a page that runs more queries
+than its budget, or whose median time grew by more than the threshold over the one of a baseline file written by
+an earlier run. Everything runs in this process against the configured database (SQLite or PostgreSQL), with no
+web server and no network involved.
+"""
+import contextlib
+import datetime
+import itertools
+import json
+import math
+import random
+import statistics
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, QuerySet
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .cache import response_cache
+from .genres import genre_registry, invalidate_genre_title_counts
+from .leaderboards import refresh_leaderboards
+from .models import RATING_BUCKETS, Genre, Review, Title, histogram_field
+from .ratings import AVERAGE_PRECISION
+
+GENRE_NAMES = ['Action', 'Adventure', 'Comedy', 'Crime', 'Drama', 'Fantasy', 'Horror', 'Mystery', 'Puzzle',
+               'Racing', 'Romance', 'RPG', 'Sci-Fi', 'Simulation', 'Sports', 'Strategy', 'Thriller', 'War']
+TITLE_WORDS = ['dark', 'last', 'lost', 'final', 'silent', 'golden', 'broken', 'hidden', 'eternal', 'red', 'night',
+               'city', 'kingdom', 'star', 'river', 'empire', 'legend', 'shadow', 'world', 'storm', 'dragon', 'war']
+DESCRIPTION_WORDS = ['story', 'journey', 'hero', 'family', 'battle', 'secret', 'friends', 'escape', 'future',
+                     'past', 'mission', 'island', 'detective', 'crew', 'village', 'machine', 'music', 'winter']
+FIRST_RELEASE = datetime.date(1950, 1, 1)
+RELEASE_DAYS = 27000
+USERNAME_PREFIX = 'seed-user-'
+
+# page name -> (path, query budget). {game} and {movie} are replaced by the most reviewed game and movie, {genre}
+# by the genre with the most titles, {word} by a word of the titles, {middle_page} and {last_page} by page numbers
+# of the game and movie lists. The budgets count every query of the request, session and user lookups included,
+# with the genre count map of the genre pages and the genre registry of the forms loaded (see genres.py).
+PAGES = {
+    'game_list': ('/games/', 2),
+    'game_list_middle_page': ('/games/?page={middle_page}', 2),
+    'game_list_last_page': ('/games/?page={last_page}', 2),
+    'game_list_by_rating': ('/games/?sort_by=rating', 2),
+    'game_list_cursor': ('/games/?paginate=cursor', 1),
+    'movie_list': ('/movies/', 2),
+    'movie_list_last_page': ('/movies/?page={last_page}', 2),
+    'game_details': ('/games/{game}', 2),
+    'movie_details': ('/movies/{movie}', 2),
+    'game_reviews': ('/view-game-reviews/{game}', 2),
+    'game_reviews_by_rating': ('/view-game-reviews/{game}?sort_by=rating', 2),
+    'game_reviews_summary': ('/view-game-reviews/{game}?summary=1', 2),
+    'movie_reviews': ('/view-movie-reviews/{movie}', 2),
+    'search': ('/search/?query={word}', 3),
+    'search_filtered': ('/search/?query={word}&genre={genre}&year_from=1990&year_to=2009', 4),
+    'search_fuzzy': ('/search/?query={word}&fuzzy=on', 3),
+    'autocomplete': ('/search/autocomplete/?q={word}', 0),
+    'genres': ('/genres/', 1),
+    'genre_details': ('/genres/{genre}/', 2),
+    'game_leaderboard': ('/leaderboards/games/', 2),
+    'movie_leaderboard': ('/leaderboards/movies/', 2),
+    'api_games': ('/api/games/', 3),
+    'api_reviews': ('/api/reviews/?game={game}', 2),
+}
+
+
+def seed_catalog(titles=100000, reviews=5000000, users=1000, genres=len(GENRE_NAMES), seed=0, batch_size=5000,
+                 using=DEFAULT_DB_ALIAS, on_batch=None):
+    """
+    Adds a generated catalog to the database: genres, users, titles (games and movies in equal parts) with one
+    to three genres each, and reviews. on_batch(stage, rows_done) is called after every committed batch.
+    Returns the number of created rows by model.
+    """
+    if not connections[using].features.can_return_rows_from_bulk_insert:
+        raise NotImplementedError('The database does not return the ids of bulk inserted rows')
+    rng = random.Random(seed)
+    on_batch = on_batch or (lambda stage, rows_done: None)
+
+    genre_names = [name if number < len(GENRE_NAMES) else f'{name} {number // len(GENRE_NAMES) + 1}'
+                   for number, name in zip(range(genres), itertools.cycle(GENRE_NAMES))]
+    Genre.objects.using(using).bulk_create([Genre(name=name) for name in genre_names], ignore_conflicts=True)
+    genre_ids = list(Genre.objects.using(using).filter(name__in=genre_names).values_list('pk', flat=True))
+
+    password = make_password(None)
+    usernames = [f'{USERNAME_PREFIX}{number}' for number in range(users)]
+    for batch in batched(usernames, batch_size):
+        User.objects.using(using).bulk_create([User(username=name, password=password) for name in batch],
+                                              ignore_conflicts=True)
+    user_ids = list(User.objects.using(using).filter(username__in=usernames).values_list('pk', flat=True))
+
+    review_counts = spread_reviews(rng, titles, reviews if user_ids else 0)
+    # the reviews skip ReviewQuerySet.bulk_create, which would update the aggregates of every title one at a time,
+    # the titles are created with the aggregates of the ratings generated for them instead
+    reviews_table = QuerySet(model=Review, using=using)
+    created_titles = created_reviews = 0
+    for batch in batched(review_counts, batch_size):
+        new_titles = []
+        ratings = []
+        for count in batch:
+            quality = rng.uniform(3, 9)
+            ratings.append([generate_rating(rng, quality) for _ in range(count)])
+            new_titles.append(with_aggregates(generate_title(rng), ratings[-1]))
+
+        with transaction.atomic(using=using):
+            Title.objects.using(using).bulk_create(new_titles)
+            Title.genres.through.objects.using(using).bulk_create([
+                Title.genres.through(title_id=title.pk, genre_id=genre_id) for title in new_titles
+                for genre_id in rng.sample(genre_ids, min(rng.randint(1, 3), len(genre_ids)))])
+            title_reviews = ((title.pk, rating) for title, title_ratings in zip(new_titles, ratings)
+                             for rating in title_ratings)
+            for review_batch in batched(title_reviews, batch_size):
+                reviews_table.bulk_create([
+                    Review(user_id=rng.choice(user_ids), title_id=title_id, rating=Decimal(rating),
+                           description=' '.join(rng.choices(DESCRIPTION_WORDS, k=rng.randint(5, 40))).capitalize())
+                    for title_id, rating in review_batch])
+                created_reviews += len(review_batch)
+        created_titles += len(new_titles)
+        on_batch('titles', created_titles)
+        on_batch('reviews', created_reviews)
+
+    refresh_leaderboards(using=using)
+    # the rows were written without signals
+    response_cache.invalidate('games', 'movies', 'title-ratings', 'genres', 'genre-titles')
+    invalidate_genre_title_counts()
+    genre_registry.invalidate()
+    return {'genres': len(genre_ids), 'users': len(user_ids), 'titles': created_titles, 'reviews': created_reviews}
+
+
+def spread_reviews(rng, titles, reviews):
+    """
+    Number of reviews of every title, adding up to reviews: the n-th most popular title (in random order) gets
+    them in proportion to 1 / n
+    """
+    weights = [1 / rank for rank in range(1, titles + 1)]
+    rng.shuffle(weights)
+    scale = reviews / sum(weights) if weights else 0
+    counts = [int(weight * scale) for weight in weights]
+    for position in rng.choices(range(titles), weights=weights, k=reviews - sum(counts)):
+        counts[position] += 1
+    return counts
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def generate_title(rng):
+    words = ' '.join(rng.sample(TITLE_WORDS, rng.randint(1, 3))).title()
+    released = None if rng.random() < 0.05 else FIRST_RELEASE + datetime.timedelta(days=rng.randrange(RELEASE_DAYS))
+    return Title(kind=rng.choice((Title.GAME, Title.MOVIE)), title=f'{words} {rng.randint(1, 999)}',
+                 release_date=released,
+                 description=' '.join(rng.choices(DESCRIPTION_WORDS, k=rng.randint(10, 30))).capitalize())
+
+
+def generate_rating(rng, quality):
+    return min(RATING_BUCKETS[-1], max(RATING_BUCKETS[0], round(rng.gauss(quality, 1.5))))
+
+
+def with_aggregates(title, ratings):
+    """
+    Sets the rating aggregates of a new title to the ones of the given (whole) ratings of its reviews
+    """
+    title.review_count = len(ratings)
+    title.rating_sum = Decimal(sum(ratings))
+    if ratings:
+        title.average_rating = (title.rating_sum / len(ratings)).quantize(AVERAGE_PRECISION)
+    for rating, count in Counter(ratings).items():
+        setattr(title, histogram_field(rating), count)
+    return title
+
+
+def page_params(using=DEFAULT_DB_ALIAS):
+    """
+    Values of the placeholders of the PAGES paths, picked from the catalog in the database
+    """
+    from .views import GamesView
+
+    titles = Title.objects.using(using)
+    most_reviewed = {}
+    for kind in (Title.GAME, Title.MOVIE):
+        most_reviewed[kind] = titles.filter(kind=kind).order_by('-review_count', 'pk').first()
+        if most_reviewed[kind] is None:
+            raise ValueError(f'There are no {kind}s in the database, seed a catalog first (seed_catalog)')
+    genre = Title.genres.through.objects.using(using).values('genre_id').annotate(
+        count=Count('pk')).order_by('-count', 'genre_id').first()
+    pages = math.ceil(titles.filter(kind=Title.GAME).count() / GamesView.games_per_page)
+    return {
+        'game': most_reviewed[Title.GAME].pk,
+        'movie': most_reviewed[Title.MOVIE].pk,
+        'genre': genre['genre_id'] if genre else 0,
+        'word': most_reviewed[Title.GAME].title.split()[0].lower(),
+        'middle_page': max(1, pages // 2),
+        'last_page': max(1, pages),
+    }
+
+
+def run_benchmarks(names=None, repeat=5, use_cache=False, using=DEFAULT_DB_ALIAS):
+    """
+    Requests every page (all of PAGES by default) once to warm up and repeat more times, and returns
+    name -> {path, median_ms, min_ms, queries, budget, status}
+    """
+    params = page_params(using)
+    # the genre registry is checked against the database every few seconds, not per request, so its check is
+    # left out of the measured requests
+    overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+                 'PRA_GENRE_REGISTRY_CHECK_INTERVAL': float('inf')}
+    if not use_cache:
+        overrides['PRA_RESPONSE_CACHE'] = None
+
+    results = {}
+    client = Client()
+    with override_settings(**overrides):
+        for name in names or PAGES:
+            path, budget = PAGES[name]
+            path = path.format(**params)
+            request(client, path)
+            timings = []
+            queries = 0
+            for _ in range(repeat):
+                with contextlib.ExitStack() as stack:
+                    # replicas included, they are routed to through the connections of their own aliases
+                    captured = [stack.enter_context(CaptureQueriesContext(connections[alias]))
+                                for alias in settings.DATABASES]
+                    started = time.perf_counter()
+                    status = request(client, path)
+                    timings.append(time.perf_counter() - started)
+                queries = max(queries, sum(len(context) for context in captured))
+            results[name] = {
+                'path': path,
+                'median_ms': round(statistics.median(timings) * 1000, 3),
+                'min_ms': round(min(timings) * 1000, 3),
+                'queries': queries,
+                'budget': budget,
+                'status': status,
+            }
+    return results
+
+
+def request(client, path):
+    response = client.get(path)
+    # streamed pages run their queries while the content is read
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response.status_code
+
+
+def check_results(results, baseline=None, threshold=0.25, slack_ms=1.0):
+    """
+    Returns name -> list of the problems of every page: errors, more queries than the budget, and a median time
+    over the one of the baseline (a results dict) by more than threshold (a share) and slack_ms, which keeps
+    the noise of very fast pages from failing them
+    """
+    baseline = baseline or {}
+    problems = {}
+    for name, result in results.items():
+        found = []
+        if result['status'] != 200:
+            found.append(f'status {result["status"]}')
+        if result['queries'] > result['budget']:
+            found.append(f'{result["queries"]} queries, over the budget of {result["budget"]}')
+        if name in baseline:
+            allowed = baseline[name]['median_ms'] * (1 + threshold) + slack_ms
+            if result['median_ms'] > allowed:
+                found.append(f'{result["median_ms"]:.1f}ms, {baseline[name]["median_ms"]:.1f}ms in the baseline')
+        problems[name] = found
+    return problems
+
+
+def load_baseline(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
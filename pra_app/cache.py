@@ -0,0 +1,212 @@
+"""
+Cache of rendered catalog pages, invalidated by tags.
+
+Every cached page is stored together with the versions of the tags it was built from: 'title:<id>' for the
+pages of one game or movie, 'games' and 'movies' for the lists, 'title-ratings' for lists sorted by the rating
+aggregates and 'genre:<id>' for pages showing a genre. Writes give the tags they
+touch a new version (see signals.py and ratings.py), so exactly the pages depending on them are rebuilt.
+
+Only get, get_many, set, add and incr of the cache are used, so any Django cache backend works. It has to be
+shared by all the workers though (file-based, Redis, Memcached), as a write bumps the versions of its tags in the
+cache of the worker making it only: with a local-memory cache the other workers would keep serving the old pages
+until they expire. The page cache is off on a local-memory cache unless PRA_RESPONSE_CACHE says 'PER_PROCESS':
+True, for deployments with a single process. The hit and miss counters are kept in the cache too, which makes
+them shared by all workers as well.
+"""
+import hashlib
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse
+
+from .routers import get_stickiness, request_is_pinned, request_read_replica
+
+
+def get_cache_settings():
+    return getattr(settings, 'PRA_RESPONSE_CACHE', None) or {}
+
+
+class ResponseCache:
+    key_prefix = 'pra:pages'
+
+    @property
+    def enabled(self):
+        cache_settings = get_cache_settings()
+        if not cache_settings.get('ENABLED', True) or 'ALIAS' not in cache_settings:
+            return False
+        return cache_settings.get('PER_PROCESS', False) or not isinstance(self.cache, LocMemCache)
+
+    @property
+    def cache(self):
+        return caches[get_cache_settings()['ALIAS']]
+
+    def versions(self, tags):
+        """
+        Returns the current version of every tag, giving a version to tags that do not have one yet
+        """
+        if not tags:
+            return {}
+        keys = {self._tag_key(tag): tag for tag in tags}
+        found = self.cache.get_many(keys)
+        for key in keys.keys() - found.keys():
+            # add() keeps the version another worker may have set meanwhile
+            self.cache.add(key, uuid.uuid4().hex, timeout=None)
+            found[key] = self.cache.get(key)
+        return {tag: found[key] for key, tag in keys.items()}
+
+    def get(self, key):
+        """
+        Returns the cached response stored under the key, unless one of its tags changed since
+        """
+        entry = self.cache.get(self._page_key(key))
+        if entry is not None and self.versions(entry['tags'].keys()) == entry['tags']:
+            self._count('hits')
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            response['X-Cache'] = 'HIT'
+            return response
+        self._count('misses')
+        return None
+
+    def set(self, key, response, versions, timeout=None):
+        timeout = get_cache_settings().get('TIMEOUT', 300) if timeout is None else timeout
+        self.cache.set(self._page_key(key), {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'tags': versions,
+        }, timeout=timeout)
+        response['X-Cache'] = 'MISS'
+
+    def invalidate(self, *tags):
+        """
+        Gives the tags new versions right away and once more when the current transaction commits,
+        so a page rendered from the old data in between is not kept either
+        """
+        if not tags or not self.enabled:
+            return
+
+        def bump():
+            self.cache.set_many({self._tag_key(tag): uuid.uuid4().hex for tag in tags}, timeout=None)
+
+        bump()
+        transaction.on_commit(bump)
+
+    def stats(self):
+        counters = self.cache.get_many([self._counter_key('hits'), self._counter_key('misses')])
+        hits = counters.get(self._counter_key('hits'), 0)
+        misses = counters.get(self._counter_key('misses'), 0)
+        return {'hits': hits, 'misses': misses, 'hit_ratio': hits / (hits + misses) if hits + misses else 0}
+
+    def _count(self, counter):
+        key = self._counter_key(counter)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            if not self.cache.add(key, 1, timeout=None):
+                self.cache.incr(key)
+
+    def _page_key(self, key):
+        return f'{self.key_prefix}:page:{hashlib.md5(key.encode()).hexdigest()}'
+
+    def _tag_key(self, tag):
+        return f'{self.key_prefix}:tag:{tag}'
+
+    def _counter_key(self, counter):
+        return f'{self.key_prefix}:{counter}'
+
+
+response_cache = ResponseCache()
+
+
+class CachedResponseMixin:
+    """
+    Mixin for read only views, serving GET requests from the response cache.
+
+    The key of a page is its path and the values of cache_query_params. The tags of a page come from
+    get_cache_tags() (called before the view, returning None skips caching) and from add_cache_tags()
+    calls made while the view builds the page.
+
+    Clients pinned to the default database after a write (see pra_app.routers) are not served cached pages,
+    which may predate their write, and pages read from a replica are kept for the stickiness window only:
+    a replica lagging behind a write may have built one after the write bumped its tags.
+    """
+    cache_query_params = ()
+
+    @staticmethod
+    def uses_cache(request):
+        return request.method == 'GET' and response_cache.enabled and not request_is_pinned()
+
+    @staticmethod
+    def get_page_timeout():
+        """
+        Timeout of the page just built, None for the one of PRA_RESPONSE_CACHE
+        """
+        if request_read_replica():
+            return min(get_stickiness(), get_cache_settings().get('TIMEOUT', 300))
+        return None
+
+    def get_cache_tags(self, request, *args, **kwargs):
+        return set()
+
+    def add_cache_tags(self, *tags):
+        self.cache_tags.update(tags)
+
+    def get_cache_key(self, request):
+        return request.path + '?' + '&'.join(
+            f'{name}={request.GET.get(name, "")}' for name in sorted(self.cache_query_params))
+
+    def dispatch(self, request, *args, **kwargs):
+        self.cache_tags = set()
+        if self.view_is_async:
+            return self._adispatch(request, *args, **kwargs)
+        # the pages are the same for every user (who is logged in is fetched separately, see UserHeaderView),
+        # so they are shared by all of them
+        if not self.uses_cache(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        tags = self.get_cache_tags(request, *args, **kwargs)
+        if tags is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        response = response_cache.get(key)
+        if response is not None:
+            return response
+
+        # versions of the tags known upfront are read before building the page, so a write made meanwhile
+        # makes the stored page stale right away
+        self.cache_tags = set(tags)
+        versions = response_cache.versions(self.cache_tags)
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            versions.update(response_cache.versions(self.cache_tags - versions.keys()))
+            response_cache.set(key, response, versions, self.get_page_timeout())
+        return response
+
+    async def _adispatch(self, request, *args, **kwargs):
+        """
+        dispatch() of async views (see pra_app.async_views), the cache backend is called from a thread
+        as it may block
+        """
+        if not self.uses_cache(request):
+            return await super().dispatch(request, *args, **kwargs)
+
+        tags = self.get_cache_tags(request, *args, **kwargs)
+        if tags is None:
+            return await super().dispatch(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        response = await sync_to_async(response_cache.get)(key)
+        if response is not None:
+            return response
+
+        self.cache_tags = set(tags)
+        versions = await sync_to_async(response_cache.versions)(self.cache_tags)
+        response = await super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            versions.update(await sync_to_async(response_cache.versions)(self.cache_tags - versions.keys()))
+            await sync_to_async(response_cache.set)(key, response, versions, self.get_page_timeout())
+        return response
@@ -0,0 +1,98 @@
+"""
+Streaming export of the catalog and the reviews as CSV or JSON lines, optionally gzip compressed.
+
+Rows are read with QuerySet.iterator() (a server-side cursor on PostgreSQL) as plain values, genre names are
+looked up in a genre id -> name map and the output is produced in chunks of encoded lines, so neither the
+export command nor the export view ever holds more than one chunk of rows.
+"""
+import csv
+import io
+import json
+import zlib
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Game, Genre, Movie, Review, Title
+
+# export name -> (model, columns)
+EXPORTS = {
+    'games': (Game, ['id', 'title', 'release_date', 'description', 'genres', 'review_count', 'average_rating']),
+    'movies': (Movie, ['id', 'title', 'release_date', 'description', 'genres', 'review_count', 'average_rating']),
+    'reviews': (Review, ['id', 'user', 'game_id', 'movie_id', 'rating', 'description']),
+}
+FORMATS = ('csv', 'jsonl')
+GENRE_SEPARATOR = '|'
+
+
+def iter_rows(name, chunk_size=2000):
+    """
+    Yields the rows of the export as tuples of the EXPORTS columns
+    """
+    model, columns = EXPORTS[name]
+    if model is Review:
+        yield from Review.objects.with_kind_ids().order_by('pk').values_list(
+            'pk', 'user__username', 'reviewed_game_id', 'reviewed_movie_id', 'rating', 'description'
+        ).iterator(chunk_size=chunk_size)
+        return
+
+    genre_names = dict(Genre.objects.values_list('pk', 'name'))
+    through = Title.genres.through
+    fk = 'title_id'
+    chunk = []
+    titles = model.objects.order_by('pk').values_list(
+        'pk', 'title', 'release_date', 'description', 'review_count', 'average_rating').iterator(chunk_size=chunk_size)
+    for row in titles:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield from _with_genres(chunk, through, fk, genre_names)
+            chunk = []
+    if chunk:
+        yield from _with_genres(chunk, through, fk, genre_names)
+
+
+def _with_genres(chunk, through, fk, genre_names):
+    genres = defaultdict(list)
+    links = through.objects.filter(**{f'{fk}__in': [row[0] for row in chunk]}).values_list(fk, 'genre_id')
+    for title_id, genre_id in links:
+        genres[title_id].append(genre_names.get(genre_id, ''))
+    for pk, title, release_date, description, review_count, average_rating in chunk:
+        yield pk, title, release_date, description, GENRE_SEPARATOR.join(genres[pk]), review_count, average_rating
+
+
+def iter_export(name, file_format='csv', compress=False, chunk_size=2000):
+    """
+    Yields the export as chunks of bytes, every chunk holding up to chunk_size rows
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f'Unknown format: {file_format}')
+    columns = EXPORTS[name][1]
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31: gzip container
+
+    def encoded(text):
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if file_format == 'csv':
+        writer.writerow(columns)
+
+    rows = 0
+    for row in iter_rows(name, chunk_size=chunk_size):
+        if file_format == 'csv':
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder))
+            buffer.write('\n')
+        rows += 1
+        if rows % chunk_size == 0:
+            chunk = encoded(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+            if chunk:
+                yield chunk
+
+    yield encoded(buffer.getvalue())
+    if compressor:
+        yield compressor.flush()
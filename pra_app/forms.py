@@ -1,7 +1,54 @@
 from django import forms
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .genres import genre_registry
 from .models import Review, Game, Movie, Genre
+from .search.facets import FILTER_NAMES
+
+
+def genre_choices():
+    # a function rather than the bound method, the choices are deep copied with the fields of every form
+    return genre_registry.choices()
+
+
+def genre_id(value):
+    """
+    Id of a genre given as a Genre or an id
+    """
+    return getattr(value, 'pk', value)
+
+
+class GenreMultipleChoiceField(forms.TypedMultipleChoiceField):
+    """
+    Genres picked from the genre registry (see pra_app.genres), cleaned to their ids,
+    so the forms list and validate them without a query
+    """
+    widget = forms.CheckboxSelectMultiple
+
+    def __init__(self, **kwargs):
+        super().__init__(choices=genre_choices, coerce=int, **kwargs)
+
+    def prepare_value(self, value):
+        # the initial value of an edit form is the list of the genres of the title
+        if isinstance(value, (list, tuple)):
+            return [genre_id(genre) for genre in value]
+        return genre_id(value)
+
+    def has_changed(self, initial, data):
+        return super().has_changed(self.prepare_value(initial), data)
+
+
+class GenreChoiceField(forms.TypedChoiceField):
+    """
+    Single genre picked from the genre registry, cleaned to its id (None when none is picked)
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(choices=self.get_choices, coerce=int, empty_value=None, **kwargs)
+
+    @staticmethod
+    def get_choices():
+        return [('', '---------'), *genre_choices()]
 
 
 class ReviewForm(forms.ModelForm):
@@ -37,10 +84,7 @@ class GameAddForm(forms.ModelForm):
     """
     Simple form that allows for logged users to add new games to the database
     """
-    genres = forms.ModelMultipleChoiceField(
-        queryset=Genre.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
-    )
+    genres = GenreMultipleChoiceField()
 
     class Meta:
         model = Game
@@ -54,10 +98,7 @@ class MovieAddForm(forms.ModelForm):
     """
     Simple form that allows for logged users to add new movies to the database
     """
-    genres = forms.ModelMultipleChoiceField(
-        queryset=Genre.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
-    )
+    genres = GenreMultipleChoiceField()
 
     class Meta:
         model = Movie
@@ -69,29 +110,59 @@ class MovieAddForm(forms.ModelForm):
 
 class AddGenreForm(forms.ModelForm):
     """
-    Simple form that allows for logged users to add new genres to the database
+    Simple form that allows for logged users to add new genres to the database.
+    Existing names (in any case) are rejected with the genre registry instead of a query,
+    the database constraint on the name catches the ones added meanwhile when the genre is saved (see AddGenreView)
     """
 
     class Meta:
         model = Genre
         fields = ['name']
 
+    def clean_name(self):
+        name = Genre.clean_name(self.cleaned_data['name'])
+        if genre_registry.id_for(name) is not None:
+            raise forms.ValidationError('Genre already exists.')
+        return name
+
+    def _get_validation_exclusions(self):
+        # checked by clean_name(), keeps the model validation from querying the name constraint
+        exclude = super()._get_validation_exclusions()
+        exclude.add('name')
+        return exclude
+
 
 class SearchForm(forms.Form):
     """
-    Form that allows users to search for movies or games that met the search criteria
+    Form that allows users to search for movies or games that met the search criteria,
+    optionally of one genre and released within a range of years
     """
     query = forms.CharField(max_length=100, label='Search')
+    fuzzy = forms.BooleanField(required=False, label='Tolerate typos')
+    genre = GenreChoiceField(required=False, label='Genre')
+    year_from = forms.IntegerField(required=False, min_value=1, max_value=9999, label='Released from')
+    year_to = forms.IntegerField(required=False, min_value=1, max_value=9999, label='Released until')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        year_from = cleaned_data.get('year_from')
+        year_to = cleaned_data.get('year_to')
+        if year_from is not None and year_to is not None and year_from > year_to:
+            raise forms.ValidationError('The first release year must not be after the last one.')
+        return cleaned_data
+
+    def get_filters(self):
+        """
+        Returns the filters of the search backends (genre, year_from, year_to) from a valid form
+        """
+        return {name: self.cleaned_data.get(name) for name in FILTER_NAMES}
 
 
 class GameEditForm(forms.ModelForm):
     """
     Form that allows for logged users to be able to edit already existing game details
     """
-    genres = forms.ModelMultipleChoiceField(
-        queryset=Genre.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
-    )
+    genres = GenreMultipleChoiceField()
 
     class Meta:
         model = Game
@@ -105,10 +176,7 @@ class MovieEditForm(forms.ModelForm):
     """
     Form that allows for logged users to be able to edit already existing movie details
     """
-    genres = forms.ModelMultipleChoiceField(
-        queryset=Genre.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
-    )
+    genres = GenreMultipleChoiceField()
 
     class Meta:
         model = Movie
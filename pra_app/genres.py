@@ -0,0 +1,134 @@
+"""
+Genre -> title count map of the genre pages, and the genre registry of the forms.
+
+The genre assignments are the rows of the title/genre through table, indexed by (genre_id, title_id) (see the
+0015_genre_title_index migration), so the titles of a genre are one range of that index, like a posting list.
+The counts of all genres are read with one query grouping that table by genre and kind, and kept in the cache
+until the assignments change: the m2m_changed signals sent by the game and movie forms and title deletions
+drop them (see signals.py), bulk imports drop them themselves. That only reaches the cache of the process making
+the change when the cache is not shared (the local-memory cache of the default settings), so the counts also
+expire after PRA_GENRE_COUNTS_TIMEOUT seconds, which bounds how stale the other processes show them.
+
+The genres themselves are few and rarely change, while every game and movie form lists them and checks the picked
+ones. genre_registry keeps their id -> name map and the ids by normalized name in the memory of each process,
+loaded with one query, together with their version: the number of genres and the last time one was saved, read
+from the database. Every process checks that version at most once per PRA_GENRE_REGISTRY_CHECK_INTERVAL seconds
+and reloads the genres when it changed, and right away after saving or deleting a genre itself (see signals.py),
+so a genre added through one worker is known to all of them within that interval, whatever the cache. Between
+checks reading the registry costs no query.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import Genre, Title
+
+GENRE_COUNTS_KEY = 'pra:genres:title-counts'
+
+
+def normalize_genre(name):
+    """
+    Genre name as compared for uniqueness, like the genre_name_ci_unique constraint on Lower(name) compares the
+    stored names
+    """
+    return Genre.clean_name(name).lower()
+
+
+def get_registry_check_interval():
+    return getattr(settings, 'PRA_GENRE_REGISTRY_CHECK_INTERVAL', 5)
+
+
+def get_counts_timeout():
+    return getattr(settings, 'PRA_GENRE_COUNTS_TIMEOUT', 60)
+
+
+def genre_title_counts():
+    """
+    Returns the number of titles of every genre by kind, as genre id -> {kind: count}
+    """
+    counts = cache.get(GENRE_COUNTS_KEY)
+    if counts is None:
+        counts = {}
+        rows = Title.genres.through.objects.order_by().values('genre_id', 'title__kind').annotate(count=Count('pk'))
+        for row in rows:
+            counts.setdefault(row['genre_id'], {})[row['title__kind']] = row['count']
+        cache.set(GENRE_COUNTS_KEY, counts, get_counts_timeout())
+    return counts
+
+
+def invalidate_genre_title_counts():
+    """
+    Drops the counts right away and once more when the current transaction commits, so counts read from the
+    old assignments in between are not kept either
+    """
+    cache.delete(GENRE_COUNTS_KEY)
+    transaction.on_commit(lambda: cache.delete(GENRE_COUNTS_KEY))
+
+
+class GenreRegistry:
+    """
+    All genres of the database, as (id, name) pairs and by normalized name, reloaded when their version changes
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.version = None
+            self.checked_at = None
+            self.names = {}
+            self.ids = {}
+
+    def current_version(self):
+        """
+        The number of genres and the last time one was saved: adding, renaming or deleting a genre changes it
+        """
+        version = Genre.objects.aggregate(count=Count('pk'), last_saved=Max('updated_at'))
+        return version['count'], version['last_saved']
+
+    def load(self):
+        """
+        Returns the id -> name and normalized name -> id maps, reading the genres when their version changed
+        """
+        now = time.monotonic()
+        with self.lock:
+            if self.checked_at is not None and now - self.checked_at < get_registry_check_interval():
+                return self.names, self.ids
+            # the version is read before the genres, a change in between makes the next check read them again
+            version = self.current_version()
+            if version != self.version:
+                genres = list(Genre.objects.order_by('pk').values_list('pk', 'name'))
+                self.names = dict(genres)
+                self.ids = {normalize_genre(name): pk for pk, name in genres}
+                self.version = version
+            self.checked_at = now
+            return self.names, self.ids
+
+    def choices(self):
+        return list(self.load()[0].items())
+
+    def name_of(self, genre_id):
+        return self.load()[0].get(genre_id)
+
+    def id_for(self, name):
+        """
+        Id of the genre with the given name (compared normalized), None when there is none
+        """
+        return self.load()[1].get(normalize_genre(name))
+
+    def invalidate(self):
+        """
+        Makes the next use of this process check the version, right away and once more when the current
+        transaction commits, so genres read from the database before the commit are not kept either
+        """
+        self.checked_at = None
+        transaction.on_commit(lambda: setattr(self, 'checked_at', None))
+
+
+genre_registry = GenreRegistry()
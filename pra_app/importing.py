@@ -0,0 +1,168 @@
+"""
+Streaming bulk import of games and movies, used by the import_catalog command.
+
+Rows are read one by one from a CSV or JSON lines file and written in batches: the titles with one
+bulk_create, the genre links with one bulk insert into the M2M table (COPY on PostgreSQL). Genres are
+resolved with a name -> id map loaded once, and only genres missing from it are created. Memory use depends
+on the batch size and the number of genres, not on the size of the file.
+"""
+import csv
+import io
+import json
+import time
+from datetime import date
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .cache import response_cache
+from .genres import genre_registry, invalidate_genre_title_counts, normalize_genre
+from .models import Game, Genre, Movie, Title
+
+# kind column value -> model
+KINDS = {'game': Game, 'movie': Movie}
+GENRE_SEPARATOR = '|'
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def read_rows(stream, file_format):
+    """
+    Yields the rows of a CSV (with a header line) or JSON lines stream as dicts
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    elif file_format == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f'Unknown format: {file_format}')
+
+
+class CatalogImporter:
+    """
+    Imports rows with kind (game or movie, default_kind when missing), title, release_date (YYYY-MM-DD),
+    description and genres (a list, or names separated by |) columns.
+    """
+
+    def __init__(self, batch_size=1000, default_kind=None, use_copy=True, using=DEFAULT_DB_ALIAS):
+        self.batch_size = batch_size
+        self.default_kind = default_kind
+        self.using = using
+        self.connection = connections[using]
+        self.use_copy = use_copy and self.connection.vendor == 'postgresql'
+        self.genre_ids = {}
+        self.imported = 0
+        self.skipped = 0
+        self.started = None
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return self.imported / elapsed if elapsed else 0
+
+    def run(self, rows, skip=0, on_batch=None):
+        """
+        Imports the rows, skipping the first `skip` ones (already imported by an interrupted run).
+        on_batch(rows_done) is called after every committed batch, rows_done counting the skipped rows too.
+        """
+        if not self.connection.features.can_return_rows_from_bulk_insert:
+            raise NotImplementedError('The database does not return the ids of bulk inserted rows')
+
+        self.started = time.monotonic()
+        self.genre_ids = {normalize_genre(name): pk
+                          for pk, name in Genre.objects.using(self.using).values_list('pk', 'name').iterator()}
+        done = 0
+        batch = []
+        # titles of the first batch after a resume may have been committed right before the interruption
+        deduplicate = skip > 0
+        for done, row in enumerate(rows, start=1):
+            if done <= skip:
+                continue
+            try:
+                batch.append(self.parse(row))
+            except InvalidRow:
+                self.skipped += 1
+            if len(batch) >= self.batch_size:
+                self.write(batch, deduplicate)
+                deduplicate = False
+                batch = []
+                if on_batch:
+                    on_batch(done)
+        if batch:
+            self.write(batch, deduplicate)
+        if on_batch:
+            on_batch(done)
+        response_cache.invalidate('genres', 'genre-titles', *(f'{model._meta.model_name}s' for model in KINDS.values()))
+        # the genre links were inserted without m2m_changed signals
+        invalidate_genre_title_counts()
+
+    def parse(self, row):
+        kind = (row.get('kind') or self.default_kind or '').strip().lower()
+        title = (row.get('title') or '').strip()
+        if kind not in KINDS or not title:
+            raise InvalidRow(row)
+        try:
+            release_date = date.fromisoformat(row['release_date']) if row.get('release_date') else None
+        except (TypeError, ValueError):
+            raise InvalidRow(row)
+        genres = row.get('genres') or []
+        if isinstance(genres, str):
+            genres = genres.split(GENRE_SEPARATOR)
+        # as the names are stored, so genres differing only past the stored length are one genre too
+        names = [Genre.clean_name(name)[:64] for name in genres]
+        genres = {normalize_genre(name): name for name in names if name}
+        instance = KINDS[kind](title=title[:124], release_date=release_date, description=row.get('description') or None)
+        return instance, genres
+
+    def write(self, batch, deduplicate=False):
+        self.skipped += len(batch)
+        with transaction.atomic(using=self.using):
+            self.create_genres({key: name for _, genres in batch for key, name in genres.items()})
+            rows = self.without_existing(batch) if deduplicate else batch
+            if not rows:
+                return
+            self.skipped -= len(rows)
+            self.imported += len(rows)
+            # games and movies share the title table, so a batch takes one insert whatever its kinds
+            Title.objects.using(self.using).bulk_create([instance for instance, _ in rows])
+            self.insert_links(Title.genres.through, 'title_id', [
+                (instance.pk, self.genre_ids[key]) for instance, genres in rows for key in genres])
+
+    def create_genres(self, genres):
+        missing = [Genre(name=name) for key, name in genres.items() if key not in self.genre_ids]
+        if missing:
+            created = Genre.objects.using(self.using).bulk_create(missing)
+            # bulk_create sends no post_save signals
+            genre_registry.invalidate()
+            for key, genre in zip((key for key in genres if key not in self.genre_ids), created):
+                self.genre_ids[key] = genre.pk
+
+    def without_existing(self, rows):
+        existing = set(Title.objects.using(self.using).filter(
+            title__in=[instance.title for instance, _ in rows]).values_list('kind', 'title', 'release_date'))
+        return [(instance, genres) for instance, genres in rows
+                if (instance.kind, instance.title, instance.release_date) not in existing]
+
+    def insert_links(self, through, fk, links):
+        if not links:
+            return
+        if not self.use_copy:
+            through.objects.using(self.using).bulk_create(
+                [through(**{fk: title_id, 'genre_id': genre_id}) for title_id, genre_id in links],
+                batch_size=self.batch_size)
+            return
+
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+        sql = f'COPY {through._meta.db_table} ({fk}, genre_id) FROM STDIN'
+        with self.connection.cursor() as cursor:
+            if is_psycopg3:
+                with cursor.cursor.copy(sql) as copy:
+                    for link in links:
+                        copy.write_row(link)
+            else:
+                data = io.StringIO(''.join(f'{title_id}\t{genre_id}\n' for title_id, genre_id in links))
+                cursor.cursor.copy_expert(sql, data)
@@ -0,0 +1,146 @@
+"""
+Materialized leaderboards of the best rated games and movies, overall and per genre.
+
+Titles are ranked by an IMDb-style Bayesian weighted rating
+
+    score = (v * R + m * C) / (v + m)
+
+v being the number of reviews of the title, R its average rating, C the average rating of all reviews of titles
+of its kind (the prior) and m the PRA_LEADERBOARD_MIN_REVIEWS setting, so a title with a couple of 10s does not
+outrank one with hundreds of 9s. The scores are stored in LeaderboardEntry, so a leaderboard page is a single
+range of its (kind, genre, score) index. Review writes move the entries of their titles as they happen (with the
+prior of the last full refresh), the refresh_leaderboards command recomputes all of them and the prior. The priors
+are stored in LeaderboardPrior, so the web workers and the refresh command all score with the same ones.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Sum
+
+from .cache import response_cache
+from .models import KIND_MODELS, LeaderboardEntry, LeaderboardPrior, Title
+
+SCORE_PRECISION = Decimal('0.0001')
+# decimal places of LeaderboardPrior.prior, the priors are rounded to them before scoring, like when read back
+PRIOR_PRECISION = Decimal('0.0000000001')
+TITLE_COLUMNS = ('pk', 'kind', 'review_count', 'rating_sum')
+
+
+def get_min_reviews():
+    return getattr(settings, 'PRA_LEADERBOARD_MIN_REVIEWS', 5)
+
+
+def compute_priors(using=DEFAULT_DB_ALIAS):
+    """
+    Average rating of all reviews of every kind, from the rating aggregates of the titles, stored in
+    LeaderboardPrior for the incremental updates
+    """
+    priors = dict.fromkeys(KIND_MODELS, Decimal(0))
+    rows = Title.objects.using(using).filter(review_count__gt=0).order_by().values('kind').annotate(
+        count=Sum('review_count'), total=Sum('rating_sum'))
+    for row in rows:
+        priors[row['kind']] = (Decimal(row['total']) / row['count']).quantize(PRIOR_PRECISION)
+    LeaderboardPrior.objects.using(using).bulk_create(
+        [LeaderboardPrior(kind=kind, prior=prior) for kind, prior in priors.items()],
+        update_conflicts=True, unique_fields=['kind'], update_fields=['prior'])
+    return priors
+
+
+def get_priors(using=DEFAULT_DB_ALIAS):
+    """
+    The stored priors, computed when there are none yet
+    """
+    priors = dict(LeaderboardPrior.objects.using(using).values_list('kind', 'prior'))
+    if len(priors) < len(KIND_MODELS):
+        return compute_priors(using)
+    return priors
+
+
+def weighted_rating(review_count, rating_sum, prior, min_reviews):
+    """
+    Bayesian weighted rating of a title with review_count reviews whose ratings add up to rating_sum
+    """
+    if review_count + min_reviews == 0:
+        return Decimal(0)
+    score = (Decimal(rating_sum) + min_reviews * prior) / (review_count + min_reviews)
+    return score.quantize(SCORE_PRECISION)
+
+
+def build_entries(rows, priors, using=DEFAULT_DB_ALIAS):
+    """
+    Leaderboard entries of the titles (TITLE_COLUMNS values() rows) that have reviews, in the leaderboard of their
+    kind and in the ones of their genres
+    """
+    rows = [row for row in rows if row['review_count']]
+    genres = {}
+    links = Title.genres.through.objects.using(using).filter(title_id__in=[row['pk'] for row in rows])
+    for title_id, genre_id in links.values_list('title_id', 'genre_id'):
+        genres.setdefault(title_id, []).append(genre_id)
+
+    min_reviews = get_min_reviews()
+    entries = []
+    for row in rows:
+        score = weighted_rating(row['review_count'], row['rating_sum'], priors[row['kind']], min_reviews)
+        for genre_id in [None, *genres.get(row['pk'], ())]:
+            entries.append(LeaderboardEntry(kind=row['kind'], genre_id=genre_id, title_id=row['pk'], score=score))
+    return entries
+
+
+def refresh_leaderboards(using=DEFAULT_DB_ALIAS, batch_size=1000):
+    """
+    Recomputes the priors and all leaderboard entries from the rating aggregates of the titles
+    """
+    priors = compute_priors(using)
+    titles = Title.objects.using(using).filter(review_count__gt=0).order_by('pk').values(*TITLE_COLUMNS)
+    with transaction.atomic(using=using):
+        LeaderboardEntry.objects.using(using).all().delete()
+        batch = []
+        for row in titles.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                LeaderboardEntry.objects.using(using).bulk_create(build_entries(batch, priors, using))
+                batch = []
+        LeaderboardEntry.objects.using(using).bulk_create(build_entries(batch, priors, using))
+    response_cache.invalidate('leaderboards')
+
+
+def rebuild_leaderboard_entries(title_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Replaces the entries of the titles, for titles entering or leaving the leaderboards and changed genres
+    """
+    title_ids = {pk for pk in title_ids if pk is not None}
+    if not title_ids:
+        return
+    rows = Title.objects.using(using).filter(pk__in=title_ids).values(*TITLE_COLUMNS)
+    with transaction.atomic(using=using):
+        LeaderboardEntry.objects.using(using).filter(title__in=title_ids).delete()
+        LeaderboardEntry.objects.using(using).bulk_create(build_entries(rows, get_priors(using), using))
+    response_cache.invalidate('leaderboards')
+
+
+def update_leaderboard_entries(title_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Moves the entries of the titles to their current rating aggregates, after review changes: the scores of
+    listed titles are updated in place, titles that got their first review or lost their last one are added
+    or removed
+    """
+    title_ids = {pk for pk in title_ids if pk is not None}
+    if not title_ids:
+        return
+    rows = Title.objects.using(using).filter(pk__in=title_ids).values(*TITLE_COLUMNS)
+    entries = LeaderboardEntry.objects.using(using)
+    listed = set(entries.filter(title__in=title_ids, genre__isnull=True).values_list('title_id', flat=True))
+    priors = get_priors(using)
+    min_reviews = get_min_reviews()
+
+    changed = []
+    with transaction.atomic(using=using):
+        for row in rows:
+            if bool(row['review_count']) != (row['pk'] in listed):
+                changed.append(row['pk'])
+            elif row['review_count']:
+                score = weighted_rating(row['review_count'], row['rating_sum'], priors[row['kind']], min_reviews)
+                entries.filter(title=row['pk']).update(score=score)
+        rebuild_leaderboard_entries(changed, using)
+    response_cache.invalidate('leaderboards')
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from pra_app.benchmarks import PAGES, check_results, load_baseline, run_benchmarks, save_baseline
+
+
+class Command(BaseCommand):
+    """
+    Times the pages of the app on the catalog in the database (see seed_catalog) and counts their SQL queries
+    (see pra_app.benchmarks). Fails when a page runs more queries than its budget, or when --baseline is given
+    and a page got slower than in the baseline by more than --threshold. --save-baseline writes the results
+    of the run as the new baseline instead.
+    """
+    help = 'Benchmarks the pages of the app against their query budgets and a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pages', nargs='*', metavar='page',
+                            help=f'Pages to benchmark, all by default ({", ".join(PAGES)})')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per page')
+        parser.add_argument('--baseline', help='JSON file with the results of an earlier run')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results to the --baseline file')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Share a median time may grow over the baseline before failing')
+        parser.add_argument('--cache', action='store_true', help='Keep the page cache on')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database holding the catalog')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('The number of requests has to be positive')
+        unknown = [name for name in options['pages'] if name not in PAGES]
+        if unknown:
+            raise CommandError(f'Unknown pages: {", ".join(unknown)}')
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline needs the --baseline file to write')
+
+        try:
+            results = run_benchmarks(options['pages'] or None, repeat=options['repeat'], use_cache=options['cache'],
+                                     using=options['database'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        baseline = None
+        if options['baseline'] and not options['save_baseline']:
+            try:
+                baseline = load_baseline(options['baseline'])
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Can not read the baseline: {exc}')
+        problems = check_results(results, baseline, threshold=options['threshold'])
+
+        for name, result in results.items():
+            line = (f'{name:<24} {result["median_ms"]:>9.1f}ms {result["queries"]:>3}/{result["budget"]} queries  '
+                    f'{result["path"]}')
+            if problems[name]:
+                self.stdout.write(self.style.ERROR(f'{line}  FAILED: {"; ".join(problems[name])}'))
+            else:
+                self.stdout.write(line)
+
+        if options['save_baseline']:
+            save_baseline(options['baseline'], results)
+            self.stdout.write(f'Baseline written to {options["baseline"]}')
+        failed = [name for name, found in problems.items() if found]
+        if failed:
+            raise CommandError(f'{len(failed)} of {len(results)} pages failed: {", ".join(failed)}')
@@ -0,0 +1,88 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import AsyncClient, Client, override_settings
+
+from pra import urls
+from pra_app.async_views import ASYNC_VARIANTS, swap_views
+
+DEFAULT_PATHS = ['/games/', '/games/?sort_by=rating', '/movies/', '/search/?query=the']
+
+
+class Command(BaseCommand):
+    """
+    Compares the throughput of the sync views, served by a pool of threads like a threaded WSGI server, with the
+    one of their async variants (see pra_app.async_views), served by one event loop like an ASGI server, at the
+    same number of concurrent requests.
+
+    Requests go through the Django request handlers in this process, so the numbers leave out the web server
+    and the network. The page cache is turned off unless --cache is given.
+    """
+    help = 'Benchmarks the sync (WSGI) and async (ASGI) read only views at high concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS, help='Paths requested in turns')
+        parser.add_argument('--requests', type=int, default=1000, help='Number of requests per mode')
+        parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight at a time')
+        parser.add_argument('--mode', choices=('sync', 'async', 'both'), default='both', help='Views to benchmark')
+        parser.add_argument('--cache', action='store_true', help='Keep the page cache on')
+
+    def handle(self, *args, **options):
+        paths = [options['paths'][number % len(options['paths'])] for number in range(options['requests'])]
+        modes = ['sync', 'async'] if options['mode'] == 'both' else [options['mode']]
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if not options['cache']:
+            overrides['PRA_RESPONSE_CACHE'] = None
+
+        sync_variants = {variant: view for view, variant in ASYNC_VARIANTS.items()}
+        for mode in modes:
+            variants = ASYNC_VARIANTS if mode == 'async' else sync_variants
+            urlconf = ModuleType(f'{mode}_urls')
+            urlconf.urlpatterns = swap_views(urls.urlpatterns, variants)
+            with override_settings(ROOT_URLCONF=urlconf, **overrides):
+                run = self.run_async if mode == 'async' else self.run_sync
+                started = time.perf_counter()
+                results = run(paths, options['concurrency'])
+                elapsed = time.perf_counter() - started
+            self.report(mode, results, elapsed)
+
+    def run_sync(self, paths, concurrency):
+        def request(path):
+            started = time.perf_counter()
+            try:
+                return Client().get(path).status_code, time.perf_counter() - started
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(request, paths))
+
+    def run_async(self, paths, concurrency):
+        async def main():
+            client = AsyncClient()
+            slots = asyncio.Semaphore(concurrency)
+
+            async def request(path):
+                async with slots:
+                    started = time.perf_counter()
+                    response = await client.get(path)
+                    return response.status_code, time.perf_counter() - started
+
+            return await asyncio.gather(*(request(path) for path in paths))
+
+        return asyncio.run(main())
+
+    def report(self, mode, results, elapsed):
+        latencies = sorted(latency for _, latency in results)
+        errors = sum(status != 200 for status, _ in results)
+        percentile = (lambda share: latencies[min(int(len(latencies) * share), len(latencies) - 1)] * 1000)
+        self.stdout.write(
+            f'{mode:>5}: {len(results)} requests in {elapsed:.2f}s, {len(results) / elapsed:.1f} req/s, '
+            f'p50 {statistics.median(latencies) * 1000:.1f}ms, p95 {percentile(0.95):.1f}ms, {errors} errors'
+        )
@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from pra_app.exporting import EXPORTS, FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    """
+    Streams games, movies or reviews as CSV or JSON lines to a file or to the standard output
+    (see pra_app.exporting), with flat memory use regardless of the number of rows.
+    """
+    help = 'Exports games, movies or reviews as CSV or JSON lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS), help='What to export')
+        parser.add_argument('--format', choices=FORMATS, default='csv', help='Output format')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched and written at a time')
+        parser.add_argument('-o', '--output', help='File to write to, the standard output by default')
+
+    def handle(self, *args, **options):
+        chunks = iter_export(options['export'], options['format'], compress=options['gzip'],
+                             chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            output = getattr(self.stdout, 'buffer', None) or sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
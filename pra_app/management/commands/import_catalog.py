@@ -0,0 +1,61 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from pra_app.importing import KINDS, CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    """
+    Streams games and movies from a CSV or JSON lines file into the database in batches (see pra_app.importing).
+
+    After every committed batch the number of processed rows is written to <file>.checkpoint, and --resume
+    continues an interrupted import from there. The checkpoint is removed once the whole file is imported.
+    """
+    help = 'Imports games and movies from a CSV or JSON lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header line) or JSON lines file to import')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Format of the file, guessed from its extension by default')
+        parser.add_argument('--kind', choices=sorted(KINDS), help='Kind of the rows without a kind column')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per transaction')
+        parser.add_argument('--resume', action='store_true', help='Continue from the checkpoint of an earlier run')
+        parser.add_argument('--no-copy', action='store_true', help='Do not use COPY on PostgreSQL')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to import into')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        checkpoint = f'{path}.checkpoint'
+        if options['batch_size'] < 1:
+            raise CommandError('The batch size has to be positive')
+
+        skip = 0
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as file:
+                skip = json.load(file)['rows']
+            self.stdout.write(f'Resuming after row {skip}')
+
+        importer = CatalogImporter(batch_size=options['batch_size'], default_kind=options['kind'],
+                                   use_copy=not options['no_copy'], using=options['database'])
+
+        def on_batch(rows_done):
+            with open(checkpoint, 'w') as file:
+                json.dump({'rows': rows_done}, file)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{rows_done} rows read, {importer.imported} imported '
+                                  f'({importer.rows_per_second:.0f} rows/s)')
+
+        try:
+            with open(path, newline='', encoding='utf-8') as file:
+                importer.run(read_rows(file, file_format), skip=skip, on_batch=on_batch)
+        except (OSError, ValueError, NotImplementedError) as exc:
+            raise CommandError(f'Import stopped: {exc}. Run again with --resume to continue.')
+
+        os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.imported} titles ({importer.rows_per_second:.0f} rows/s), '
+            f'skipped {importer.skipped} invalid or already imported rows'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from pra_app.leaderboards import refresh_leaderboards
+from pra_app.ratings import refresh_rating_aggregates
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the review count, rating sum, average rating and rating histogram of every game and movie
+    from the reviews, reading them with one query grouping the reviews by title.
+    Meant for fixing the aggregates after raw SQL changes or fixture loads, the app keeps them current on its own.
+    """
+    help = 'Rebuilds the rating aggregates of all games and movies from their reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild the aggregates in')
+
+    def handle(self, *args, **options):
+        refresh_rating_aggregates(using=options['database'])
+        # the leaderboards are computed from the aggregates
+        refresh_leaderboards(using=options['database'])
+        self.stdout.write('Rebuilt rating aggregates of all games and movies')
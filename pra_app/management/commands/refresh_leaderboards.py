@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from pra_app.leaderboards import refresh_leaderboards
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the average ratings the weighted ratings are pulled towards and every leaderboard entry.
+    Review writes keep the entries current with the averages of the last refresh, so this is meant to be run
+    periodically (e.g. nightly from cron).
+    """
+    help = 'Refreshes the top rated leaderboards of games and movies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to refresh the leaderboards in')
+
+    def handle(self, *args, **options):
+        refresh_leaderboards(using=options['database'])
+        self.stdout.write('Refreshed the leaderboards of all games and movies')
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from pra_app.benchmarks import GENRE_NAMES, seed_catalog
+
+
+class Command(BaseCommand):
+    """
+    Fills the database with a generated catalog of games, movies and reviews for the page benchmarks
+    (see pra_app.benchmarks). The same --seed gives the same catalog.
+    """
+    help = 'Adds a synthetic catalog of games, movies, genres, users and reviews to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=100000, help='Games and movies to create')
+        parser.add_argument('--reviews', type=int, default=5000000, help='Reviews to create')
+        parser.add_argument('--users', type=int, default=1000, help='Users writing the reviews')
+        parser.add_argument('--genres', type=int, default=len(GENRE_NAMES), help='Genres of the titles')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows written per insert')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to seed')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('The batch size has to be positive')
+
+        def on_batch(stage, rows_done):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{rows_done} {stage} created')
+
+        try:
+            created = seed_catalog(titles=options['titles'], reviews=options['reviews'], users=options['users'],
+                                   genres=options['genres'], seed=options['seed'], batch_size=options['batch_size'],
+                                   using=options['database'], on_batch=on_batch)
+        except NotImplementedError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(', '.join(f'{count} {name}' for name, count in created.items())
+                                             + ' created'))
@@ -0,0 +1,320 @@
+"""
+Request metrics in the Prometheus text format, exposed at /metrics (MetricsView).
+
+metrics_middleware records for every request, by URL name (the view label):
+
+    pra_http_requests_total                     requests, by view, method and status code
+    pra_http_request_duration_seconds           histogram of the response times
+    pra_db_queries_total                        SQL queries run
+    pra_db_query_duration_seconds_total         time spent in SQL queries
+    pra_response_cache_requests_total           page cache hits and misses (the X-Cache header), by result
+
+The queries are timed by an execute wrapper installed on every database connection when it is opened, which
+adds them to the counters of the request in a context variable, so the queries the async views run in other
+threads through sync_to_async() are counted too.
+
+Metrics are on when PRA_METRICS is set. The values are kept in memory, or with PRA_METRICS_DIR in a file per
+process in that directory, memory-mapped, so recording a value is a write to memory in any case. /metrics adds up
+the files of all processes, so any worker answers for all of them, like the multiprocess mode of
+prometheus_client. Counters of stopped processes stay in their files, the directory is meant to be emptied when
+the server (re)starts.
+"""
+import contextvars
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKET_LABELS = (*map(str, DURATION_BUCKETS), '+Inf')
+UNMATCHED_VIEW = '<unmatched>'
+
+# name -> (type, help)
+METRICS = {
+    'pra_http_requests_total': ('counter', 'Requests answered, by view, method and status code'),
+    'pra_http_request_duration_seconds': ('histogram', 'Time to answer a request, by view'),
+    'pra_db_queries_total': ('counter', 'SQL queries run while answering requests, by view'),
+    'pra_db_query_duration_seconds_total': ('counter', 'Time spent in SQL queries while answering requests, by view'),
+    'pra_response_cache_requests_total': ('counter', 'Requests for cached pages, by view and hit or miss'),
+}
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_request_queries = contextvars.ContextVar('pra_request_queries', default=None)
+
+
+def metrics_enabled():
+    return bool(getattr(settings, 'PRA_METRICS', False))
+
+
+class MemoryValues:
+    """
+    Values of the series of this process, by (name, labels) key
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, key, amount=1):
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def read_all(self):
+        with self.lock:
+            return dict(self._values)
+
+
+class MmapValues:
+    """
+    Values of the series of this process in a memory-mapped file. The file holds the number of used bytes,
+    then an entry per series: the length of its JSON encoded key, the key padded to 8 bytes and the value
+    as a double. Only this process writes to its file, others read it.
+    """
+    initial_size = 64 * 1024
+
+    def __init__(self, directory):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.directory = directory
+        self.path = os.path.join(directory, f'pra-metrics-{self.pid}.db')
+        self._offsets = {}
+        with open(self.path, 'a+b') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                file.truncate(self.initial_size)
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = struct.unpack_from('<I', self._map, 0)[0] or 8
+        for key, _, offset in self._entries(self._map, self._used):
+            self._offsets[key] = offset
+
+    def inc(self, key, amount=1):
+        offset = self._offsets.get(key)
+        if offset is None:
+            offset = self._add(key)
+        struct.pack_into('<d', self._map, offset, struct.unpack_from('<d', self._map, offset)[0] + amount)
+
+    def _add(self, key):
+        encoded = json.dumps([key[0], list(key[1])]).encode()
+        size = 4 + len(encoded)
+        size += -size % 8
+        if self._used + size + 8 > len(self._map):
+            new_size = len(self._map)
+            while self._used + size + 8 > new_size:
+                new_size *= 2
+            self._map.close()
+            self._file.truncate(new_size)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        struct.pack_into(f'<I{len(encoded)}s', self._map, self._used, len(encoded), encoded)
+        offset = self._used + size
+        struct.pack_into('<d', self._map, offset, 0.0)
+        self._used = offset + 8
+        # the entry is complete before readers are told about it
+        struct.pack_into('<I', self._map, 0, self._used)
+        self._offsets[key] = offset
+        return offset
+
+    @staticmethod
+    def _entries(data, used):
+        position = 8
+        while position < used:
+            length = struct.unpack_from('<I', data, position)[0]
+            name, labels = json.loads(bytes(data[position + 4:position + 4 + length]))
+            offset = position + 4 + length + (-(4 + length) % 8)
+            yield (name, tuple(map(tuple, labels))), struct.unpack_from('<d', data, offset)[0], offset
+            position = offset + 8
+
+    def read_all(self):
+        """
+        Sums of the values of all the processes writing to the directory
+        """
+        values = {}
+        for path in glob.glob(os.path.join(self.directory, 'pra-metrics-*.db')):
+            with open(path, 'rb') as file:
+                data = file.read()
+            if len(data) < 8:
+                continue
+            for key, value, _ in self._entries(data, struct.unpack_from('<I', data, 0)[0]):
+                values[key] = values.get(key, 0) + value
+        return values
+
+
+_values = None
+_values_lock = threading.Lock()
+
+
+def get_values():
+    """
+    Returns the value store of this process (a new one after a fork, so every worker writes to its own file)
+    """
+    global _values
+    values = _values
+    if values is None or values.pid != os.getpid():
+        with _values_lock:
+            if _values is None or _values.pid != os.getpid():
+                directory = getattr(settings, 'PRA_METRICS_DIR', None)
+                _values = MmapValues(directory) if directory else MemoryValues()
+            values = _values
+    return values
+
+
+def reset_values():
+    global _values
+    with _values_lock:
+        _values = None
+
+
+def request_series(view, method, status, bucket, cache_result):
+    """
+    Keys of the series a request adds to: requests, duration bucket, sum and count, queries, query time and
+    page cache result (None without one)
+    """
+    view_label = (('view', view),)
+    return (
+        ('pra_http_requests_total', (('view', view), ('method', method), ('status', str(status)))),
+        # buckets are stored per bucket and added up when exposed
+        ('pra_http_request_duration_seconds_bucket', (('view', view), ('le', bucket))),
+        ('pra_http_request_duration_seconds_sum', view_label),
+        ('pra_http_request_duration_seconds_count', view_label),
+        ('pra_db_queries_total', view_label),
+        ('pra_db_query_duration_seconds_total', view_label),
+        ('pra_response_cache_requests_total', (('view', view), ('result', cache_result))) if cache_result else None,
+    )
+
+
+# (view, method, status, bucket, cache result) -> request_series(), so the keys are built once
+_series = {}
+
+
+def record_request(view, method, status, duration, queries, query_time, cache_result=None):
+    bucket = BUCKET_LABELS[bisect_left(DURATION_BUCKETS, duration)]
+    keys = _series.get((view, method, status, bucket, cache_result))
+    if keys is None:
+        keys = _series[view, method, status, bucket, cache_result] = request_series(
+            view, method, status, bucket, cache_result)
+    requests_key, bucket_key, sum_key, count_key, queries_key, query_time_key, cache_key = keys
+
+    values = get_values()
+    with values.lock:
+        values.inc(requests_key)
+        values.inc(bucket_key)
+        values.inc(sum_key, duration)
+        values.inc(count_key)
+        if queries:
+            values.inc(queries_key, queries)
+            values.inc(query_time_key, query_time)
+        if cache_key:
+            values.inc(cache_key)
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    Execute wrapper adding the query to the counters of the current request, if any
+    """
+    counters = _request_queries.get()
+    if counters is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counters[0] += 1
+        counters[1] += time.perf_counter() - started
+
+
+def install_query_timer(connection):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def start_request():
+    return _request_queries.set([0, 0.0]), time.perf_counter()
+
+
+def finish_request(request, response, token, started):
+    duration = time.perf_counter() - started
+    queries, query_time = _request_queries.get()
+    _request_queries.reset(token)
+    match = request.resolver_match
+    cache_result = response.get('X-Cache')
+    record_request(match.view_name if match else UNMATCHED_VIEW, request.method, response.status_code, duration,
+                   queries, query_time, cache_result.lower() if cache_result else None)
+    return response
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Records the metrics of every request (see above), left out of the middleware chain when PRA_METRICS is off
+    """
+    if not metrics_enabled():
+        raise MiddlewareNotUsed
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token, started = start_request()
+            try:
+                response = await get_response(request)
+            except BaseException:
+                _request_queries.reset(token)
+                raise
+            return finish_request(request, response, token, started)
+    else:
+        def middleware(request):
+            token, started = start_request()
+            try:
+                response = get_response(request)
+            except BaseException:
+                _request_queries.reset(token)
+                raise
+            return finish_request(request, response, token, started)
+    return middleware
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def exposition(values=None):
+    """
+    The values of all the processes in the Prometheus text format
+    """
+    values = get_values().read_all() if values is None else values
+    series = {}
+    for (name, labels), value in values.items():
+        series.setdefault(name, {})[labels] = value
+
+    lines = []
+    for name, (metric_type, description) in METRICS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {metric_type}']
+        if metric_type != 'histogram':
+            for labels, value in sorted(series.get(name, {}).items()):
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+            continue
+
+        buckets = {}
+        for labels, value in series.get(f'{name}_bucket', {}).items():
+            other = tuple(label for label in labels if label[0] != 'le')
+            buckets.setdefault(other, {})[dict(labels)['le']] = value
+        for labels, count in sorted(series.get(f'{name}_count', {}).items()):
+            cumulative = 0
+            for bucket in BUCKET_LABELS:
+                cumulative += buckets.get(labels, {}).get(bucket, 0)
+                lines.append(f'{name}_bucket{format_labels((*labels, ("le", bucket)))} {format_value(cumulative)}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(series[f"{name}_sum"][labels])}')
+            lines.append(f'{name}_count{format_labels(labels)} {format_value(count)}')
+    return '\n'.join(lines) + '\n'
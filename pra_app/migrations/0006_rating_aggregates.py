@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-16 12:25
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    """
+    Computes the aggregates of the already existing games and movies from their reviews
+    """
+    Review = apps.get_model('pra_app', 'Review')
+    db_alias = schema_editor.connection.alias
+    for fk, model_name in (('game', 'Game'), ('movie', 'Movie')):
+        titles = apps.get_model('pra_app', model_name).objects.using(db_alias)
+        reviews = Review.objects.using(db_alias).filter(**{fk: OuterRef('pk')}).order_by().values(fk)
+        titles.update(
+            review_count=Coalesce(Subquery(reviews.annotate(count=Count('pk')).values('count')), 0),
+            rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')),
+                                Value(Decimal(0))),
+        )
+        titles.filter(review_count__gt=0).update(
+            average_rating=Cast(F('rating_sum'), FloatField()) / F('review_count'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pra_app', '0005_alter_review_user_delete_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='average_rating',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=4),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='average_rating',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=4),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-16 14:02
+
+from django.db import migrations
+
+# The search_vector columns are not model fields: they are only used by the PostgreSQL search backend and kept
+# current by a trigger, which also covers bulk inserts and COPY that bypass model signals.
+TABLES = ('pra_app_game', 'pra_app_movie')
+
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION pra_app_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+ADD_SEARCH_VECTOR = [
+    "ALTER TABLE {table} ADD COLUMN search_vector tsvector",
+    "CREATE TRIGGER {table}_search_vector_update BEFORE INSERT OR UPDATE OF title, description ON {table} "
+    "FOR EACH ROW EXECUTE PROCEDURE pra_app_search_vector_update()",
+    "UPDATE {table} SET title = title",
+    "CREATE INDEX {table}_search_vector_gin ON {table} USING gin (search_vector)",
+]
+
+DROP_SEARCH_VECTOR = [
+    "DROP TRIGGER IF EXISTS {table}_search_vector_update ON {table}",
+    "ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def add_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_FUNCTION)
+    for table in TABLES:
+        for statement in ADD_SEARCH_VECTOR:
+            schema_editor.execute(statement.format(table=table))
+
+
+def drop_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        for statement in DROP_SEARCH_VECTOR:
+            schema_editor.execute(statement.format(table=table))
+    schema_editor.execute("DROP FUNCTION IF EXISTS pra_app_search_vector_update()")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pra_app', '0006_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vectors, drop_search_vectors),
+    ]
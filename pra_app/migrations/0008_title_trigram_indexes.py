@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-16 15:10
+
+from django.db import migrations
+
+# Trigram indexes answering the fuzzy title search of the PostgreSQL search backend (pra_app.search.postgres).
+# Other databases use the in-memory trigram index of pra_app.search.memory instead.
+TABLES = ('pra_app_game', 'pra_app_movie')
+
+
+def add_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table in TABLES:
+        schema_editor.execute(f"CREATE INDEX {table}_title_trgm ON {table} USING gin (title gin_trgm_ops)")
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_title_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pra_app', '0007_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_trigram_indexes, drop_trigram_indexes),
+    ]
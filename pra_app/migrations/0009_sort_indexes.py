@@ -0,0 +1,65 @@
+# Generated by Django 4.2.30 on 2026-10-16 16:31
+
+from django.db import migrations, models
+
+# The list views sort release dates with the undated titles last in both directions. Only PostgreSQL can
+# declare that on an index (SQLite already puts nulls last when descending), so these are created by hand.
+RELEASE_DATE_INDEXES = {
+    'postgresql': [
+        "CREATE INDEX {table}_newest_sort_idx ON {table} (release_date DESC NULLS LAST, id DESC)",
+        "CREATE INDEX {table}_oldest_sort_idx ON {table} (release_date ASC NULLS LAST, id ASC)",
+    ],
+    'default': [
+        "CREATE INDEX {table}_newest_sort_idx ON {table} (release_date DESC, id DESC)",
+        "CREATE INDEX {table}_oldest_sort_idx ON {table} (release_date ASC, id ASC)",
+    ],
+}
+TABLES = ('pra_app_game', 'pra_app_movie')
+
+
+def add_release_date_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in TABLES:
+        for statement in RELEASE_DATE_INDEXES.get(vendor, RELEASE_DATE_INDEXES['default']):
+            schema_editor.execute(statement.format(table=table))
+
+
+def drop_release_date_indexes(apps, schema_editor):
+    for table in TABLES:
+        for name in ('newest', 'oldest'):
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{name}_sort_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pra_app', '0008_title_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['title', 'id'], name='game_title_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['-average_rating', '-id'], name='game_rating_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['-review_count', '-id'], name='game_review_count_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['title', 'id'], name='movie_title_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-average_rating', '-id'], name='movie_rating_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['-review_count', '-id'], name='movie_review_count_sort_idx'),
+        ),
+        migrations.RunPython(add_release_date_indexes, drop_release_date_indexes),
+    ]
@@ -0,0 +1,213 @@
+# Generated by Django 4.2.30 on 2026-10-16 18:24
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.core.management.color import no_style
+from django.db import migrations, models
+from django.db.models import F
+
+# Games and movies are moved into the one title table. Games keep their ids, movies get their id plus the
+# highest game id, so the genre links and the reviews are moved with a single UPDATE or INSERT each.
+TITLE_FIELDS = ['title', 'release_date', 'description', 'review_count', 'rating_sum', 'average_rating',
+                'updated_at']
+BATCH_SIZE = 2000
+
+TITLE_INDEXES = {
+    'postgresql': [
+        "CREATE INDEX pra_app_title_newest_sort_idx ON pra_app_title "
+        "(kind, release_date DESC NULLS LAST, id DESC)",
+        "CREATE INDEX pra_app_title_oldest_sort_idx ON pra_app_title (kind, release_date ASC NULLS LAST, id ASC)",
+        "CREATE INDEX pra_app_title_title_trgm ON pra_app_title USING gin (title gin_trgm_ops)",
+        "ALTER TABLE pra_app_title ADD COLUMN search_vector tsvector",
+        "CREATE TRIGGER pra_app_title_search_vector_update BEFORE INSERT OR UPDATE OF title, description "
+        "ON pra_app_title FOR EACH ROW EXECUTE PROCEDURE pra_app_search_vector_update()",
+        "UPDATE pra_app_title SET title = title",
+        "CREATE INDEX pra_app_title_search_vector_gin ON pra_app_title USING gin (search_vector)",
+    ],
+    'default': [
+        "CREATE INDEX pra_app_title_newest_sort_idx ON pra_app_title (kind, release_date DESC, id DESC)",
+        "CREATE INDEX pra_app_title_oldest_sort_idx ON pra_app_title (kind, release_date ASC, id ASC)",
+    ],
+}
+
+
+def batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reset_sequences(schema_editor, *models):
+    for statement in schema_editor.connection.ops.sequence_reset_sql(no_style(), models):
+        schema_editor.execute(statement)
+
+
+def check_deferred_constraints(schema_editor):
+    """
+    Checks the foreign keys of the moved rows now: PostgreSQL defers them to the commit, and refuses to alter a
+    table with such pending checks, which the operations after the move do on the review table
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+def move_titles(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Title = apps.get_model('pra_app', 'Title')
+    Review = apps.get_model('pra_app', 'Review')
+    offset = apps.get_model('pra_app', 'Game').objects.using(db_alias).aggregate(models.Max('pk'))['pk__max'] or 0
+
+    for kind, model_name, id_offset in (('game', 'Game', 0), ('movie', 'Movie', offset)):
+        model = apps.get_model('pra_app', model_name)
+        rows = model.objects.using(db_alias).order_by('pk').values('pk', *TITLE_FIELDS).iterator()
+        for batch in batches(rows):
+            Title.objects.using(db_alias).bulk_create([
+                Title(kind=kind, **{**row, 'pk': row['pk'] + id_offset}) for row in batch])
+
+        links = model.genres.through.objects.using(db_alias).values_list(f'{kind}_id', 'genre_id').iterator()
+        for batch in batches(links):
+            Title.genres.through.objects.using(db_alias).bulk_create([
+                Title.genres.through(title_id=title_id + id_offset, genre_id=genre_id)
+                for title_id, genre_id in batch])
+
+        Review.objects.using(db_alias).filter(**{f'{kind}__isnull': False}).update(
+            title_id=F(f'{kind}_id') + id_offset)
+    reset_sequences(schema_editor, Title)
+    check_deferred_constraints(schema_editor)
+
+
+def move_titles_back(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Title = apps.get_model('pra_app', 'Title')
+    Review = apps.get_model('pra_app', 'Review')
+
+    for kind, model_name in (('game', 'Game'), ('movie', 'Movie')):
+        model = apps.get_model('pra_app', model_name)
+        rows = Title.objects.using(db_alias).filter(kind=kind).order_by('pk').values('pk', *TITLE_FIELDS).iterator()
+        for batch in batches(rows):
+            model.objects.using(db_alias).bulk_create([model(**row) for row in batch])
+
+        links = Title.genres.through.objects.using(db_alias).filter(title__kind=kind).values_list(
+            'title_id', 'genre_id').iterator()
+        for batch in batches(links):
+            model.genres.through.objects.using(db_alias).bulk_create([
+                model.genres.through(**{f'{kind}_id': title_id, 'genre_id': genre_id}) for title_id, genre_id in batch])
+
+        Review.objects.using(db_alias).filter(title__kind=kind).update(**{f'{kind}_id': F('title_id')})
+        reset_sequences(schema_editor, model)
+    check_deferred_constraints(schema_editor)
+
+
+def add_title_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for statement in TITLE_INDEXES.get(vendor, TITLE_INDEXES['default']):
+        schema_editor.execute(statement)
+
+
+def drop_title_indexes(apps, schema_editor):
+    for name in ('newest_sort_idx', 'oldest_sort_idx', 'title_trgm', 'search_vector_gin'):
+        schema_editor.execute(f"DROP INDEX IF EXISTS pra_app_title_{name}")
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP TRIGGER IF EXISTS pra_app_title_search_vector_update ON pra_app_title")
+        schema_editor.execute("ALTER TABLE pra_app_title DROP COLUMN IF EXISTS search_vector")
+
+
+def restore_game_and_movie_indexes(apps, schema_editor):
+    """
+    Recreates what 0007 to 0009 added to the game and movie tables by hand, when migrating backwards
+    """
+    import_module('pra_app.migrations.0007_search_vector').add_search_vectors(apps, schema_editor)
+    import_module('pra_app.migrations.0008_title_trigram_indexes').add_trigram_indexes(apps, schema_editor)
+    import_module('pra_app.migrations.0009_sort_indexes').add_release_date_indexes(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pra_app', '0010_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Title',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('game', 'Game'), ('movie', 'Movie')], editable=False,
+                                          max_length=5)),
+                ('title', models.CharField(max_length=124)),
+                ('release_date', models.DateField(blank=True, null=True)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('review_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('rating_sum', models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=12)),
+                ('average_rating', models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=4)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('genres', models.ManyToManyField(related_name='titles', to='pra_app.genre')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['kind', 'title', 'id'], name='title_title_sort_idx'),
+                    models.Index(fields=['kind', '-average_rating', '-id'], name='title_rating_sort_idx'),
+                    models.Index(fields=['kind', '-review_count', '-id'], name='title_review_count_sort_idx'),
+                ],
+                'constraints': [
+                    models.CheckConstraint(check=models.Q(kind__in=['game', 'movie']), name='title_kind_valid'),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='title',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='reviews', to='pra_app.title'),
+        ),
+        migrations.RunPython(move_titles, move_titles_back),
+        migrations.RemoveField(
+            model_name='review',
+            name='game',
+        ),
+        migrations.RemoveField(
+            model_name='review',
+            name='movie',
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_game_and_movie_indexes),
+        migrations.DeleteModel(
+            name='Game',
+        ),
+        migrations.DeleteModel(
+            name='Movie',
+        ),
+        migrations.CreateModel(
+            name='Game',
+            fields=[],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('pra_app.title',),
+        ),
+        migrations.CreateModel(
+            name='Movie',
+            fields=[],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('pra_app.title',),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.CheckConstraint(check=models.Q(('rating__gte', 1), ('rating__lte', 10)),
+                                              name='review_rating_range'),
+        ),
+        migrations.RunPython(add_title_indexes, drop_title_indexes),
+    ]
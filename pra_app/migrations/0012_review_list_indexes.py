@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-16 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pra_app', '0011_title'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['title', '-id'], name='review_title_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['title', '-rating', '-id'], name='review_title_rating_idx'),
+        ),
+    ]
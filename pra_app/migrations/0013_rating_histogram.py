@@ -0,0 +1,87 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:05
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_rating_histograms(apps, schema_editor):
+    """
+    Counts the reviews of the already existing titles per whole rating, with one query grouping them by title
+    """
+    Title = apps.get_model('pra_app', 'Title')
+    Review = apps.get_model('pra_app', 'Review')
+    db_alias = schema_editor.connection.alias
+    counts = {f'rating_{rating}': Count('pk', filter=Q(rating__gte=rating, rating__lt=rating + 1))
+              for rating in range(1, 10)}
+    counts['rating_10'] = Count('pk', filter=Q(rating__gte=10))
+    rows = Review.objects.using(db_alias).filter(title__isnull=False).order_by().values('title').annotate(**counts)
+
+    batch = []
+    for row in rows.iterator():
+        batch.append(Title(pk=row.pop('title'), **row))
+        if len(batch) == 1000:
+            Title.objects.using(db_alias).bulk_update(batch, list(counts))
+            batch = []
+    if batch:
+        Title.objects.using(db_alias).bulk_update(batch, list(counts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pra_app', '0012_review_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_10',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_6',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_7',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_8',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='rating_9',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_rating_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:10
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def fill_leaderboards(apps, schema_editor):
+    """
+    Ranks the already reviewed titles, like the refresh_leaderboards command
+    """
+    Title = apps.get_model('pra_app', 'Title')
+    LeaderboardEntry = apps.get_model('pra_app', 'LeaderboardEntry')
+    db_alias = schema_editor.connection.alias
+    min_reviews = getattr(settings, 'PRA_LEADERBOARD_MIN_REVIEWS', 5)
+    titles = Title.objects.using(db_alias).filter(review_count__gt=0)
+    priors = {row['kind']: Decimal(row['total']) / row['count'] for row in titles.order_by().values('kind').annotate(
+        count=Sum('review_count'), total=Sum('rating_sum'))}
+
+    # the titles are read in batches, with the genres of each batch, so the rows are never all in memory
+    rows = titles.order_by('pk').values_list('pk', 'kind', 'review_count', 'rating_sum').iterator(chunk_size=BATCH_SIZE)
+    for batch in batches(rows):
+        genres = {}
+        links = Title.genres.through.objects.using(db_alias).filter(title_id__in=[row[0] for row in batch])
+        for title_id, genre_id in links.values_list('title_id', 'genre_id'):
+            genres.setdefault(title_id, []).append(genre_id)
+        entries = []
+        for pk, kind, review_count, rating_sum in batch:
+            score = (rating_sum + min_reviews * priors[kind]) / (review_count + min_reviews)
+            for genre_id in [None, *genres.get(pk, ())]:
+                entries.append(LeaderboardEntry(kind=kind, genre_id=genre_id, title_id=pk,
+                                                score=score.quantize(Decimal('0.0001'))))
+        LeaderboardEntry.objects.using(db_alias).bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pra_app', '0013_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('game', 'Game'), ('movie', 'Movie')], max_length=5)),
+                ('score', models.DecimalField(decimal_places=4, max_digits=6)),
+                ('genre', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pra_app.genre')),
+                ('title', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pra_app.title')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'genre', '-score', '-title'], name='leaderboard_rank_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('title', 'genre'), name='leaderboard_title_genre_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('genre__isnull', True)), fields=('title',), name='leaderboard_title_unique'),
+        ),
+        migrations.RunPython(fill_leaderboards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:55
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index of the genre assignments by genre, then title: the titles of a genre (the genre pages) are one range
+    of it, in the order of their ids. The through table is created by Django, so the index is added by hand.
+    """
+
+    dependencies = [
+        ('pra_app', '0014_leaderboards'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX pra_app_title_genres_genre_title_idx ON pra_app_title_genres (genre_id, title_id)",
+            "DROP INDEX pra_app_title_genres_genre_title_idx",
+        ),
+    ]
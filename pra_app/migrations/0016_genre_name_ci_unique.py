@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:40
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def merge_duplicate_genres(apps, schema_editor):
+    """
+    Stores the names as Genre.save() does (runs of whitespace collapsed), then merges the genres whose names only
+    differ in case into the oldest one, moving their titles and leaderboard entries to it, so the names can be
+    made unique
+    """
+    Genre = apps.get_model('pra_app', 'Genre')
+    Title = apps.get_model('pra_app', 'Title')
+    LeaderboardEntry = apps.get_model('pra_app', 'LeaderboardEntry')
+    Link = Title.genres.through
+    db_alias = schema_editor.connection.alias
+
+    for pk, name in Genre.objects.using(db_alias).values_list('pk', 'name').iterator():
+        if name != ' '.join(name.split()):
+            Genre.objects.using(db_alias).filter(pk=pk).update(name=' '.join(name.split()))
+
+    groups = {}
+    for pk, lowered in Genre.objects.using(db_alias).annotate(lowered=Lower('name')).order_by('pk').values_list(
+            'pk', 'lowered'):
+        groups.setdefault(lowered, []).append(pk)
+    for kept, *duplicates in groups.values():
+        for duplicate in duplicates:
+            for link_model, fk in ((Link, 'title_id'), (LeaderboardEntry, 'title_id')):
+                rows = link_model.objects.using(db_alias)
+                rows.filter(genre_id=duplicate).exclude(
+                    **{f'{fk}__in': rows.filter(genre_id=kept).values(fk)}).update(genre_id=kept)
+            # the titles left were already in the kept genre, their rows go with the duplicate
+            Genre.objects.using(db_alias).filter(pk=duplicate).delete()
+    # PostgreSQL would otherwise refuse to index the genre table with the foreign key checks of the moved rows
+    # still pending
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+    """
+    Genre names unique whatever their case, so adding a genre is a single insert (see AddGenreView)
+    """
+
+    dependencies = [
+        ('pra_app', '0015_genre_title_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_genres, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='genre',
+            constraint=models.UniqueConstraint(Lower('name'), name='genre_name_ci_unique',
+                                               violation_error_message='Genre already exists.'),
+        ),
+    ]
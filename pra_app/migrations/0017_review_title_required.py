@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def delete_reviews_without_title(apps, schema_editor):
+    """
+    Reviews of no title are not shown anywhere nor counted in any aggregate, they can not be kept
+    """
+    Review = apps.get_model('pra_app', 'Review')
+    Review.objects.using(schema_editor.connection.alias).filter(title__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+    """
+    Every review is of a title
+    """
+
+    dependencies = [
+        ('pra_app', '0016_genre_name_ci_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_reviews_without_title, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='review',
+            name='title',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews',
+                                    to='pra_app.title'),
+        ),
+    ]
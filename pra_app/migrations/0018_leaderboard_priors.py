@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pra_app', '0017_review_title_required'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardPrior',
+            fields=[
+                ('kind', models.CharField(choices=[('game', 'Game'), ('movie', 'Movie')], max_length=5, primary_key=True, serialize=False)),
+                ('prior', models.DecimalField(decimal_places=10, max_digits=12)),
+            ],
+        ),
+    ]
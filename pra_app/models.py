@@ -1,41 +1,306 @@
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.functions import Lower, Now
 
 class Genre(models.Model):
     name = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # adding a genre is a single insert, failing on an existing name
+        constraints = [
+            models.UniqueConstraint(Lower('name'), name='genre_name_ci_unique',
+                                    violation_error_message='Genre already exists.'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def clean_name(name):
+        """
+        Genre name as stored: stripped, with runs of whitespace collapsed to one space
+        """
+        return ' '.join(name.split())
 
-class Game(models.Model):
-    title = models.CharField(max_length=124)
-    release_date = models.DateField(null=True, blank=True)
-    description = models.TextField(null=True, blank=True)
-    genres = models.ManyToManyField(Genre)
+    def save(self, *args, **kwargs):
+        self.name = self.clean_name(self.name)
+        super().save(*args, **kwargs)
+
+
+# whole ratings counted by the rating histograms of titles
+RATING_BUCKETS = range(1, 11)
 
-    def __str__(self):
-        return self.title
 
+def histogram_field(rating):
+    """
+    Name of the histogram field of Title counting the given (whole) rating
+    """
+    return f'rating_{rating}'
 
-class Movie(models.Model):
+
+def rating_bucket(rating):
+    """
+    Whole rating, the histogram bucket, of a review rating
+    """
+    return min(max(int(rating), RATING_BUCKETS[0]), RATING_BUCKETS[-1])
+
+
+class Title(models.Model):
+    """
+    A game or a movie. Both kinds share this table (and its search, sort and review indexes), Game and Movie
+    are proxies reading and creating titles of their kind. Titles read through Title itself come as instances
+    of the proxy of their kind.
+    """
+    GAME = 'game'
+    MOVIE = 'movie'
+    KINDS = [(GAME, 'Game'), (MOVIE, 'Movie')]
+
+    # kind of the titles of the proxies
+    KIND = None
+
+    kind = models.CharField(max_length=5, choices=KINDS, editable=False)
     title = models.CharField(max_length=124)
     release_date = models.DateField(null=True, blank=True)
     description = models.TextField(null=True, blank=True)
-    genres = models.ManyToManyField(Genre)
+    genres = models.ManyToManyField(Genre, related_name='titles')
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=1, default=0, editable=False)
+    average_rating = models.DecimalField(max_digits=4, decimal_places=2, default=0, editable=False)
+    # rating histogram: reviews per whole rating, e.g. rating_7 counts the ratings from 7.0 to 7.9
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+    rating_6 = models.PositiveIntegerField(default=0, editable=False)
+    rating_7 = models.PositiveIntegerField(default=0, editable=False)
+    rating_8 = models.PositiveIntegerField(default=0, editable=False)
+    rating_9 = models.PositiveIntegerField(default=0, editable=False)
+    rating_10 = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # one index per sort order of the list views, which always show one kind
+        # (the release date ones are created by 0011_title)
+        indexes = [
+            models.Index(fields=['kind', 'title', 'id'], name='title_title_sort_idx'),
+            models.Index(fields=['kind', '-average_rating', '-id'], name='title_rating_sort_idx'),
+            models.Index(fields=['kind', '-review_count', '-id'], name='title_review_count_sort_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(kind__in=['game', 'movie']), name='title_kind_valid'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.KIND and self.__dict__.get('kind') == '':
+            self.kind = self.KIND
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if cls is Title and instance.__dict__.get('kind') in KIND_MODELS:
+            instance.__class__ = KIND_MODELS[instance.kind]
+        return instance
 
     def __str__(self):
         return self.title
 
+    @property
+    def rating_histogram(self):
+        """
+        Review counts of the whole ratings 1 to 10, in this order
+        """
+        return [getattr(self, histogram_field(rating)) for rating in RATING_BUCKETS]
+
+
+class KindManager(models.Manager):
+    """
+    Manager of the Game and Movie proxies, reading the titles of their kind only
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(kind=self.model.KIND)
+
+
+class Game(Title):
+    KIND = Title.GAME
+
+    objects = KindManager()
+
+    class Meta:
+        proxy = True
+
+
+class Movie(Title):
+    KIND = Title.MOVIE
+
+    objects = KindManager()
+
+    class Meta:
+        proxy = True
+
+
+# kind -> proxy model
+KIND_MODELS = {Game.KIND: Game, Movie.KIND: Movie}
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Row of the materialized leaderboards, kept by leaderboards.py: the weighted rating of a reviewed title, once
+    in the leaderboard of its kind (without genre) and once in the leaderboard of every genre of the title
+    """
+    kind = models.CharField(max_length=5, choices=Title.KINDS)
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    title = models.ForeignKey(Title, on_delete=models.CASCADE, related_name='+')
+    score = models.DecimalField(max_digits=6, decimal_places=4)
+
+    class Meta:
+        # a leaderboard page is one range of this index
+        indexes = [
+            models.Index(fields=['kind', 'genre', '-score', '-title'], name='leaderboard_rank_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['title', 'genre'], name='leaderboard_title_genre_unique'),
+            models.UniqueConstraint(fields=['title'], condition=models.Q(genre__isnull=True),
+                                    name='leaderboard_title_unique'),
+        ]
+
+
+class LeaderboardPrior(models.Model):
+    """
+    Average rating of all reviews of the titles of a kind, as of the last full refresh of the leaderboards (see
+    leaderboards.py), kept in the database so every process scores the titles with the same one
+    """
+    kind = models.CharField(max_length=5, choices=Title.KINDS, primary_key=True)
+    prior = models.DecimalField(max_digits=12, decimal_places=10)
+
+
+class ReviewQuerySet(models.QuerySet):
+    """
+    Queryset that keeps the rating aggregates of games and movies in sync on bulk operations,
+    which do not send the model signals used for single reviews (see signals.py).
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .ratings import apply_review_deltas
+
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            apply_review_deltas([(review.title_id, review.rating, 1) for review in objs], using=self.db)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        from .ratings import refresh_targets
+
+        if not {'rating', 'title'} & set(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        with transaction.atomic(using=self.db):
+            pks = [review.pk for review in objs]
+            targets = list(self.model.objects.using(self.db).filter(pk__in=pks).values_list('title_id', flat=True))
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            targets += [review.title_id for review in objs]
+            refresh_targets(targets, using=self.db)
+        return rows
+
+    def update(self, **kwargs):
+        from .ratings import refresh_targets
+
+        kwargs.setdefault('updated_at', Now())
+        if not {'rating', 'title', 'title_id'} & set(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            targets = list(self.values_list('title_id', flat=True).distinct())
+            rows = super().update(**kwargs)
+            title = kwargs.get('title', kwargs.get('title_id'))
+            targets.append(getattr(title, 'pk', title))
+            refresh_targets(targets, using=self.db)
+        return rows
+
+    update.alters_data = True
+
+    def with_kind_ids(self):
+        """
+        Annotates the id of the reviewed title as reviewed_game_id or reviewed_movie_id, by its kind, for reads
+        with values() that need the two columns reviews had before games and movies were unified
+        """
+        return self.annotate(**{
+            f'reviewed_{kind}_id': models.Case(models.When(title__kind=kind, then='title_id'))
+            for kind in (Title.GAME, Title.MOVIE)
+        })
+
 
 class Review(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, null=True, blank=True)
-    game = models.ForeignKey(Game, on_delete=models.CASCADE, null=True, blank=True)
+    title = models.ForeignKey(Title, on_delete=models.CASCADE, related_name='reviews')
     rating = models.DecimalField(max_digits=3, decimal_places=1,
                                  validators=[MinValueValidator(1), MaxValueValidator(10)])
     description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ReviewQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(check=models.Q(rating__gte=1, rating__lte=10), name='review_rating_range'),
+        ]
+        # the review lists of a title, newest first and highest rated first (see REVIEW_SORT_ORDERS in views.py)
+        indexes = [
+            models.Index(fields=['title', '-id'], name='review_title_newest_idx'),
+            models.Index(fields=['title', '-rating', '-id'], name='review_title_rating_idx'),
+        ]
 
     def __str__(self):
         return f"Review by {self.user.username}"
+
+    # the reviewed title by kind, like the game and movie foreign keys reviews had before titles were unified.
+    # They read the kind of the title, so lists of reviews load them with their title (see ReviewListMixin)
+    @property
+    def game(self):
+        return self.title if self._title_kind() == Title.GAME else None
+
+    @game.setter
+    def game(self, game):
+        self._set_title(Title.GAME, game)
+
+    @property
+    def movie(self):
+        return self.title if self._title_kind() == Title.MOVIE else None
+
+    @movie.setter
+    def movie(self, movie):
+        self._set_title(Title.MOVIE, movie)
+
+    @property
+    def game_id(self):
+        return self.title_id if self._title_kind() == Title.GAME else None
+
+    @property
+    def movie_id(self):
+        return self.title_id if self._title_kind() == Title.MOVIE else None
+
+    def _title_kind(self):
+        return self.title.kind if self.title_id is not None else None
+
+    def _set_title(self, kind, title):
+        if title is not None:
+            self.title = title
+        elif self._title_kind() == kind:
+            self.title = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember what the review was counted as, so an edit can move the rating aggregates accordingly
+        instance._counted_as = (instance.__dict__.get('title_id'), instance.__dict__.get('rating'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Review, instance=self)):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Review, instance=self)):
+            return super().delete(*args, **kwargs)
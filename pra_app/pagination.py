@@ -0,0 +1,228 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of an OFFSET and a COUNT(*), every page remembers the sort key values of its first and last row in an
+opaque token, and the next page is read with a WHERE on those values. With an index on the sort key the
+database seeks straight to the page, so deep pages cost the same as the first one.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, InvalidPage, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def parse_ordering(ordering):
+    """
+    Turns ('title', '-id') into [('title', False), ('id', True)] (field name, descending) pairs
+    """
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def get_sort_field(model, name):
+    return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+
+def sort_expressions(model, ordering, backwards=False):
+    """
+    Ordering expressions for the ordering (field names or parse_ordering() pairs), with the null values of
+    nullable fields last (first when reading backwards), also usable for ordering a regular Paginator
+    """
+    if ordering and isinstance(ordering[0], str):
+        ordering = parse_ordering(ordering)
+    expressions = []
+    for name, descending in ordering:
+        nulls = {'nulls_first': True} if backwards else {'nulls_last': True}
+        expression = F(name).desc if descending != backwards else F(name).asc
+        expressions.append(expression(**nulls) if get_sort_field(model, name).null else expression())
+    return expressions
+
+
+class CursorPage:
+    """
+    One page of a CursorPaginator, iterable like a Paginator page
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    """
+    Paginates a queryset ordered by the given fields ('-' prefix for descending). The ordering has to be unique,
+    so it should end with the primary key. Null values of nullable fields are always sorted last.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = parse_ordering(ordering)
+        self.fields = [get_sort_field(queryset.model, name) for name, _ in self.ordering]
+
+    def page(self, after=None, before=None):
+        """
+        Returns the page following the `after` cursor, preceding the `before` cursor, or the first page
+        """
+        queryset, backwards = self._page_queryset(after, before)
+        return self._make_page(list(queryset), after, backwards)
+
+    async def apage(self, after=None, before=None):
+        """
+        page() for async views, reading the rows with async iteration
+        """
+        queryset, backwards = self._page_queryset(after, before)
+        return self._make_page([row async for row in queryset], after, backwards)
+
+    def _page_queryset(self, after, before):
+        backwards = before is not None and after is None
+        queryset = self.queryset
+        if after is not None or before is not None:
+            queryset = queryset.filter(self._seek(self.decode(before if backwards else after), backwards))
+        return queryset.order_by(*self.order_by(backwards))[:self.per_page + 1], backwards
+
+    def _make_page(self, rows, after, backwards):
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return CursorPage(rows)
+        # going forward there always is a previous page when we came from a cursor, and the other way around
+        has_next = more if not backwards else True
+        has_previous = (after is not None) if not backwards else more
+        return CursorPage(
+            rows,
+            next_cursor=self.encode(rows[-1]) if has_next else None,
+            previous_cursor=self.encode(rows[0]) if has_previous else None,
+        )
+
+    def encode(self, instance):
+        """
+        Cursor of a model instance, or of a values() row containing the sort fields
+        """
+        if isinstance(instance, dict):
+            values = [instance[name] for name, _ in self.ordering]
+        else:
+            values = [field.value_from_object(instance) for field in self.fields]
+        data = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(data)
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError
+            return [None if value is None else field.to_python(value) for field, value in zip(self.fields, values)]
+        except Exception as exc:
+            raise InvalidCursor('Invalid cursor') from exc
+
+    def order_by(self, backwards=False):
+        return sort_expressions(self.queryset.model, self.ordering, backwards)
+
+    def _seek(self, values, backwards):
+        """
+        Condition selecting the rows after (or before) the row with the given sort key values:
+        past the first key, or equal to it and past the rest of the key.
+        The extra bound on the first key alone lets the database use an index range scan.
+        """
+        keys = list(zip(self.ordering, self.fields, values))
+        (name, descending), field, value = keys[-1]
+        condition = self._past(name, descending, field, value, backwards)
+        for (name, descending), field, value in reversed(keys[:-1]):
+            equal = Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+            condition = self._past(name, descending, field, value, backwards) | (equal & condition)
+
+        (name, descending), field, value = self.ordering[0], self.fields[0], values[0]
+        if value is not None and len(self.ordering) > 1:
+            lookup = 'lte' if descending != backwards else 'gte'
+            bound = Q(**{f'{name}__{lookup}': value})
+            if field.null and not backwards:
+                bound |= Q(**{f'{name}__isnull': True})
+            condition &= bound
+        return condition
+
+    @staticmethod
+    def _past(name, descending, field, value, backwards):
+        """
+        Rows strictly past the value in the direction of reading, null values being the last ones
+        """
+        if value is None:
+            # nothing comes after the nulls, everything else comes before them
+            return Q(pk__in=[]) if not backwards else Q(**{f'{name}__isnull': False})
+        lookup = 'lt' if descending != backwards else 'gt'
+        past = Q(**{f'{name}__{lookup}': value})
+        if field.null and not backwards:
+            past |= Q(**{f'{name}__isnull': True})
+        return past
+
+
+def wants_cursor_pagination(request):
+    """
+    Cursor pagination is opt in: turned on for every list with the PRA_CURSOR_PAGINATION setting,
+    or per request with ?paginate=cursor (and by the cursor links themselves)
+    """
+    return (getattr(settings, 'PRA_CURSOR_PAGINATION', False) or request.GET.get('paginate') == 'cursor'
+            or 'after' in request.GET or 'before' in request.GET)
+
+
+def cursor_page(request, queryset, per_page, ordering):
+    """
+    Returns the page of the queryset selected by the ?after= or ?before= cursor of the request,
+    falling back to the first page for invalid cursors
+    """
+    paginator = CursorPaginator(queryset, per_page, ordering)
+    try:
+        return paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        return paginator.page()
+
+
+async def acursor_page(request, queryset, per_page, ordering):
+    """
+    cursor_page() for async views
+    """
+    paginator = CursorPaginator(queryset, per_page, ordering)
+    try:
+        return await paginator.apage(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        return await paginator.apage()
+
+
+async def apaginate(queryset, per_page, number):
+    """
+    Page of a regular Paginator for async views, counted with acount() and read with async iteration.
+    Like the list views, falls back to the first page for invalid numbers and to the last one past the end.
+    """
+    paginator = Paginator(queryset, per_page)
+    # count is a cached_property, filling it in keeps the paginator from counting synchronously
+    paginator.count = await queryset.acount()
+    try:
+        page = paginator.page(number)
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+    page.object_list = [row async for row in page.object_list]
+    return page
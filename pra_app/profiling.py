@@ -0,0 +1,209 @@
+"""
+Tools to find out why a page is slow, all of them off by default.
+
+    PRA_SERVER_TIMING   adds a Server-Timing header to every response, splitting its time into SQL queries (db),
+                        template rendering (template, SQL run while rendering left out) and the rest (view), shown
+                        by the network panel of the browsers
+    PRA_PROFILING       lets staff members profile a request with ?profile=1 or an X-Profile: 1 header: the
+                        request runs under cProfile and the response is the profile, the most expensive functions
+                        first. With PRA_PROFILE_DIR the raw profile is also stored there (for pstats or snakeviz)
+    PRA_SLOW_QUERY_MS   logs the queries taking longer than this many milliseconds with their EXPLAIN plan, as
+                        warnings of the pra_app.profiling logger
+
+profiling_middleware is left out of the middleware chain, and the template timer is not installed, unless one of
+the first two is on, and the slow query timer is only added to the connections when the last one is set, so
+nothing is paid for them when they are off. The middleware only sees the queries of its own thread, which
+includes the ones of the async views as it is a sync middleware.
+"""
+import contextlib
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+from django.http import HttpResponse
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ROWS = 60
+EXPLAINED_STATEMENTS = ('SELECT', 'WITH')
+
+_timings = contextvars.ContextVar('pra_request_timings', default=None)
+_explaining = contextvars.ContextVar('pra_explaining', default=False)
+
+
+class RequestTimings:
+    """
+    Time spent in SQL queries and template rendering by the current request
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    @contextlib.contextmanager
+    def timing_queries(self):
+        with contextlib.ExitStack() as stack:
+            for alias in settings.DATABASES:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def header(self):
+        total = time.perf_counter() - self.started
+        view = max(total - self.db_time - self.template_time, 0)
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="SQL ({self.queries} queries)"',
+            f'template;dur={self.template_time * 1000:.1f}',
+            f'view;dur={view * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def install_template_timer():
+    """
+    Times the rendering of the outermost template of every timed request (included templates are part of it)
+    """
+    if getattr(Template.render, 'timed', False):
+        return
+    render = Template.render
+
+    def timed_render(self, context):
+        timings = _timings.get()
+        if timings is None or timings.rendering:
+            return render(self, context)
+        timings.rendering = True
+        started = time.perf_counter()
+        db_time = timings.db_time
+        try:
+            return render(self, context)
+        finally:
+            timings.rendering = False
+            timings.template_time += time.perf_counter() - started - (timings.db_time - db_time)
+
+    timed_render.timed = True
+    Template.render = timed_render
+
+
+def wants_profile(request):
+    asked = request.GET.get('profile') or request.headers.get('X-Profile')
+    return bool(asked) and request.user.is_staff
+
+
+def profile_response(request, profiler, response):
+    """
+    Response showing the profile of the request instead of its page, stored in PRA_PROFILE_DIR if set
+    """
+    output = io.StringIO()
+    output.write(f'Profile of {request.method} {request.get_full_path()} (status {response.status_code})\n\n')
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_ROWS)
+    profile = HttpResponse(output.getvalue(), content_type='text/plain; charset=utf-8')
+
+    directory = getattr(settings, 'PRA_PROFILE_DIR', None)
+    if directory:
+        slug = re.sub(r'[^\w]+', '-', request.path).strip('-') or 'root'
+        path = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{slug}-{os.getpid()}.prof')
+        profiler.dump_stats(path)
+        profile['X-Profile-File'] = path
+    return profile
+
+
+def profiling_middleware(get_response):
+    """
+    Adds the Server-Timing header and profiles the requests of staff members asking for it (see above)
+    """
+    server_timing = getattr(settings, 'PRA_SERVER_TIMING', False)
+    profiling = getattr(settings, 'PRA_PROFILING', False)
+    if not server_timing and not profiling:
+        raise MiddlewareNotUsed
+    install_template_timer()
+
+    def middleware(request):
+        profile = profiling and wants_profile(request)
+        if not server_timing and not profile:
+            return get_response(request)
+
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        try:
+            with timings.timing_queries():
+                if profile:
+                    profiler = cProfile.Profile()
+                    response = profiler.runcall(get_response, request)
+                else:
+                    response = get_response(request)
+        finally:
+            _timings.reset(token)
+        if profile:
+            response = profile_response(request, profiler, response)
+        response['Server-Timing'] = timings.header()
+        return response
+    return middleware
+
+
+def get_slow_query_threshold():
+    """
+    PRA_SLOW_QUERY_MS in seconds, None when slow queries are not logged
+    """
+    threshold = getattr(settings, 'PRA_SLOW_QUERY_MS', None)
+    return None if threshold is None else threshold / 1000
+
+
+def explain(connection, sql, params):
+    """
+    Query plan of a SELECT query as text, None for other statements or when the database can not explain it
+    """
+    if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+        return None
+    token = _explaining.set(True)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except (DatabaseError, ValueError):
+        return None
+    finally:
+        _explaining.reset(token)
+
+
+class SlowQueryLogger:
+    """
+    Execute wrapper logging the queries of one connection taking longer than the threshold
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = time.perf_counter() - started
+        threshold = get_slow_query_threshold()
+        if threshold is not None and elapsed >= threshold and not many and not _explaining.get():
+            plan = explain(self.connection, sql, params)
+            logger.warning('Slow query (%.1fms) on %s: %s\nparams: %r%s', elapsed * 1000, self.connection.alias,
+                           sql, params, f'\nplan:\n{plan}' if plan else '')
+        return result
+
+
+def install_slow_query_logger(connection):
+    if not any(isinstance(wrapper, SlowQueryLogger) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryLogger(connection))
@@ -0,0 +1,145 @@
+"""
+Detection of N+1 queries: the same query run again and again with other parameters while one page is built,
+typically from a template looping over objects and reading a relation of each (review.user.username,
+title.genres.all, ...) that the view did not load with select_related() or prefetch_related().
+
+The queries are seen through execute_wrapper() of the database connections. A query run
+PRA_QUERY_CHECK_THRESHOLD times within a request with different parameters is reported with the view, the
+template line and the line of the app's code running it at that point. repeated_query_middleware checks
+every request when PRA_QUERY_CHECK is 'log' (a warning on the pra_app.querycheck logger) or 'raise'
+(RepeatedQueriesError), and is left out of the middleware chain when it is None, so it costs nothing then.
+Tests can check a block of code with assert_no_repeated_queries().
+
+Only the queries of the thread handling the request are seen, which includes the ones the async views run
+through sync_to_async() when the middleware is on (it is a sync middleware, so they run in its thread).
+Streamed pages run the queries of their rows while the response is sent, after the middleware returned, so
+those are not checked.
+"""
+import contextlib
+import logging
+import os
+import sys
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+MODES = ('log', 'raise')
+
+
+class RepeatedQueriesError(AssertionError):
+    pass
+
+
+def get_threshold():
+    return getattr(settings, 'PRA_QUERY_CHECK_THRESHOLD', 3)
+
+
+def query_location():
+    """
+    Where the query being run comes from: the innermost template line being rendered and the innermost line of
+    the app's code (outside of this module), as strings, None when there are none
+    """
+    template = code = None
+    frame = sys._getframe(1)
+    while frame is not None and (template is None or code is None):
+        filename = frame.f_code.co_filename
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            if isinstance(node, Node) and node.origin is not None and node.token is not None:
+                template = f'{node.origin.template_name or node.origin.name}, line {node.token.lineno}'
+        if code is None and filename.startswith(APP_DIR) and filename != __file__:
+            code = f'{os.path.relpath(filename, os.path.dirname(APP_DIR))}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return template, code
+
+
+class QueryRecorder:
+    """
+    Execute wrapper counting the runs of every query (its SQL, the parameters left out) and keeping the location
+    of the ones run threshold times with different parameters. The stack is only walked once per such query.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or get_threshold()
+        self.counts = {}
+        self.first_params = {}
+        self.varied = set()
+        self.locations = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many:
+            count = self.counts[sql] = self.counts.get(sql, 0) + 1
+            if count == 1:
+                self.first_params[sql] = params
+            elif sql not in self.varied and params != self.first_params[sql]:
+                self.varied.add(sql)
+            if count >= self.threshold and sql in self.varied and sql not in self.locations:
+                self.locations[sql] = query_location()
+        return execute(sql, params, many, context)
+
+    @contextlib.contextmanager
+    def recording(self, aliases=None):
+        """
+        Records the queries run on the connections of the aliases (all databases by default) in this thread
+        """
+        with contextlib.ExitStack() as stack:
+            for alias in aliases or settings.DATABASES:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    @property
+    def repeated(self):
+        """
+        The repeated queries, as (sql, count, template line, code line) tuples, most repeated first
+        """
+        return sorted(((sql, self.counts[sql], *location) for sql, location in self.locations.items()),
+                      key=lambda row: -row[1])
+
+    def report(self, source=None):
+        lines = [f'{len(self.repeated)} queries repeated with other parameters'
+                 + (f' in {source}' if source else '') + ':']
+        for sql, count, template, code in self.repeated:
+            where = ', '.join(part for part in (template and f'template {template}', code) if part)
+            lines.append(f'  {count} x {sql[:300]}' + (f'\n    from {where}' if where else ''))
+        return '\n'.join(lines)
+
+
+@contextlib.contextmanager
+def assert_no_repeated_queries(threshold=None, aliases=None):
+    """
+    Raises RepeatedQueriesError when the block runs a query threshold times with different parameters
+    """
+    recorder = QueryRecorder(threshold)
+    with recorder.recording(aliases):
+        yield recorder
+    if recorder.repeated:
+        raise RepeatedQueriesError(recorder.report())
+
+
+def repeated_query_middleware(get_response):
+    """
+    Reports the N+1 queries of every request, as set by PRA_QUERY_CHECK (see above)
+    """
+    mode = getattr(settings, 'PRA_QUERY_CHECK', None)
+    if mode is None:
+        raise MiddlewareNotUsed
+    if mode not in MODES:
+        raise ValueError(f'PRA_QUERY_CHECK has to be one of {", ".join(MODES)} or None, not {mode!r}')
+
+    def middleware(request):
+        recorder = QueryRecorder()
+        with recorder.recording():
+            response = get_response(request)
+        if recorder.repeated:
+            match = request.resolver_match
+            report = recorder.report(f'{request.method} {request.path} ({match.view_name if match else "no view"})')
+            if mode == 'raise':
+                raise RepeatedQueriesError(report)
+            logger.warning(report)
+        return response
+    return middleware
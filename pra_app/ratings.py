@@ -0,0 +1,222 @@
+"""
+Denormalized rating aggregates of games and movies.
+
+Every game and movie stores the number of its reviews, the sum of their ratings, the resulting average and
+a histogram of the ratings (reviews per whole rating), so the detail pages never have to go through the
+review table: the rating statistics they show are derived from the ten histogram counts (RatingDistribution).
+Single reviews move the aggregates through the signals in signals.py, bulk operations through ReviewQuerySet
+and the rebuild_rating_aggregates command recomputes all of them from scratch, with one grouped query.
+As every review write passes through here, this is also where the leaderboard entries of the reviewed titles
+are moved (see leaderboards.py) and their cached pages invalidated.
+"""
+import math
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Now
+from django.db.models.lookups import GreaterThan
+
+from .cache import response_cache
+from .leaderboards import update_leaderboard_entries
+from .models import RATING_BUCKETS, Review, Title, histogram_field, rating_bucket
+
+AVERAGE_PRECISION = Decimal('0.01')
+# percentiles shown next to the rating histograms of the detail pages
+SHOWN_PERCENTILES = (25, 75, 90)
+
+
+def average_rating_expression(count, total):
+    """
+    Expression computing the average rating from the count and sum expressions (0 when there are no reviews).
+    The sum is cast to float, as SQLite would otherwise do an integer division on whole-number sums.
+    """
+    return Case(
+        When(GreaterThan(count, 0), then=Cast(total, FloatField()) / count),
+        default=Value(0),
+        output_field=DecimalField(max_digits=4, decimal_places=2),
+    )
+
+
+def moved_aggregates(count_delta, sum_delta, bucket_deltas=None):
+    """
+    Update kwargs that move the aggregates of a row by the given deltas (bucket_deltas being whole rating ->
+    change of its histogram count) in a single UPDATE statement.
+    All right hand sides see the values from before the update, so the average is computed from the new count and sum.
+    """
+    count = F('review_count') + count_delta
+    total = F('rating_sum') + sum_delta
+    histogram = {histogram_field(rating): F(histogram_field(rating)) + delta
+                 for rating, delta in (bucket_deltas or {}).items() if delta}
+    return {
+        'review_count': count,
+        'rating_sum': total,
+        'average_rating': average_rating_expression(count, total),
+        **histogram,
+        'updated_at': Now(),
+    }
+
+
+def apply_review_deltas(entries, using=DEFAULT_DB_ALIAS):
+    """
+    Applies review changes to the aggregates of the reviewed titles.
+    Entries are (title_id, rating, sign) tuples, sign being 1 for an added review and -1 for a removed one.
+    Changes of the same title are merged, so every title is updated at most once.
+    """
+    deltas = defaultdict(lambda: [0, Decimal(0), defaultdict(int)])
+    for title_id, rating, sign in entries:
+        if title_id is not None:
+            delta = deltas[title_id]
+            delta[0] += sign
+            delta[1] += sign * Decimal(str(rating))
+            delta[2][rating_bucket(rating)] += sign
+
+    with transaction.atomic(using=using):
+        for pk, (count_delta, sum_delta, bucket_deltas) in deltas.items():
+            if count_delta or sum_delta or any(bucket_deltas.values()):
+                Title.objects.using(using).filter(pk=pk).update(
+                    **moved_aggregates(count_delta, sum_delta, bucket_deltas))
+        update_leaderboard_entries(deltas.keys(), using=using)
+    invalidate_reviewed_pages(deltas.keys())
+
+
+def invalidate_reviewed_pages(title_ids):
+    """
+    Invalidates the cached pages showing the reviews or the rating aggregates of the titles
+    """
+    if title_ids:
+        response_cache.invalidate('title-ratings', *(f'title:{pk}' for pk in title_ids))
+
+
+def histogram_counts():
+    """
+    Aggregates counting the reviews of every histogram bucket, by histogram field name
+    """
+    buckets = {}
+    for rating in RATING_BUCKETS:
+        bucket = Q(rating__gte=rating)
+        if rating != RATING_BUCKETS[-1]:
+            bucket &= Q(rating__lt=rating + 1)
+        buckets[histogram_field(rating)] = Count('pk', filter=bucket)
+    return buckets
+
+
+def refresh_rating_aggregates(pks=None, using=DEFAULT_DB_ALIAS, batch_size=1000):
+    """
+    Recomputes the aggregates of the given titles (all of them when pks is None) from their reviews.
+    All of them are read with one query grouping the reviews by title, and written batch_size titles at a time.
+    """
+    reviews = Review.objects.using(using).filter(title__isnull=False)
+    titles = Title.objects.using(using).all()
+    if pks is not None:
+        reviews = reviews.filter(title__in=pks)
+        titles = titles.filter(pk__in=pks)
+    rows = reviews.order_by().values('title').annotate(
+        review_count=Count('pk'), rating_sum=Sum('rating'), **histogram_counts())
+    fields = ['review_count', 'rating_sum', 'average_rating', *map(histogram_field, RATING_BUCKETS)]
+
+    with transaction.atomic(using=using):
+        # titles without reviews are not in the rows, so everything starts from zero
+        titles.update(**dict.fromkeys(fields, 0), updated_at=Now())
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            pk = row.pop('title')
+            average = (row['rating_sum'] / row['review_count']).quantize(AVERAGE_PRECISION)
+            batch.append(Title(pk=pk, average_rating=average, **row))
+            if len(batch) == batch_size:
+                Title.objects.using(using).bulk_update(batch, fields)
+                batch = []
+        if batch:
+            Title.objects.using(using).bulk_update(batch, fields)
+
+
+def refresh_targets(title_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Recomputes the aggregates of the titles with the given ids (None ids are skipped).
+    """
+    title_ids = {pk for pk in title_ids if pk is not None}
+    if title_ids:
+        with transaction.atomic(using=using):
+            refresh_rating_aggregates(title_ids, using=using)
+            update_leaderboard_entries(title_ids, using=using)
+    invalidate_reviewed_pages(title_ids)
+
+
+class RatingDistribution:
+    """
+    Rating statistics of a title derived from its histogram alone, in O(10) and without reading its reviews.
+    Every rating counts as the whole rating of its bucket, which is exact for the whole ratings of ReviewForm.
+    Percentiles use the nearest rank method.
+    """
+
+    def __init__(self, counts):
+        self.counts = list(counts)
+        self.total = sum(self.counts)
+
+    @classmethod
+    def of(cls, title):
+        return cls(title.rating_histogram)
+
+    def __bool__(self):
+        return self.total > 0
+
+    @property
+    def buckets(self):
+        """
+        (rating, count, share of the reviews in percent) of every whole rating, the highest first
+        """
+        return [(rating, count, round(100 * count / self.total) if self.total else 0)
+                for rating, count in reversed(list(zip(RATING_BUCKETS, self.counts)))]
+
+    @property
+    def mean(self):
+        if not self.total:
+            return None
+        return sum(rating * count for rating, count in zip(RATING_BUCKETS, self.counts)) / self.total
+
+    @property
+    def median(self):
+        if not self.total:
+            return None
+        middle = self.total // 2
+        if self.total % 2:
+            return self.rating_at(middle + 1)
+        return (self.rating_at(middle) + self.rating_at(middle + 1)) / 2
+
+    @property
+    def stdev(self):
+        """
+        Standard deviation of the ratings (of the population of the reviews)
+        """
+        mean = self.mean
+        if mean is None:
+            return None
+        variance = sum(count * (rating - mean) ** 2 for rating, count in zip(RATING_BUCKETS, self.counts))
+        return math.sqrt(variance / self.total)
+
+    def percentile(self, percent):
+        """
+        Lowest rating that at least percent % of the reviews are at or below
+        """
+        if not self.total:
+            return None
+        return self.rating_at(max(1, math.ceil(percent / 100 * self.total)))
+
+    @property
+    def percentiles(self):
+        """
+        (percent, rating) of the SHOWN_PERCENTILES
+        """
+        return [(percent, self.percentile(percent)) for percent in SHOWN_PERCENTILES]
+
+    def rating_at(self, rank):
+        """
+        Rating of the review at the given rank (from 1) in the ascending order of the ratings
+        """
+        seen = 0
+        for rating, count in zip(RATING_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return rating
+        raise ValueError(f'Rank {rank} past the {self.total} reviews')
@@ -0,0 +1,168 @@
+"""
+Routing of the reads of the app's models to read replicas (the PRA_DB_REPLICAS setting, alias -> weight).
+
+Reads are spread over the replicas in a weighted round robin, writes go to the default database. A client that
+wrote something reads from the default database for PRA_DB_REPLICA_STICKINESS seconds afterwards (remembered
+in a cookie by primary_stickiness_middleware), so e.g. the game page it is redirected to after adding a review
+shows the review even if the replicas have not caught up yet. So does the rest of the request that wrote, any
+request other than GET and HEAD, and anything running inside a transaction of the default database.
+
+The page cache (see pra_app.cache) is skipped by the pinned requests, and keeps the pages read from a replica
+for PRA_DB_REPLICA_STICKINESS seconds at most, as they may miss a write the replica had not received yet.
+"""
+import contextvars
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+STICKINESS_COOKIE = 'pra_primary_until'
+
+
+class RequestState:
+    """
+    Database state of the current request, shared by the threads sync_to_async() runs its parts in
+    """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+        self.read_replica = False
+
+
+_request_state = contextvars.ContextVar('pra_request_state', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'PRA_DB_REPLICAS', None) or {}
+
+
+class WeightedCycle:
+    """
+    Endless weighted round robin over the replicas, spreading the turns of every replica evenly
+    (smooth weighted round robin, as done by nginx)
+    """
+
+    def __init__(self, weights):
+        self.weights = dict(weights)
+        self._lock = threading.Lock()
+        self._current = dict.fromkeys(self.weights, 0)
+        self._total = sum(self.weights.values())
+
+    def __next__(self):
+        with self._lock:
+            for alias, weight in self.weights.items():
+                self._current[alias] += weight
+            alias = max(self._current, key=self._current.get)
+            self._current[alias] -= self._total
+            return alias
+
+
+class ReplicaRouter:
+    app_label = 'pra_app'
+
+    def __init__(self):
+        self._cycle = None
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if model._meta.app_label != self.app_label or not replicas or self.reads_from_primary():
+            return None
+        if self._cycle is None or self._cycle.weights != replicas:
+            self._cycle = WeightedCycle(replicas)
+        state = _request_state.get()
+        if state is not None:
+            state.read_replica = True
+        return next(self._cycle)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the default database
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas are migrated by the replication
+        return False if db in get_replicas() else None
+
+    @staticmethod
+    def reads_from_primary():
+        state = _request_state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return True
+        return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+def get_stickiness():
+    return getattr(settings, 'PRA_DB_REPLICA_STICKINESS', 10)
+
+
+def request_is_pinned():
+    """
+    Whether the current request reads from the default database as its client wrote something a moment ago
+    """
+    state = _request_state.get()
+    return state is not None and state.pinned
+
+
+def request_read_replica():
+    """
+    Whether the current request read anything from a replica, which may lag behind the default database
+    """
+    state = _request_state.get()
+    return state is not None and state.read_replica
+
+
+def start_request(request):
+    pinned = request.method not in ('GET', 'HEAD')
+    try:
+        pinned = pinned or float(request.COOKIES.get(STICKINESS_COOKIE, 0)) > time.time()
+    except ValueError:
+        pass
+    return _request_state.set(RequestState(pinned))
+
+
+def finish_request(token, response):
+    state = _request_state.get()
+    _request_state.reset(token)
+    if state.wrote and get_replicas():
+        stickiness = get_stickiness()
+        response.set_cookie(STICKINESS_COOKIE, str(time.time() + stickiness), max_age=stickiness, httponly=True,
+                            samesite='Lax')
+    return response
+
+
+@sync_and_async_middleware
+def primary_stickiness_middleware(get_response):
+    """
+    Keeps the reads of a client on the default database for a while after it wrote something (see above)
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = start_request(request)
+            try:
+                response = await get_response(request)
+            except BaseException:
+                _request_state.reset(token)
+                raise
+            return finish_request(token, response)
+    else:
+        def middleware(request):
+            token = start_request(request)
+            try:
+                response = get_response(request)
+            except BaseException:
+                _request_state.reset(token)
+                raise
+            return finish_request(token, response)
+    return middleware
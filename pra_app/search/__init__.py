@@ -0,0 +1,37 @@
+"""
+Search engine of the app.
+
+The backend is picked with the PRA_SEARCH_BACKEND setting (a dotted path to a BaseSearchBackend subclass).
+When it is not set, PostgreSQL databases use the full-text search backend and every other database
+the in-memory inverted index.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.module_loading import import_string
+
+from .base import CATALOG, BaseSearchBackend, tokenize
+
+DEFAULT_BACKENDS = {
+    'postgresql': 'pra_app.search.postgres.PostgresSearchBackend',
+}
+FALLBACK_BACKEND = 'pra_app.search.memory.InMemorySearchBackend'
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_search_backend():
+    """
+    Returns the (per process) instance of the configured search backend
+    """
+    path = getattr(settings, 'PRA_SEARCH_BACKEND', None)
+    if not path:
+        path = DEFAULT_BACKENDS.get(connections[DEFAULT_DB_ALIAS].vendor, FALLBACK_BACKEND)
+    return _load_backend(path)
+
+
+__all__ = ['CATALOG', 'BaseSearchBackend', 'get_search_backend', 'tokenize']
@@ -0,0 +1,74 @@
+import re
+
+from ..models import Game, Movie
+
+# kind of the search results -> model searched for them
+CATALOG = {'games': Game, 'movies': Movie}
+
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    """
+    Splits a text into lowercase words, the same way for indexed documents and for queries
+    """
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def trigrams(text):
+    """
+    Set of the trigrams of a text the way pg_trgm extracts them: every word padded with two spaces in front
+    and one behind, so that "cat" gives "  c", " ca", "cat" and "at ".
+    """
+    result = set()
+    for word in tokenize(text):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class BaseSearchBackend:
+    """
+    Interface of the search backends.
+
+    A query is split into words with tokenize(). A title matches when every word of the query is a prefix of
+    a word in its title or description, and matches in the title rank higher than matches in the description.
+    """
+
+    def search(self, query, limit=None, filters=None):
+        """
+        Returns a dict with a list of the best ranked matches (at most limit of them) for every kind of CATALOG,
+        among the titles passing the filters (see facets.filter_titles)
+        """
+        raise NotImplementedError('subclasses of BaseSearchBackend must provide a search() method')
+
+    def fuzzy_search(self, query, limit=None, filters=None):
+        """
+        Like search(), but tolerates typos: returns the titles containing words similar to the query,
+        most similar first
+        """
+        raise NotImplementedError('subclasses of BaseSearchBackend must provide a fuzzy_search() method')
+
+    def matching_titles(self, query, fuzzy=False):
+        """
+        Returns a Title queryset of all the matches of search() (or fuzzy_search()), unranked
+        """
+        raise NotImplementedError('subclasses of BaseSearchBackend must provide a matching_titles() method')
+
+    def facets(self, query, fuzzy=False, filters=None):
+        """
+        Returns the genre and decade counts of all the matches passing the filters (see facets.facet_counts)
+        """
+        from .facets import facet_counts, filter_titles
+
+        return facet_counts(filter_titles(self.matching_titles(query, fuzzy), filters))
+
+    def index(self, instance):
+        """
+        Called when a game or movie is saved. Backends that keep their own index update it here.
+        """
+
+    def remove(self, instance):
+        """
+        Called when a game or movie is deleted. Backends that keep their own index update it here.
+        """
@@ -0,0 +1,64 @@
+"""
+Filters and facet counts of the search results.
+
+A search can be narrowed to a genre and a range of release years. The facets are the number of matching titles
+of every genre and every decade, for every kind of CATALOG. They are counted over all the matches, not only the
+shown ones, with one query grouping the genre assignments of the matches by kind and genre and one grouping the
+matches by kind and release year (folded into decades here), so their cost does not grow with the number of
+genres or decades.
+"""
+import datetime
+
+from django.db.models import Count
+from django.db.models.functions import ExtractYear
+
+from ..models import Title
+from .base import CATALOG
+
+FILTER_NAMES = ('genre', 'year_from', 'year_to')
+
+
+def filter_titles(titles, filters=None):
+    """
+    Narrows a Title queryset with the filters of the search form (genre, year_from, year_to), missing or None
+    filters are not applied
+    """
+    filters = filters or {}
+    if filters.get('genre') is not None:
+        titles = titles.filter(genres=filters['genre'])
+    # compared with dates, so the release_date indexes can be used
+    if filters.get('year_from') is not None:
+        titles = titles.filter(release_date__gte=datetime.date(filters['year_from'], 1, 1))
+    if filters.get('year_to') is not None:
+        titles = titles.filter(release_date__lte=datetime.date(filters['year_to'], 12, 31))
+    return titles
+
+
+def facet_counts(matches):
+    """
+    Returns the genre and decade facets of the titles of the matches queryset, by kind of CATALOG:
+    {'games': {'genres': [{'id', 'name', 'count'}, ...], 'decades': [{'decade', 'count'}, ...]}, ...},
+    genres with the most titles first, decades in order
+    """
+    # the matches may carry rank annotations, only their ids are needed
+    titles = Title.objects.filter(pk__in=matches.values('pk'))
+    kinds = {model.KIND: kind for kind, model in CATALOG.items()}
+    facets = {kind: {'genres': [], 'decades': []} for kind in CATALOG}
+
+    genres = Title.genres.through.objects.filter(title__in=titles).values(
+        'title__kind', 'genre_id', 'genre__name').annotate(count=Count('pk')).order_by('-count', 'genre__name')
+    for row in genres:
+        if row['title__kind'] in kinds:
+            facets[kinds[row['title__kind']]]['genres'].append(
+                {'id': row['genre_id'], 'name': row['genre__name'], 'count': row['count']})
+
+    decades = {}
+    years = titles.filter(release_date__isnull=False).values('kind', year=ExtractYear('release_date')).annotate(
+        count=Count('pk')).order_by()
+    for row in years:
+        if row['kind'] in kinds:
+            key = kinds[row['kind']], row['year'] // 10 * 10
+            decades[key] = decades.get(key, 0) + row['count']
+    for (kind, decade), count in sorted(decades.items()):
+        facets[kind]['decades'].append({'decade': decade, 'count': count})
+    return facets
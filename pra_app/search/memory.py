@@ -0,0 +1,200 @@
+import heapq
+import math
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from ..models import Title
+from .base import CATALOG, BaseSearchBackend, tokenize, trigrams
+from .facets import filter_titles
+
+# weights of the words found in the title and in the description, in the proportion ts_rank uses for A and B
+TITLE_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+
+# share of the query trigrams a title has to contain to be a fuzzy match (pg_trgm.word_similarity_threshold)
+FUZZY_THRESHOLD = 0.6
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    Search on an inverted index (word -> weight of the word in every title containing it) kept in the memory
+    of the process. Meant for SQLite and test deployments.
+
+    The index is built from the database at the first search and then updated from the save and delete
+    signals of games and movies, so only changes made through this process are seen without a restart.
+    Prefixes are resolved with a binary search over the sorted list of the indexed words. Fuzzy searches use
+    a second inverted index, trigram -> titles containing it, of the titles only.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = None
+        self._words = []
+        self._documents = {}
+        self._titles = {}
+        self._trigram_postings = None
+        self._title_trigrams = {}
+
+    def reset(self):
+        """
+        Drops the index, it is built again at the next search
+        """
+        with self._lock:
+            self._postings = None
+            self._words = []
+            self._documents = {}
+            self._titles = {}
+            self._trigram_postings = None
+            self._title_trigrams = {}
+
+    def search(self, query, limit=None, filters=None):
+        return self._fetch(self._filter(self._ranked(query), filters), limit)
+
+    def fuzzy_search(self, query, limit=None, filters=None):
+        return self._fetch(self._filter(self._fuzzy_ranked(query), filters), limit)
+
+    def matching_titles(self, query, fuzzy=False):
+        by_kind = self._fuzzy_ranked(query) if fuzzy else self._ranked(query)
+        return Title.objects.filter(pk__in=[pk for ranked in by_kind.values() for _, _, pk in ranked])
+
+    def _ranked(self, query):
+        """
+        Returns the (-score, title, pk) tuples of the titles containing all the words of the query, by kind
+        """
+        words = tokenize(query)
+        by_kind = defaultdict(list)
+        if not words:
+            return by_kind
+
+        with self._lock:
+            self._ensure_built()
+            scores = None
+            for word in set(words):
+                word_scores = Counter()
+                for indexed_word in self._words_with_prefix(word):
+                    word_scores.update(self._postings[indexed_word])
+                if scores is None:
+                    scores = word_scores
+                else:
+                    scores = Counter({key: score + word_scores[key] for key, score in scores.items()
+                                      if key in word_scores})
+                if not scores:
+                    return by_kind
+
+            for (kind, pk), score in scores.items():
+                by_kind[kind].append((-score, self._titles[kind, pk].lower(), pk))
+        return by_kind
+
+    def _fuzzy_ranked(self, query):
+        """
+        Returns the (-similarity, title, pk) tuples of the titles with words similar to the query, by kind
+        """
+        query_trigrams = trigrams(query)
+        by_kind = defaultdict(list)
+        if not query_trigrams:
+            return by_kind
+
+        needed = math.ceil(FUZZY_THRESHOLD * len(query_trigrams))
+        with self._lock:
+            self._ensure_built()
+            # a title sharing `needed` trigrams with the query has to contain one of its len - needed + 1 rarest
+            # trigrams, so only the (short) postings of those are read to find the candidates
+            rarest = sorted(query_trigrams, key=lambda trigram: len(self._trigram_postings.get(trigram, ())))
+            candidates = set()
+            for trigram in rarest[:len(query_trigrams) - needed + 1]:
+                candidates.update(self._trigram_postings.get(trigram, ()))
+
+            for key in candidates:
+                shared = len(query_trigrams & self._title_trigrams[key])
+                if shared >= needed:
+                    kind, pk = key
+                    by_kind[kind].append((-shared / len(query_trigrams), self._titles[key].lower(), pk))
+        return by_kind
+
+    def _filter(self, by_kind, filters):
+        """
+        Keeps the matches passing the filters, checked in the database with one query for all of them
+        """
+        if not filters or not any(value is not None for value in filters.values()):
+            return by_kind
+        pks = [pk for ranked in by_kind.values() for _, _, pk in ranked]
+        passing = set(filter_titles(Title.objects.filter(pk__in=pks), filters).values_list('pk', flat=True))
+        return {kind: [match for match in ranked if match[2] in passing] for kind, ranked in by_kind.items()}
+
+    def _fetch(self, by_kind, limit):
+        """
+        Loads the best ranked titles of every kind from the (-score, title, pk) tuples
+        """
+        results = {kind: [] for kind in CATALOG}
+        best = {kind: [pk for _, _, pk in (heapq.nsmallest(limit, ranked) if limit else sorted(ranked))]
+                for kind, ranked in by_kind.items()}
+        # games and movies share the title table, one query loads the titles of both kinds
+        found = Title.objects.in_bulk([pk for pks in best.values() for pk in pks])
+        for kind, pks in best.items():
+            # titles indexed by a transaction that was rolled back afterwards are skipped
+            results[kind] = [found[pk] for pk in pks if pk in found]
+        return results
+
+    def index(self, instance):
+        with self._lock:
+            if self._postings is not None:
+                self._add(self._key(instance), instance.title, instance.description)
+
+    def remove(self, instance):
+        with self._lock:
+            if self._postings is not None:
+                self._discard(self._key(instance))
+
+    def _ensure_built(self):
+        if self._postings is not None:
+            return
+        self._postings = defaultdict(dict)
+        self._trigram_postings = defaultdict(set)
+        titles = Title.objects.filter(kind__in=[model.KIND for model in CATALOG.values()])
+        for pk, kind, title, description in titles.values_list('pk', 'kind', 'title', 'description').iterator():
+            self._add((f'{kind}s', pk), title, description, keep_words_sorted=False)
+        # the words are sorted once, inserting them one by one would be quadratic
+        self._words = sorted(self._postings)
+
+    def _key(self, instance):
+        # 'game' -> 'games', the kind of the search results
+        return f'{instance.kind}s', instance.pk
+
+    def _add(self, key, title, description, keep_words_sorted=True):
+        self._discard(key)
+        weights = Counter()
+        for word in tokenize(title):
+            weights[word] += TITLE_WEIGHT
+        for word in tokenize(description):
+            weights[word] += DESCRIPTION_WEIGHT
+
+        self._documents[key] = weights
+        self._titles[key] = title
+        self._title_trigrams[key] = trigrams(title)
+        for trigram in self._title_trigrams[key]:
+            self._trigram_postings[trigram].add(key)
+        for word, weight in weights.items():
+            if keep_words_sorted and word not in self._postings:
+                insort(self._words, word)
+            self._postings[word][key] = weight
+
+    def _discard(self, key):
+        self._titles.pop(key, None)
+        for trigram in self._title_trigrams.pop(key, ()):
+            posting = self._trigram_postings[trigram]
+            posting.discard(key)
+            if not posting:
+                del self._trigram_postings[trigram]
+        for word in self._documents.pop(key, ()):
+            posting = self._postings[word]
+            posting.pop(key, None)
+            if not posting:
+                del self._postings[word]
+                del self._words[bisect_left(self._words, word)]
+
+    def _words_with_prefix(self, prefix):
+        position = bisect_left(self._words, prefix)
+        while position < len(self._words) and self._words[position].startswith(prefix):
+            yield self._words[position]
+            position += 1
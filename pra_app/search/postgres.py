@@ -0,0 +1,83 @@
+from django.db.models import BooleanField, F, FloatField, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from ..models import Title
+from .base import CATALOG, BaseSearchBackend, tokenize
+from .facets import filter_titles
+
+# the search_vector column, its GIN index, the trigger that keeps it current on every insert and update and the
+# trigram index of the titles are created by the 0011_title migration (first added to the per-kind tables by 0007
+# and 0008); both kinds share the table, the proxies of CATALOG filter it by kind
+SEARCH_CONFIG = 'english'
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Full-text search on the weighted (title A, description B) tsvector column, ranked with ts_rank.
+    Games and movies are searched with one query, the best limit matches of every kind are picked with a window.
+    """
+
+    def search(self, query, limit=None, filters=None):
+        matches = self._matches(query)
+        if matches is None:
+            return {kind: [] for kind in CATALOG}
+        return self._best_by_kind(filter_titles(matches, filters), 'rank', limit)
+
+    def fuzzy_search(self, query, limit=None, filters=None):
+        matches = self._fuzzy_matches(query)
+        if matches is None:
+            return {kind: [] for kind in CATALOG}
+        return self._best_by_kind(filter_titles(matches, filters), 'similarity', limit)
+
+    def matching_titles(self, query, fuzzy=False):
+        matches = self._fuzzy_matches(query) if fuzzy else self._matches(query)
+        if matches is None:
+            return Title.objects.none()
+        return matches.filter(kind__in=[model.KIND for model in CATALOG.values()])
+
+    def _matches(self, query):
+        """
+        Titles containing all the words of the query, annotated with their rank, None for queries without words
+        """
+        words = tokenize(query)
+        if not words:
+            return None
+
+        # the words only contain letters and digits, so they can not inject tsquery operators
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        return Title.objects.filter(
+            RawSQL('pra_app_title.search_vector @@ to_tsquery(%s, %s)', (SEARCH_CONFIG, tsquery),
+                   output_field=BooleanField())
+        ).annotate(
+            rank=RawSQL('ts_rank(pra_app_title.search_vector, to_tsquery(%s, %s))', (SEARCH_CONFIG, tsquery),
+                        output_field=FloatField())
+        )
+
+    def _fuzzy_matches(self, query):
+        """
+        Titles with words similar to the query, annotated with their similarity, None for queries without words
+        """
+        query = ' '.join(tokenize(query))
+        if not query:
+            return None
+
+        # <% (word similarity above pg_trgm.word_similarity_threshold) is answered by the gin_trgm_ops index
+        return Title.objects.filter(
+            RawSQL('%s <%% pra_app_title.title', (query,), output_field=BooleanField())
+        ).annotate(
+            similarity=RawSQL('word_similarity(%s, pra_app_title.title)', (query,), output_field=FloatField())
+        )
+
+    def _best_by_kind(self, matches, score, limit):
+        ordering = [F(score).desc(), 'title', 'pk']
+        matches = matches.filter(kind__in=[model.KIND for model in CATALOG.values()])
+        if limit:
+            matches = matches.annotate(
+                position=Window(RowNumber(), partition_by=F('kind'), order_by=ordering)
+            ).filter(position__lte=limit)
+        results = {kind: [] for kind in CATALOG}
+        for title in matches.order_by(*ordering):
+            # 'game' -> 'games', the kind of the search results
+            results[f'{title.kind}s'].append(title)
+        return results
@@ -0,0 +1,168 @@
+"""
+Signal handlers of the app, connected in PraAppConfig.ready()
+"""
+from django.db.backends.signals import connection_created
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .autocomplete import title_index
+from .cache import response_cache
+from .genres import genre_registry, invalidate_genre_title_counts
+from .leaderboards import rebuild_leaderboard_entries
+from .metrics import install_query_timer, metrics_enabled
+from .models import Game, Genre, LeaderboardEntry, Movie, Review, Title
+from .profiling import get_slow_query_threshold, install_slow_query_logger
+from .ratings import apply_review_deltas, refresh_targets
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Review)
+def count_saved_review(sender, instance, created, using, raw=False, **kwargs):
+    """
+    Adds a new review to the rating aggregates of its game or movie, or moves an edited one.
+    """
+    if raw:
+        # fixtures bring their own data, rebuild_rating_aggregates brings the aggregates in line afterwards
+        return
+
+    counted_as = getattr(instance, '_counted_as', None)
+    if created:
+        apply_review_deltas([(instance.title_id, instance.rating, 1)], using=using)
+    elif counted_as is not None:
+        title_id, rating = counted_as
+        apply_review_deltas([(title_id, rating, -1), (instance.title_id, instance.rating, 1)], using=using)
+    else:
+        # saved over an existing row without loading it first, so its previous values are unknown
+        refresh_targets([instance.title_id], using=using)
+    instance._counted_as = (instance.title_id, instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def discount_deleted_review(sender, instance, using, **kwargs):
+    """
+    Removes a deleted review (also through queryset deletes and cascades) from the rating aggregates.
+    """
+    title_id, rating = getattr(instance, '_counted_as', None) or (instance.title_id, instance.rating)
+    apply_review_deltas([(title_id, rating, -1)], using=using)
+    instance._counted_as = None
+
+
+# titles send the signals of the model they are saved or deleted through, Title or one of its proxies
+@receiver(post_save, sender=Title)
+@receiver(post_save, sender=Game)
+@receiver(post_save, sender=Movie)
+def index_saved_title(sender, instance, raw=False, **kwargs):
+    """
+    Brings a saved game or movie into the typeahead index and the index of search backends that keep their own one.
+    """
+    if not raw:
+        get_search_backend().index(instance)
+        title_index.add(instance)
+
+
+@receiver(post_delete, sender=Title)
+@receiver(post_delete, sender=Game)
+@receiver(post_delete, sender=Movie)
+def unindex_deleted_title(sender, instance, **kwargs):
+    get_search_backend().remove(instance)
+    title_index.remove(instance)
+
+
+@receiver(post_save, sender=Title)
+@receiver(post_delete, sender=Title)
+@receiver(post_save, sender=Game)
+@receiver(post_delete, sender=Game)
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def invalidate_title_pages(sender, instance, **kwargs):
+    """
+    Invalidates the cached pages of a saved or deleted game or movie, and the lists of its kind.
+    Pages changed by reviews are invalidated in ratings.py.
+    """
+    response_cache.invalidate(f'title:{instance.pk}', f'{instance.kind}s')
+
+
+@receiver(m2m_changed, sender=Title.genres.through)
+def invalidate_genre_assignment_pages(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        response_cache.invalidate(f'title:{instance.pk}')
+    elif pk_set:
+        response_cache.invalidate(*(f'title:{pk}' for pk in pk_set))
+    else:
+        # all titles of the genre were cleared, their pages are tagged with the genre
+        response_cache.invalidate(f'genre:{instance.pk}')
+
+
+@receiver(m2m_changed, sender=Title.genres.through)
+def touch_genre_assignments(sender, instance, action, reverse, model, pk_set, using, **kwargs):
+    """
+    Marks the titles whose genres changed as updated, their genres are part of them in the API.
+    """
+    if action == 'pre_clear' and reverse:
+        # the titles of the genre are not known anymore after clearing it
+        model.objects.using(using).filter(genres=instance).update(updated_at=Now())
+    elif not action.startswith('post_'):
+        return
+    elif not reverse:
+        Title.objects.using(using).filter(pk=instance.pk).update(updated_at=Now())
+    elif pk_set:
+        model.objects.using(using).filter(pk__in=pk_set).update(updated_at=Now())
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_genre_pages(sender, instance, **kwargs):
+    response_cache.invalidate(f'genre:{instance.pk}', 'genres')
+    genre_registry.invalidate()
+
+
+@receiver(m2m_changed, sender=Title.genres.through)
+@receiver(post_delete, sender=Title)
+@receiver(post_delete, sender=Game)
+@receiver(post_delete, sender=Movie)
+@receiver(post_delete, sender=Genre)
+def invalidate_genre_title_counts_of_assignments(sender, action='post_', **kwargs):
+    """
+    Drops the title counts of the genres and the genre pages when genre assignments change, including the
+    ones deleted together with a title or a genre
+    """
+    if action.startswith('post_'):
+        invalidate_genre_title_counts()
+        response_cache.invalidate('genre-titles')
+
+
+@receiver(m2m_changed, sender=Title.genres.through)
+def move_leaderboard_genres(sender, instance, action, reverse, model, pk_set, using, **kwargs):
+    """
+    Moves the leaderboard entries of the titles whose genres changed to the leaderboards of their new genres.
+    """
+    if action == 'post_clear' and reverse:
+        LeaderboardEntry.objects.using(using).filter(genre=instance).delete()
+        response_cache.invalidate('leaderboards')
+    elif not action.startswith('post_'):
+        return
+    elif not reverse:
+        rebuild_leaderboard_entries([instance.pk], using=using)
+    elif pk_set:
+        rebuild_leaderboard_entries(pk_set, using=using)
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    """
+    Times the queries of every connection for the request metrics (see metrics.py)
+    """
+    if metrics_enabled():
+        install_query_timer(connection)
+
+
+@receiver(connection_created)
+def log_slow_queries(sender, connection, **kwargs):
+    """
+    Logs the slow queries of every connection when PRA_SLOW_QUERY_MS is set (see profiling.py)
+    """
+    if get_slow_query_threshold() is not None:
+        install_slow_query_logger(connection)
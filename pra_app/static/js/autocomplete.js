@@ -0,0 +1,39 @@
+// Fills the suggestions of the search box from the autocomplete endpoint while typing.
+// Picking a suggestion opens the page of that game or movie directly.
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('input[data-autocomplete-url]').forEach(function (input) {
+        var list = document.getElementById(input.getAttribute('list'));
+        var urls = {};
+        var timer = null;
+
+        input.addEventListener('input', function (event) {
+            // picking a datalist option fires an input event without a typing input type
+            var picked = !event.inputType || event.inputType === 'insertReplacementText';
+            if (picked && urls[input.value]) {
+                window.location = urls[input.value];
+                return;
+            }
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                var query = input.value.trim();
+                if (!query) {
+                    list.innerHTML = '';
+                    return;
+                }
+                fetch(input.dataset.autocompleteUrl + '?q=' + encodeURIComponent(query))
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) {
+                        list.innerHTML = '';
+                        urls = {};
+                        data.results.forEach(function (result) {
+                            var option = document.createElement('option');
+                            option.value = result.title;
+                            option.label = result.kind;
+                            urls[result.title] = result.url;
+                            list.appendChild(option);
+                        });
+                    });
+            }, 150);
+        });
+    });
+});
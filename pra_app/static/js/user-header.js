@@ -0,0 +1,14 @@
+// Replaces the login link of the (shared, cacheable) page header with the fragment of the current user.
+document.addEventListener('DOMContentLoaded', function () {
+    var header = document.getElementById('user-header');
+    if (!header) {
+        return;
+    }
+    fetch(header.dataset.url, {credentials: 'same-origin'})
+        .then(function (response) { return response.ok ? response.text() : null; })
+        .then(function (html) {
+            if (html !== null) {
+                header.innerHTML = html;
+            }
+        });
+});
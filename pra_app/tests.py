@@ -1,9 +1,42 @@
+import csv
+import datetime
+import gzip
+import json
+import multiprocessing
+import os
 import pytest
-from django.test import TestCase
+import re
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncRequestFactory, Client, RequestFactory, SimpleTestCase, TestCase, \
+    TransactionTestCase, override_settings
+from django.urls import reverse
 from decimal import Decimal
 from django.contrib.auth.models import User
-from pra_app.models import Game, Movie, Genre, Review
-from django.core.exceptions import ValidationError
+from pra.database import database_from_env
+from pra_app.async_views import AsyncGameDetailsView, AsyncGamesView, AsyncViewGameReviewsView
+from pra_app.autocomplete import title_index
+from pra_app.benchmarks import PAGES, check_results, load_baseline, page_params, run_benchmarks, seed_catalog
+from pra_app.cache import response_cache
+from pra_app.forms import GameAddForm, MovieAddForm, MovieEditForm, SearchForm
+from pra_app.genres import genre_registry, genre_title_counts
+from pra_app.leaderboards import refresh_leaderboards
+from pra_app.metrics import BUCKET_LABELS, get_values, install_query_timer, reset_values, time_query
+from pra_app.models import Game, Movie, Genre, LeaderboardEntry, LeaderboardPrior, Review, Title
+from pra_app.pagination import CursorPaginator
+from pra_app.profiling import install_slow_query_logger
+from pra_app.querycheck import RepeatedQueriesError, assert_no_repeated_queries
+from pra_app.ratings import RatingDistribution
+from pra_app.routers import STICKINESS_COOKIE, ReplicaRouter, primary_stickiness_middleware
+from pra_app.search import get_search_backend
+from pra_app.views import GameDetailsView, GamesView, GenreDetailsView, ViewGameReviewsView
+from django.http import Http404, HttpResponse
+from asgiref.sync import sync_to_async
 
 
 @pytest.mark.django_db
@@ -190,14 +223,1363 @@ class TestsForReviews(TestCase):
 
     def test_review_no_game_or_movie(self):
         """
-        Test function that checks if it is possible to create review where no movie or game is selected or existing.
+        Test function that checks that a review where no movie or game is selected or existing can not be created.
         """
         review = Review(user=self.user, rating=Decimal('8.5'), description='Review without game or movie')
 
-        try:
+        with self.assertRaises(IntegrityError), transaction.atomic():
             review.save()
-        except ValidationError as e:
-            self.assertEqual(
-                e.message_dict,
-                {'__all__': ['A review must be associated with either a game or a movie that exists on the database.']}
-            )
+
+
+class TestsForRatingAggregates(TestCase):
+    """
+    Group of tests for the review count, rating sum and average rating stored on games and movies
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.game = Game.objects.create(title='Test Game', release_date='2023-01-01', description='Description')
+        self.movie = Movie.objects.create(title='Test Movie', release_date='2023-01-01', description='Description')
+
+    def test_aggregates_follow_review_changes(self):
+        """
+        Creating, editing, moving and deleting reviews should keep the aggregates in line with the reviews
+        """
+        first = Review.objects.create(user=self.user, game=self.game, rating=Decimal('7'), description='Good')
+        Review.objects.create(user=self.user, game=self.game, rating=Decimal('8'), description='Great')
+        self.game.refresh_from_db()
+        assert (self.game.review_count, self.game.rating_sum, self.game.average_rating) == (2, 15, Decimal('7.5'))
+
+        first = Review.objects.get(pk=first.pk)
+        first.rating = Decimal('10')
+        first.save()
+        self.game.refresh_from_db()
+        assert self.game.average_rating == Decimal('9')
+
+        first.game = None
+        first.movie = self.movie
+        first.save()
+        self.game.refresh_from_db()
+        self.movie.refresh_from_db()
+        assert (self.game.review_count, self.game.average_rating) == (1, Decimal('8'))
+        assert (self.movie.review_count, self.movie.average_rating) == (1, Decimal('10'))
+
+        Review.objects.filter(title=self.movie).delete()
+        self.movie.refresh_from_db()
+        assert (self.movie.review_count, self.movie.rating_sum, self.movie.average_rating) == (0, 0, 0)
+
+    def test_aggregates_follow_bulk_operations(self):
+        """
+        Bulk creates and queryset updates do not send signals, but should still move the aggregates
+        """
+        Review.objects.bulk_create([
+            Review(user=self.user, movie=self.movie, rating=Decimal('4'), description='Meh'),
+            Review(user=self.user, movie=self.movie, rating=Decimal('5'), description='Fine'),
+        ])
+        self.movie.refresh_from_db()
+        assert (self.movie.review_count, self.movie.average_rating) == (2, Decimal('4.5'))
+
+        Review.objects.filter(title=self.movie).update(rating=Decimal('9'))
+        self.movie.refresh_from_db()
+        assert (self.movie.rating_sum, self.movie.average_rating) == (18, Decimal('9'))
+
+    def test_rebuild_command(self):
+        """
+        The rebuild command should recompute aggregates that went out of sync
+        """
+        Review.objects.create(user=self.user, game=self.game, rating=Decimal('6'), description='Ok')
+        Game.objects.filter(pk=self.game.pk).update(review_count=5, rating_sum=1, average_rating=Decimal('0.2'))
+
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        self.game.refresh_from_db()
+        assert (self.game.review_count, self.game.rating_sum, self.game.average_rating) == (1, 6, Decimal('6'))
+
+    def test_histogram_follows_review_changes(self):
+        """
+        The histogram should count the reviews per whole rating through edits, moves and bulk operations
+        """
+        review = Review.objects.create(user=self.user, game=self.game, rating=Decimal('7.5'), description='Good')
+        Review.objects.bulk_create([
+            Review(user=self.user, game=self.game, rating=Decimal('10'), description='Best'),
+            Review(user=self.user, game=self.game, rating=Decimal('3'), description='Bad'),
+        ])
+        self.game.refresh_from_db()
+        assert self.game.rating_histogram == [0, 0, 1, 0, 0, 0, 1, 0, 0, 1]
+
+        review.rating = Decimal('2')
+        review.save()
+        Review.objects.filter(rating=Decimal('10')).update(title=self.movie)
+        self.game.refresh_from_db()
+        self.movie.refresh_from_db()
+        assert self.game.rating_histogram == [0, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+        assert self.movie.rating_histogram == [0, 0, 0, 0, 0, 0, 0, 0, 0, 1]
+
+    def test_rating_distribution(self):
+        """
+        The statistics should be derived from the histogram alone
+        """
+        ratings = RatingDistribution([0, 1, 0, 0, 0, 0, 1, 2, 0, 0])
+        assert (ratings.total, ratings.mean, ratings.median) == (4, 6.25, 7.5)
+        assert ratings.stdev == pytest.approx(2.4874685)
+        assert ratings.percentiles == [(25, 2), (75, 8), (90, 8)]
+        assert not RatingDistribution([0] * 10) and RatingDistribution([0] * 10).median is None
+
+    def test_rebuild_reads_all_histograms_with_one_query(self):
+        """
+        The rebuild command should group the reviews of all titles in one query
+        """
+        Review.objects.create(user=self.user, game=self.game, rating=Decimal('4'), description='Meh')
+        Review.objects.create(user=self.user, movie=self.movie, rating=Decimal('9'), description='Good')
+        Game.objects.update(rating_4=0, rating_9=3)
+        with CaptureQueriesContext(connection) as queries:
+            call_command('rebuild_rating_aggregates', stdout=StringIO())
+        assert len([query for query in queries.captured_queries if 'FROM "pra_app_review"' in query['sql']]) == 1
+        self.game.refresh_from_db()
+        self.movie.refresh_from_db()
+        assert (self.game.rating_4, self.game.rating_9, self.movie.rating_9) == (1, 0, 1)
+
+    def test_details_views_show_stored_average(self):
+        """
+        Both detail pages should show the stored average without going through the reviews
+        """
+        Review.objects.create(user=self.user, game=self.game, rating=Decimal('3'), description='Bad')
+        Review.objects.create(user=self.user, movie=self.movie, rating=Decimal('9'), description='Good')
+
+        response = self.client.get(reverse('game_details', args=[self.game.id]))
+        assert response.context['average_score'] == Decimal('3')
+        response = self.client.get(reverse('movie_details', args=[self.movie.id]))
+        assert response.context['average_score'] == Decimal('9')
+        assert response.context['ratings'].median == 9 and b'rating-histogram' in response.content
+
+
+class TestsForTitles(TestCase):
+    """
+    Group of tests for games and movies sharing the title table
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.game = Game.objects.create(title='Shared Game', release_date='2023-01-01')
+        self.movie = Movie.objects.create(title='Shared Movie', release_date='2023-01-01')
+
+    def test_kinds_share_the_table(self):
+        """
+        The proxies should only see titles of their kind, titles read through Title should come back as their kind
+        """
+        assert (self.game.kind, self.movie.kind) == ('game', 'movie')
+        assert list(Game.objects.all()) == [self.game]
+        assert not Movie.objects.filter(pk=self.game.pk).exists()
+        titles = {title.pk: title for title in Title.objects.all()}
+        assert type(titles[self.game.pk]) is Game and type(titles[self.movie.pk]) is Movie
+
+    def test_reviews_point_to_one_title(self):
+        """
+        Reviews should keep their game and movie attributes on top of the title foreign key
+        """
+        review = Review.objects.create(user=self.user, movie=self.movie, rating=Decimal('6'), description='Fine')
+        review = Review.objects.get(pk=review.pk)
+        assert (review.title_id, review.movie_id, review.game) == (self.movie.pk, self.movie.pk, None)
+        assert Review.objects.with_kind_ids().values_list('reviewed_game_id', 'reviewed_movie_id').get() == (
+            None, self.movie.pk)
+
+    def test_rating_outside_the_range_is_rejected(self):
+        """
+        The check constraint should keep ratings written past the form validation within 1 to 10
+        """
+        with pytest.raises(IntegrityError):
+            with transaction.atomic():
+                Review.objects.create(user=self.user, game=self.game, rating=Decimal('11'), description='Too good')
+
+
+class TestsForLeaderboards(TestCase):
+    """
+    Group of tests for the weighted rating leaderboards
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.rpg = Genre.objects.create(name='RPG')
+        self.lucky = Game.objects.create(title='Lucky Game')
+        self.solid = Game.objects.create(title='Solid Game')
+        self.solid.genres.add(self.rpg)
+        self.movie = Movie.objects.create(title='Some Movie')
+
+    def review(self, title, rating, count=1):
+        Review.objects.bulk_create([
+            Review(user=self.user, title=title, rating=Decimal(rating), description='Review') for _ in range(count)])
+
+    def titles(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        assert response.status_code == 200
+        return [entry.title.title for entry in response.context['entries']]
+
+    def test_weighted_rating_needs_many_reviews_to_rank_first(self):
+        """
+        A single 10 should not outrank twenty 9s, and the boards should follow the review writes
+        """
+        mediocre = Game.objects.create(title='Mediocre Game')
+        self.review(self.solid, '9', count=20)
+        self.review(mediocre, '5', count=20)
+        self.review(self.movie, '2')
+        refresh_leaderboards()
+        self.review(self.lucky, '10')
+        assert self.titles('game_leaderboard') == ['Solid Game', 'Lucky Game', 'Mediocre Game']
+        assert self.titles('game_leaderboard', genre=self.rpg.pk) == ['Solid Game']
+        assert self.titles('movie_leaderboard') == ['Some Movie']
+
+        Review.objects.filter(title=self.solid).delete()
+        assert self.titles('game_leaderboard') == ['Lucky Game', 'Mediocre Game']
+        self.lucky.genres.add(self.rpg)
+        assert self.titles('game_leaderboard', genre=self.rpg.pk) == ['Lucky Game']
+
+    def test_incremental_updates_match_a_refresh(self):
+        """
+        With the averages of the last refresh, moving the entries should give the entries of a refresh
+        """
+        self.review(self.solid, '8', count=3)
+        self.review(self.lucky, '6')
+        refresh_leaderboards()
+        refreshed = set(LeaderboardEntry.objects.values_list('title', 'genre', 'score'))
+        review = Review.objects.create(user=self.user, game=self.lucky, rating=Decimal('9'), description='Better')
+        assert set(LeaderboardEntry.objects.values_list('title', 'genre', 'score')) != refreshed
+        review.delete()
+        assert set(LeaderboardEntry.objects.values_list('title', 'genre', 'score')) == refreshed
+
+    def test_incremental_updates_use_the_stored_prior(self):
+        """
+        The prior of the last refresh is read from the database, whichever process made the refresh
+        """
+        self.review(self.solid, '8', count=3)
+        refresh_leaderboards()
+        assert LeaderboardPrior.objects.get(kind='game').prior == Decimal('8')
+        LeaderboardPrior.objects.filter(kind='game').update(prior=Decimal('2'))
+        self.review(self.lucky, '6')
+        Review.objects.create(user=self.user, game=self.lucky, rating=Decimal('6'), description='Again')
+        score = LeaderboardEntry.objects.get(title=self.lucky, genre=None).score
+        # (2 reviews * 6 + 5 minimum reviews * 2) / (2 + 5), not 7.4286 with the prior of the reviews
+        assert score == Decimal('3.1429')
+
+    def test_leaderboard_page_is_one_query(self):
+        self.review(self.solid, '8', count=3)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('game_leaderboard'), {'genre': self.rpg.pk})
+        assert len([query for query in queries.captured_queries if 'pra_app_leaderboardentry' in query['sql']]) == 1
+
+
+class TestsForGenrePages(TestCase):
+    """
+    Group of tests for the genre list and genre pages
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.rpg = Genre.objects.create(name='RPG')
+        self.drama = Genre.objects.create(name='Drama')
+        self.games = [Game.objects.create(title=f'Game {number}') for number in range(3)]
+        self.movie = Movie.objects.create(title='Movie')
+        for title in [*self.games, self.movie]:
+            title.genres.add(self.rpg)
+
+    def test_counts_are_cached_until_the_assignments_change(self):
+        """
+        The counts should be read once, and read again after a form assigned a genre
+        """
+        assert genre_title_counts() == {self.rpg.pk: {'game': 3, 'movie': 1}}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('genre_list'))
+        assert [(genre.name, counts) for genre, counts in response.context['genres']] == [
+            ('Drama', {}), ('RPG', {'game': 3, 'movie': 1})]
+        assert not any('pra_app_title_genres' in query['sql'] for query in queries.captured_queries)
+
+        self.client.login(username='testuser', password='testpassword')
+        self.client.post(reverse('game_add'), {'title': 'New Game', 'genres': [self.drama.pk, self.rpg.pk]})
+        response = self.client.get(reverse('genre_list'))
+        assert [counts for _, counts in response.context['genres']] == [{'game': 1}, {'game': 4, 'movie': 1}]
+
+        self.games[0].delete()
+        assert genre_title_counts()[self.rpg.pk] == {'game': 3, 'movie': 1}
+
+    def test_counts_expire(self):
+        """
+        Assignments made through other processes, which only drop the counts of their own cache, should show once
+        the counts expire
+        """
+        with override_settings(PRA_GENRE_COUNTS_TIMEOUT=0):
+            assert self.drama.pk not in genre_title_counts()
+            # no m2m_changed signal
+            Title.genres.through.objects.create(title=self.movie, genre=self.drama)
+            assert genre_title_counts()[self.drama.pk] == {'movie': 1}
+
+    def test_genre_page_lists_its_titles(self):
+        with mock.patch.object(GenreDetailsView, 'titles_per_page', 2):
+            response = self.client.get(reverse('genre_details', args=[self.rpg.pk]))
+            assert [title.title for title in response.context['titles']] == ['Movie', 'Game 2']
+            response = self.client.get(reverse('genre_details', args=[self.rpg.pk]),
+                                       {'after': response.context['titles'].next_cursor})
+            assert [title.title for title in response.context['titles']] == ['Game 1', 'Game 0']
+        response = self.client.get(reverse('genre_details', args=[self.rpg.pk]), {'kind': 'movie'})
+        assert [title.title for title in response.context['titles']] == ['Movie']
+        assert self.client.get(reverse('genre_details', args=[self.drama.pk + 100])).status_code == 404
+
+
+class TestsForGenreRegistry(TestCase):
+    """
+    Group of tests for the genre registry of the add and edit forms and the adding of genres
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.rpg = Genre.objects.create(name='RPG')
+        self.drama = Genre.objects.create(name='Drama')
+
+    def test_forms_list_and_validate_genres_without_queries(self):
+        assert genre_registry.choices() == [(self.rpg.pk, 'RPG'), (self.drama.pk, 'Drama')]
+        with CaptureQueriesContext(connection) as queries:
+            GameAddForm().as_p()
+            form = MovieAddForm({'title': 'Movie', 'genres': [str(self.drama.pk)]})
+            assert form.is_valid()
+            assert not MovieAddForm({'title': 'Movie', 'genres': [str(self.drama.pk + 100)]}).is_valid()
+            search_form = SearchForm({'query': 'movie', 'genre': str(self.rpg.pk)})
+            assert search_form.is_valid()
+        assert len(queries) == 0
+        assert form.cleaned_data['genres'] == [self.drama.pk]
+        assert search_form.get_filters()['genre'] == self.rpg.pk
+
+        movie = form.save()
+        assert list(movie.genres.all()) == [self.drama]
+        edit_form = MovieEditForm({'title': 'Movie', 'genres': [str(self.drama.pk)]}, instance=movie)
+        assert edit_form['genres'].value() == [str(self.drama.pk)]
+        assert edit_form.changed_data == []
+        assert MovieEditForm(instance=movie)['genres'].value() == [self.drama.pk]
+
+    def test_added_genres_reach_the_registry(self):
+        genre_registry.choices()
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.post(reverse('genre_add'), {'name': 'Comedy'})
+        assert response.status_code == 302
+        comedy = Genre.objects.get(name='Comedy')
+        assert (comedy.pk, 'Comedy') in genre_registry.choices()
+        assert genre_registry.id_for(' comedy ') == comedy.pk
+
+        comedy.delete()
+        assert genre_registry.id_for('Comedy') is None
+
+    def test_genres_added_by_other_processes_are_checked_for(self):
+        genre_registry.choices()
+        # no post_save signal, like a genre added through another worker
+        Genre.objects.bulk_create([Genre(name='Comedy')])
+        assert genre_registry.id_for('comedy') is None
+        with mock.patch('pra_app.genres.time.monotonic', return_value=time.monotonic() + 60):
+            assert genre_registry.id_for('comedy') == Genre.objects.get(name='Comedy').pk
+
+    def test_names_are_compared_as_the_database_compares_them(self):
+        assert Genre.objects.create(name='  Sci   Fi ').name == 'Sci Fi'
+        assert genre_registry.id_for('SCI FI') is not None
+        assert genre_registry.id_for('Straße') is None
+        Genre.objects.create(name='Straße')
+        assert genre_registry.id_for('STRASSE') is None
+        Genre.objects.create(name='STRASSE')
+        with pytest.raises(IntegrityError), transaction.atomic():
+            Genre.objects.create(name='sci  fi')
+
+    def test_existing_names_are_rejected_in_any_case(self):
+        self.client.login(username='testuser', password='testpassword')
+        genre_registry.choices()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('genre_add'), {'name': 'rpg'})
+        assert response.context['form'].errors == {'name': ['Genre already exists.']}
+        assert not any('pra_app_genre' in query['sql'] for query in queries.captured_queries)
+
+        # added without signals, so the registry does not know it yet: the insert fails instead
+        Genre.objects.bulk_create([Genre(name='Comedy')])
+        response = self.client.post(reverse('genre_add'), {'name': 'COMEDY'})
+        assert response.context['form'].errors == {'name': ['Genre already exists.']}
+        assert Genre.objects.count() == 3
+        with pytest.raises(IntegrityError), transaction.atomic():
+            Genre.objects.create(name='drama')
+
+
+class TestsForSearch(TestCase):
+    """
+    Group of tests for the search engine, run against the in-memory backend used on SQLite
+    """
+
+    def setUp(self):
+        get_search_backend().reset()
+        self.witcher = Game.objects.create(title='The Witcher 3', description='Open world role playing game')
+        self.portal = Game.objects.create(title='Portal', description='Puzzle game set in a witcher free world')
+        self.godfather = Movie.objects.create(title='The Godfather', description='Crime family saga')
+
+    def test_multi_word_query_ranks_title_matches_first(self):
+        """
+        Every word of the query has to match, and titles matching in the title rank above description matches
+        """
+        results = get_search_backend().search('witch world')
+        assert results['games'] == [self.witcher, self.portal]
+        assert results['movies'] == []
+
+        results = get_search_backend().search('godfather saga')
+        assert results['movies'] == [self.godfather]
+
+    def test_index_follows_saves_and_deletes(self):
+        """
+        Added, renamed and deleted titles should be found (or not) right away once the index was built
+        """
+        get_search_backend().search('anything')
+        alien = Movie.objects.create(title='Alien', description='Space horror')
+        assert get_search_backend().search('alien')['movies'] == [alien]
+
+        alien.title = 'Aliens'
+        alien.description = 'Sequel'
+        alien.save()
+        assert get_search_backend().search('horror')['movies'] == []
+
+        alien.delete()
+        assert get_search_backend().search('aliens')['movies'] == []
+
+    def test_search_results_view(self):
+        """
+        The search page should list the ranked matches of both kinds
+        """
+        response = self.client.get(reverse('search_results'), {'query': 'the'})
+        assert response.status_code == 200
+        assert list(response.context['games']) == [self.witcher]
+        assert list(response.context['movies']) == [self.godfather]
+
+    def test_fuzzy_search_tolerates_typos(self):
+        """
+        Misspelled queries should find the similar titles through the trigram index
+        """
+        assert get_search_backend().fuzzy_search('witchr')['games'] == [self.witcher]
+        assert get_search_backend().fuzzy_search('godfater')['movies'] == [self.godfather]
+        assert get_search_backend().fuzzy_search('zzzz') == {'games': [], 'movies': []}
+
+    def test_search_view_falls_back_to_fuzzy_matching(self):
+        """
+        When nothing fits the query exactly, the search page should show the similar titles instead
+        """
+        response = self.client.get(reverse('search_results'), {'query': 'godfater'})
+        assert response.context['fuzzy'] is True
+        assert list(response.context['movies']) == [self.godfather]
+
+
+class TestsForFacetedSearch(TestCase):
+    """
+    Group of tests for the genre and release year filters of the search and its facet counts
+    """
+
+    def setUp(self):
+        get_search_backend().reset()
+        self.rpg = Genre.objects.create(name='RPG')
+        self.drama = Genre.objects.create(name='Drama')
+        self.witcher = Game.objects.create(title='The Witcher 3', release_date=datetime.date(2015, 5, 19))
+        self.witcher.genres.add(self.rpg)
+        self.darkness = Game.objects.create(title='The Darkness', release_date=datetime.date(2007, 6, 25))
+        self.darkness.genres.add(self.rpg, self.drama)
+        self.lost = Game.objects.create(title='The Lost Vikings')
+        self.godfather = Movie.objects.create(title='The Godfather', release_date=datetime.date(1972, 3, 24))
+        self.godfather.genres.add(self.drama)
+
+    def test_filters_narrow_the_matches(self):
+        """
+        Only the matches of the genre and released within the years should be returned
+        """
+        backend = get_search_backend()
+        assert backend.search('the', filters={'genre': self.rpg})['games'] == [self.darkness, self.witcher]
+        assert backend.search('the', filters={'genre': self.rpg})['movies'] == []
+        assert backend.search('the', filters={'year_from': 2010})['games'] == [self.witcher]
+        assert backend.search('the', filters={'year_to': 2009}) == {'games': [self.darkness],
+                                                                     'movies': [self.godfather]}
+        assert backend.fuzzy_search('witchr', filters={'year_to': 2009})['games'] == []
+
+    def test_facets_are_counted_with_two_queries(self):
+        """
+        The genre and decade counts of all matches should take the same two queries whatever the number of genres
+        """
+        backend = get_search_backend()
+        backend.search('the')
+        with self.assertNumQueries(2):
+            facets = backend.facets('the')
+        assert facets['games']['genres'] == [{'id': self.rpg.id, 'name': 'RPG', 'count': 2},
+                                             {'id': self.drama.id, 'name': 'Drama', 'count': 1}]
+        assert facets['games']['decades'] == [{'decade': 2000, 'count': 1}, {'decade': 2010, 'count': 1}]
+        assert facets['movies'] == {'genres': [{'id': self.drama.id, 'name': 'Drama', 'count': 1}],
+                                    'decades': [{'decade': 1970, 'count': 1}]}
+
+        for number in range(5):
+            self.lost.genres.add(Genre.objects.create(name=f'Genre {number}'))
+        with self.assertNumQueries(2):
+            facets = backend.facets('the', filters={'genre': self.rpg})
+        assert [genre['count'] for genre in facets['games']['genres']] == [2, 1]
+
+    def test_search_view_lists_the_facets(self):
+        """
+        The search page should apply the filters of the form and link every facet value to the narrowed search
+        """
+        response = self.client.get(reverse('search_results'), {'query': 'the', 'genre': self.drama.id})
+        assert list(response.context['games']) == [self.darkness]
+        assert list(response.context['movies']) == [self.godfather]
+        assert response.context['filtered'] is True
+        decade = response.context['facets']['movies']['decades'][0]
+        assert decade['url'] == f'?query=the&genre={self.drama.id}&year_from=1970&year_to=1979'
+        assert response.context['unfiltered_url'] == '?query=the'
+
+        response = self.client.get(reverse('search_results'), {'query': 'the', 'year_from': 2010, 'year_to': 2000})
+        assert response.context['form'].errors
+        assert len(response.context['games']) == 3
+
+
+class TestsForAutocomplete(TestCase):
+    """
+    Group of tests for the typeahead endpoint of the search box
+    """
+
+    def setUp(self):
+        title_index.reset()
+        self.witcher = Game.objects.create(title='The Witcher 3')
+        self.wild = Game.objects.create(title='Wild Arms')
+        self.willow = Movie.objects.create(title='Willow')
+
+    def test_prefix_lookup_needs_no_queries(self):
+        """
+        Titles starting with the prefix come first, titles with a later word starting with it after them.
+        Once the index is built, lookups should not hit the database.
+        """
+        title_index.lookup('w')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('search_autocomplete'), {'q': 'Wi'})
+        titles = [result['title'] for result in response.json()['results']]
+        assert titles == ['Wild Arms', 'Willow', 'The Witcher 3']
+        assert response.json()['results'][1]['url'] == reverse('movie_details', args=[self.willow.id])
+
+    def test_index_follows_saved_titles(self):
+        """
+        Renamed and deleted titles should be reflected in the suggestions right away
+        """
+        title_index.lookup('w')
+        self.wild.title = 'Arms Race'
+        self.wild.save()
+        self.willow.delete()
+        assert [result['title'] for result in title_index.lookup('w')] == ['The Witcher 3']
+        assert [result['title'] for result in title_index.lookup('arms', limit=1)] == ['Arms Race']
+
+
+class TestsForCursorPagination(TestCase):
+    """
+    Group of tests for the keyset pagination of the game and movie lists
+    """
+
+    def setUp(self):
+        for number in range(12):
+            release_date = None if number % 4 == 0 else f'20{10 + number}-01-01'
+            Game.objects.create(title=f'Game {number:02}', release_date=release_date)
+
+    def walk(self, paginator):
+        """
+        Returns the titles of all pages going forward, then of all pages going back from the last one
+        """
+        forward, page = [], paginator.page()
+        while True:
+            forward += [game.title for game in page]
+            if not page.has_next():
+                break
+            page = paginator.page(after=page.next_cursor)
+        backward = [game.title for game in page]
+        while page.has_previous():
+            page = paginator.page(before=page.previous_cursor)
+            backward = [game.title for game in page] + backward
+        return forward, backward
+
+    def test_pages_follow_the_ordering_in_both_directions(self):
+        """
+        Walking the pages should give the same rows as the plain ordering, nulls sorted last
+        """
+        for ordering in (('title', 'pk'), ('-release_date', 'pk'), ('release_date', '-pk')):
+            paginator = CursorPaginator(Game.objects.all(), 5, ordering)
+            expected = sorted(Game.objects.all(), key=lambda game: game.title)
+            if ordering[0] != 'title':
+                dated = [game for game in expected if game.release_date]
+                undated = sorted((game for game in expected if not game.release_date),
+                                 key=lambda game: game.pk, reverse=ordering[1] == '-pk')
+                dated.sort(key=lambda game: game.release_date, reverse=ordering[0].startswith('-'))
+                expected = dated + undated
+            expected = [game.title for game in expected]
+            assert self.walk(paginator) == (expected, expected)
+
+    def test_list_view_uses_cursor_links_without_counting(self):
+        """
+        The cursor mode of the list page should not count the games and should link to the next page
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('game_list'), {'paginate': 'cursor'})
+        assert not any('COUNT' in query['sql'] for query in queries.captured_queries)
+        page = response.context['games']
+        assert [game.title for game in page] == [f'Game {number:02}' for number in range(5)]
+
+        response = self.client.get(reverse('game_list'), {'after': page.next_cursor})
+        assert [game.title for game in response.context['games']][0] == 'Game 05'
+        assert 'before=' in response.content.decode()
+
+
+class TestsForSortOrders(TestCase):
+    """
+    Group of tests for the sort orders accepted by the game and movie lists
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.old = Movie.objects.create(title='B Old', release_date='1990-01-01')
+        self.new = Movie.objects.create(title='C New', release_date='2020-01-01')
+        self.undated = Movie.objects.create(title='A Undated')
+        Review.objects.create(user=self.user, movie=self.old, rating=Decimal('9'), description='Classic')
+        Review.objects.create(user=self.user, movie=self.new, rating=Decimal('6'), description='Fine')
+        Review.objects.create(user=self.user, movie=self.new, rating=Decimal('7'), description='Good')
+
+    def titles(self, **params):
+        response = self.client.get(reverse('movie_list'), params)
+        assert response.status_code == 200
+        return [movie.title for movie in response.context['movies']]
+
+    def test_defined_sort_orders(self):
+        """
+        Every defined sort order should be honoured, with the undated titles last in both release date orders
+        """
+        assert self.titles(sort_by='title') == ['A Undated', 'B Old', 'C New']
+        assert self.titles(sort_by='newest') == ['C New', 'B Old', 'A Undated']
+        assert self.titles(sort_by='oldest') == ['B Old', 'C New', 'A Undated']
+        assert self.titles(sort_by='rating') == ['B Old', 'C New', 'A Undated']
+        assert self.titles(sort_by='reviews', paginate='cursor') == ['C New', 'B Old', 'A Undated']
+
+    def test_unknown_sort_orders_fall_back_to_title(self):
+        """
+        Unindexed or unknown fields should not reach order_by, the list falls back to the title order
+        """
+        assert self.titles(sort_by='description') == ['A Undated', 'B Old', 'C New']
+        assert self.titles(sort_by='no_such_field', paginate='cursor') == ['A Undated', 'B Old', 'C New']
+
+    def test_sort_links_keep_the_pagination(self):
+        """
+        The sort links of a cursor paginated list should keep it cursor paginated, and start from its first page
+        """
+        response = self.client.get(reverse('movie_list'), {'paginate': 'cursor', 'sort_by': 'title', 'after': 'x'})
+        assert 'href="?sort_by=rating&paginate=cursor"' in response.content.decode()
+        response = self.client.get(reverse('movie_list'), {'page': 2, 'sort_by': 'title'})
+        assert 'href="?sort_by=rating"' in response.content.decode()
+
+
+class TestsForReviewLists(TestCase):
+    """
+    Group of tests for the paginated review lists of games and movies
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.game = Game.objects.create(title='Popular Game', release_date='2023-01-01')
+        self.reviews = [
+            Review.objects.create(user=self.user, game=self.game, rating=Decimal(number % 10 + 1),
+                                  description=f'Review {number} ' + 'x' * 300)
+            for number in range(25)
+        ]
+        self.url = reverse('view_game_reviews', args=[self.game.id])
+
+    def test_reviews_are_cursor_paginated(self):
+        """
+        A page should hold reviews_per_page reviews, newest first, and link to the next one
+        """
+        response = self.client.get(self.url)
+        page = response.context['reviews']
+        assert [review.pk for review in page] == [review.pk for review in reversed(self.reviews)][:20]
+        response = self.client.get(self.url, {'after': page.next_cursor})
+        assert [review.pk for review in response.context['reviews']] == [review.pk for review in self.reviews[4::-1]]
+
+        response = self.client.get(self.url, {'sort_by': 'rating'})
+        ratings = [review.rating for review in response.context['reviews']]
+        assert ratings == sorted(ratings, reverse=True) and ratings[0] == 10
+
+    def test_listed_reviews_have_their_title(self):
+        page = self.client.get(self.url).context['reviews']
+        with CaptureQueriesContext(connection) as queries:
+            assert all(review.game_id == self.game.pk and review.movie is None for review in page)
+        assert len(queries) == 0
+
+    def test_summary_reads_an_excerpt_of_the_descriptions(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'summary': 1})
+        # the description is only read cut to the excerpt
+        [query] = [query['sql'] for query in queries.captured_queries if 'SUBSTR' in query['sql']]
+        assert query.count('"pra_app_review"."description"') == 1
+        content = response.content.decode()
+        assert 'Review 24 ' + 'x' * 189 + '…' in content and 'x' * 191 not in content
+
+    def test_streamed_page_matches_the_rendered_one(self):
+        rendered = self.client.get(self.url, {'stream': 1, 'summary': 1})
+        assert rendered.streaming
+        expected = self.client.get(self.url, {'summary': 1}).content.decode()
+        # the links of the streamed page keep ?stream=1, the rows are rendered without the whitespace of the loop
+        streamed = b''.join(rendered.streaming_content).decode()
+        assert streamed.split() == expected.replace('summary=1', 'summary=1&amp;stream=1').split()
+
+
+class TestsForRepeatedQueries(TestCase):
+    """
+    Group of tests for the detection of N+1 queries
+    """
+
+    def setUp(self):
+        self.game = Game.objects.create(title='Popular Game', release_date='2023-01-01')
+        for number in range(3):
+            user = User.objects.create_user(username=f'user{number}', password='testpassword')
+            Review.objects.create(user=user, game=self.game, rating=Decimal(5), description='Fine')
+        self.url = reverse('view_game_reviews', args=[self.game.id])
+
+    def test_block_repeating_a_query_fails(self):
+        """
+        A query run threshold times with other parameters should be reported with the line running it
+        """
+        with pytest.raises(RepeatedQueriesError, match=r'3 x SELECT .*\n +from pra_app/tests.py:\d+ in'):
+            with assert_no_repeated_queries():
+                for review in Review.objects.all():
+                    review.user.username
+        with assert_no_repeated_queries():
+            for review in Review.objects.select_related('user'):
+                review.user.username
+            # the same query with the same parameters is not an N+1 query
+            for _ in range(3):
+                Game.objects.get(pk=self.game.pk)
+
+    @override_settings(PRA_RESPONSE_CACHE=None)
+    def test_middleware_reports_the_template_line(self):
+        """
+        A page reading a relation of every listed object should fail in tests and log a warning otherwise
+        """
+        without_users = mock.patch.object(ViewGameReviewsView, 'get_review_queryset',
+                                          lambda view, title, summary: Review.objects.filter(title=title))
+        with without_users:
+            with pytest.raises(RepeatedQueriesError, match=r'view_game_reviews\)(.|\n)*review-row.html, line 2'):
+                self.client.get(self.url)
+
+            with self.settings(PRA_QUERY_CHECK='log'), self.assertLogs('pra_app.querycheck', 'WARNING') as logs:
+                assert Client().get(self.url).status_code == 200
+            assert 'queries repeated with other parameters in GET' in logs.output[0]
+
+        with self.settings(PRA_QUERY_CHECK=None):
+            with mock.patch('pra_app.querycheck.QueryRecorder') as recorder:
+                assert Client().get(self.url).status_code == 200
+        recorder.assert_not_called()
+
+
+class TestsForResponseCache(TestCase):
+    """
+    Group of tests for the tag invalidated cache of the catalog pages
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.genre = Genre.objects.create(name='Comedy')
+        self.game = Game.objects.create(title='Test Game', release_date='2023-01-01', description='Description')
+        self.game.genres.add(self.genre)
+        self.url = reverse('game_details', args=[self.game.id])
+
+    def assert_cached(self, url, cached=True):
+        response = self.client.get(url)
+        assert response['X-Cache'] == ('HIT' if cached else 'MISS')
+        return response
+
+    def test_pages_are_served_from_the_cache(self):
+        """
+        The second anonymous request of a page should be answered without queries
+        """
+        self.assert_cached(self.url, cached=False)
+        with self.assertNumQueries(0):
+            self.assert_cached(self.url)
+        self.assert_cached(reverse('game_list'), cached=False)
+        self.assert_cached(reverse('game_list') + '?sort_by=newest', cached=False)
+
+    def test_writes_invalidate_the_pages_depending_on_them(self):
+        """
+        Editing the game, reviewing it or renaming its genre should invalidate its page, other pages stay cached
+        """
+        other = Movie.objects.create(title='Other Movie')
+        other_url = reverse('movie_details', args=[other.id])
+        self.assert_cached(other_url, cached=False)
+
+        for write in (
+            lambda: Game.objects.get(pk=self.game.pk).save(),
+            lambda: Review.objects.create(user=self.user, game=self.game, rating=Decimal('5'), description='Ok'),
+            lambda: Genre.objects.filter(pk=self.genre.pk).first().save(),
+            lambda: self.game.genres.clear(),
+        ):
+            self.assert_cached(self.url, cached=False)
+            self.assert_cached(self.url)
+            write()
+        self.assert_cached(self.url, cached=False)
+        self.assert_cached(other_url)
+
+    def test_local_memory_cache_is_only_used_per_process(self):
+        """
+        A cache not shared by the workers should leave the pages uncached, unless told there is one process only
+        """
+        with override_settings(PRA_RESPONSE_CACHE={'ALIAS': 'default'}):
+            assert 'X-Cache' not in self.client.get(self.url)
+        with override_settings(PRA_RESPONSE_CACHE={'ALIAS': 'default', 'PER_PROCESS': True}):
+            self.assert_cached(self.url, cached=False)
+            self.assert_cached(self.url)
+
+    def test_stats_are_shown_to_the_staff_only(self):
+        """
+        The hit and miss counters should be visible to the staff only
+        """
+        self.assert_cached(self.url, cached=False)
+        self.assert_cached(self.url)
+
+        self.client.login(username='testuser', password='testpassword')
+        assert self.client.get(reverse('cache_stats')).status_code == 302
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        assert self.client.get(reverse('cache_stats')).json() == {'hits': 1, 'misses': 1, 'hit_ratio': 0.5}
+
+
+class TestsForSharedPages(TestCase):
+    """
+    Group of tests for the catalog pages being the same for every user, with who is logged in fetched separately
+    """
+
+    def setUp(self):
+        User.objects.create_user(username='firstuser', password='testpassword')
+        User.objects.create_user(username='seconduser', password='testpassword')
+        Game.objects.create(title='Test Game', release_date='2023-01-01', description='Description')
+
+    def get_as(self, username, path):
+        client = Client()
+        client.login(username=username, password='testpassword')
+        return client.get(path)
+
+    def test_different_users_get_identical_pages(self):
+        """
+        Two different users (and an anonymous one) should get byte-identical /games/ pages, without Vary: Cookie
+        """
+        with override_settings(PRA_RESPONSE_CACHE=None):
+            first = self.get_as('firstuser', '/games/')
+            second = self.get_as('seconduser', '/games/')
+            anonymous = Client().get('/games/')
+        assert first.content == second.content == anonymous.content
+        assert b'firstuser' not in first.content
+        assert 'Cookie' not in first.get('Vary', '')
+
+    def test_user_header_fragment(self):
+        """
+        The header fragment should show the logged in user and never be cached
+        """
+        response = self.get_as('firstuser', reverse('user_header') + '?next=/games/')
+        assert b'Logged as firstuser' in response.content
+        assert b'/logout/?next=/games/' in response.content
+        assert 'no-cache' in response['Cache-Control']
+
+        response = Client().get(reverse('user_header') + '?next=https://example.com/')
+        assert b'/login/?next=/"' in response.content
+
+
+class TestsForCatalogImport(TestCase):
+    """
+    Group of tests for the import_catalog command
+    """
+
+    def setUp(self):
+        self.comedy = Genre.objects.create(name='Comedy')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_csv_import(self):
+        """
+        Titles of both kinds should be imported in batches with their (existing or new) genres, invalid rows skipped
+        """
+        path = self.write('catalog.csv', (
+            'kind,title,release_date,description,genres\n'
+            'game,Portal,2007-10-10,Puzzles,comedy|Puzzle\n'
+            'movie,Alien,1979-05-25,,Horror\n'
+            'movie,,2000-01-01,No title,\n'
+            'game,Doom,not a date,,\n'
+            'game,Quake,,,Puzzle\n'
+        ))
+        out = StringIO()
+        call_command('import_catalog', path, batch_size=2, stdout=out)
+
+        assert 'Imported 3 titles' in out.getvalue() and 'skipped 2' in out.getvalue()
+        assert not os.path.exists(path + '.checkpoint')
+        portal = Game.objects.get(title='Portal')
+        assert sorted(genre.name for genre in portal.genres.all()) == ['Comedy', 'Puzzle']
+        assert Genre.objects.filter(name='Puzzle').count() == 1
+        assert list(Game.objects.get(title='Quake').genres.all()) == [Genre.objects.get(name='Puzzle')]
+        assert Movie.objects.get(title='Alien').genres.get().name == 'Horror'
+
+    def test_jsonl_import_resumes_after_checkpoint(self):
+        """
+        A resumed import should continue after the checkpoint, without importing the last batch twice
+        """
+        lines = [json.dumps({'title': f'Movie {number}', 'genres': ['Comedy']}) for number in range(5)]
+        path = self.write('catalog.jsonl', '\n'.join(lines) + '\n')
+        Movie.objects.create(title='Movie 2')
+        self.write('catalog.jsonl.checkpoint', json.dumps({'rows': 2}))
+
+        call_command('import_catalog', path, kind='movie', resume=True, stdout=StringIO())
+        assert sorted(Movie.objects.values_list('title', flat=True)) == ['Movie 2', 'Movie 3', 'Movie 4']
+
+
+class TestsForCatalogExport(TestCase):
+    """
+    Group of tests for the streaming export command and view
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword', is_staff=True)
+        comedy = Genre.objects.create(name='Comedy')
+        drama = Genre.objects.create(name='Drama')
+        self.games = [Game.objects.create(title=f'Game {number}', release_date='2023-01-01') for number in range(3)]
+        self.games[0].genres.add(comedy, drama)
+        Review.objects.create(user=self.user, game=self.games[1], rating=Decimal('8'), description='Good')
+
+    def test_export_command_writes_csv_in_chunks(self):
+        """
+        Every game should be exported once with its genre names, whatever the chunk size
+        """
+        path = os.path.join(tempfile.mkdtemp(), 'games.csv')
+        call_command('export_catalog', 'games', chunk_size=2, output=path)
+        with open(path, newline='') as file:
+            rows = list(csv.DictReader(file))
+        os.remove(path)
+
+        assert [row['title'] for row in rows] == ['Game 0', 'Game 1', 'Game 2']
+        assert sorted(rows[0]['genres'].split('|')) == ['Comedy', 'Drama']
+        assert (rows[1]['review_count'], rows[1]['average_rating']) == ('1', '8.00')
+
+    def test_export_view_streams_compressed_jsonl(self):
+        """
+        The staff should be able to download the reviews as gzip compressed JSON lines
+        """
+        assert self.client.get('/export/reviews.jsonl').status_code == 302
+
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get('/export/reviews.jsonl.gz')
+        assert response.streaming and response['Content-Type'] == 'application/gzip'
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        assert [json.loads(line) for line in lines] == [{
+            'id': Review.objects.get().pk, 'user': 'testuser', 'game_id': self.games[1].pk, 'movie_id': None,
+            'rating': '8.0', 'description': 'Good',
+        }]
+
+
+class TestsForApi(TestCase):
+    """
+    Group of tests for the read-only JSON API
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.comedy = Genre.objects.create(name='Comedy')
+        self.games = [Game.objects.create(title=f'Game {number}', release_date='2023-01-01') for number in range(3)]
+        self.games[0].genres.add(self.comedy)
+
+    def test_list_selects_fields_and_pages_by_cursor(self):
+        """
+        The list should only contain the requested fields and lead through all games by its cursors
+        """
+        response = self.client.get('/api/games/', {'fields': 'title,genres', 'limit': 2})
+        data = response.json()
+        assert data['results'] == [
+            {'id': self.games[0].pk, 'title': 'Game 0', 'genres': [self.comedy.pk]},
+            {'id': self.games[1].pk, 'title': 'Game 1', 'genres': []},
+        ]
+        assert data['previous'] is None
+
+        data = self.client.get('/api/games/', {'fields': 'title', 'limit': 2, 'after': data['next']}).json()
+        assert data['results'] == [{'id': self.games[2].pk, 'title': 'Game 2'}]
+        assert data['next'] is None
+
+        assert self.client.get('/api/games/', {'fields': 'password'}).status_code == 400
+        assert self.client.get('/api/genres/', {'fields': 'genres'}).status_code == 400
+
+    def test_unchanged_resource_is_not_modified(self):
+        """
+        A request with the ETag of an unchanged game should get a 304 without reading the game itself,
+        and a full response again once the game (or its genres) changed
+        """
+        url = f'/api/games/{self.games[1].pk}/'
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304 and len(queries) == 1
+
+        Game.objects.filter(pk=self.games[1].pk).update(updated_at='2030-01-01T00:00:00Z')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200 and response['ETag'] != etag
+
+        etag = response['ETag']
+        self.games[1].genres.add(self.comedy)
+        assert self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_reviews_are_filtered_by_title(self):
+        Review.objects.create(user=self.user, game=self.games[0], rating=Decimal('7'), description='Fine')
+        Review.objects.create(user=self.user, game=self.games[1], rating=Decimal('9'), description='Great')
+        data = self.client.get('/api/reviews/', {'game': self.games[1].pk}).json()
+        assert [(review['user'], review['game'], review['rating']) for review in data['results']] == [
+            ('testuser', self.games[1].pk, '9.0')]
+
+
+class TestsForAsyncViews(TestCase):
+    """
+    Group of tests for the async variants of the read only views
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        comedy = Genre.objects.create(name='Comedy')
+        self.games = [Game.objects.create(title=f'Game {number}', release_date='2023-01-01') for number in range(7)]
+        self.games[0].genres.add(comedy)
+        Review.objects.create(user=self.user, game=self.games[0], rating=Decimal('8'), description='Good')
+
+    @override_settings(PRA_RESPONSE_CACHE=None)
+    async def test_async_views_render_the_same_pages(self):
+        """
+        Every async view should build the same page as its sync counterpart
+        """
+        game_id = str(self.games[0].pk)
+        pages = [
+            (GamesView, AsyncGamesView, '/games/', {'page': '2', 'sort_by': 'rating'}, {}),
+            (GamesView, AsyncGamesView, '/games/', {'paginate': 'cursor'}, {}),
+            (GameDetailsView, AsyncGameDetailsView, f'/games/{game_id}', {}, {'game_id': game_id}),
+            (ViewGameReviewsView, AsyncViewGameReviewsView, f'/view-game-reviews/{game_id}', {},
+             {'game_id': game_id}),
+        ]
+        for sync_view, async_view, path, params, kwargs in pages:
+            expected = await sync_to_async(sync_view.as_view())(RequestFactory().get(path, params), **kwargs)
+            response = await async_view.as_view()(AsyncRequestFactory().get(path, params), **kwargs)
+            assert response.status_code == 200
+            assert response.content == expected.content
+
+    async def test_async_details_of_missing_game(self):
+        view = AsyncGameDetailsView.as_view()
+        for game_id in ('0', 'abc'):
+            with pytest.raises(Http404):
+                await view(AsyncRequestFactory().get(f'/games/{game_id}'), game_id=game_id)
+
+    async def test_async_views_use_the_page_cache(self):
+        view = AsyncGamesView.as_view()
+        assert (await view(AsyncRequestFactory().get('/games/')))['X-Cache'] == 'MISS'
+        assert (await view(AsyncRequestFactory().get('/games/')))['X-Cache'] == 'HIT'
+
+
+class TestsForViewsBenchmark(TransactionTestCase):
+
+    def test_benchmark_reports_both_modes(self):
+        Game.objects.create(title='Game', release_date='2023-01-01')
+        out = StringIO()
+        call_command('benchmark_views', '/games/', requests=4, concurrency=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        assert [line.split(':')[0].strip() for line in lines] == ['sync', 'async']
+        assert all(line.endswith(' 0 errors') for line in lines)
+
+
+class TestsForPageBenchmarks(TestCase):
+    """
+    Group of tests for the synthetic catalog and the per page benchmarks, which also keep every page within
+    its query budget
+    """
+
+    def setUp(self):
+        get_search_backend().reset()
+        title_index.reset()
+        self.created = seed_catalog(titles=40, reviews=400, users=5, genres=4, batch_size=15)
+
+    def test_seeded_catalog_has_current_aggregates(self):
+        """
+        The titles should be created with the aggregates of their reviews, and the leaderboards filled
+        """
+        assert self.created == {'genres': 4, 'users': 5, 'titles': 40, 'reviews': 400}
+        assert Review.objects.count() == 400
+        columns = ['review_count', 'rating_sum', 'average_rating', 'rating_1', 'rating_10']
+        seeded = list(Title.objects.order_by('pk').values_list(*columns))
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        assert list(Title.objects.order_by('pk').values_list(*columns)) == seeded
+        assert LeaderboardEntry.objects.filter(genre__isnull=True).count() == Title.objects.filter(
+            review_count__gt=0).count()
+
+    def test_pages_stay_within_their_query_budgets(self):
+        """
+        Every benchmarked page should answer and run at most the queries of its budget
+        """
+        results = run_benchmarks(repeat=1)
+        assert set(results) == set(PAGES)
+        assert check_results(results) == dict.fromkeys(PAGES, [])
+
+    def test_filtered_pages_are_narrowed(self):
+        """
+        The benchmarked review API page should only list the reviews of its game, not time the whole list
+        """
+        params = page_params()
+        data = self.client.get(PAGES['api_reviews'][0].format(**params) + '&limit=200').json()
+        of_game = Review.objects.filter(title_id=params['game']).order_by('pk').values_list('pk', flat=True)
+        assert [review['id'] for review in data['results']] == list(of_game) and data['next'] is None
+        assert Review.objects.exclude(title_id=params['game']).exists()
+
+    def test_regressions_against_the_baseline_fail(self):
+        """
+        A page slower than in the baseline by more than the threshold, or over its budget, should fail the command
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command('benchmark_pages', 'game_list', repeat=1, baseline=path, save_baseline=True,
+                         stdout=StringIO())
+            results = load_baseline(path)
+            results['game_list']['median_ms'] += 1000
+            problems = check_results(results, load_baseline(path), threshold=0.5)
+            assert problems['game_list'] == [f'{results["game_list"]["median_ms"]:.1f}ms, '
+                                             f'{results["game_list"]["median_ms"] - 1000:.1f}ms in the baseline']
+
+            with mock.patch.dict(PAGES, {'game_list': ('/games/', 0)}):
+                with pytest.raises(CommandError, match='1 of 1 pages failed: game_list'):
+                    call_command('benchmark_pages', 'game_list', repeat=1, baseline=path, stdout=StringIO())
+
+
+class TestsForMetrics(TestCase):
+    """
+    Group of tests for the request metrics and their Prometheus endpoint
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        metrics_settings = override_settings(PRA_METRICS=True, PRA_METRICS_DIR=self.directory.name)
+        metrics_settings.enable()
+        self.addCleanup(metrics_settings.disable)
+        reset_values()
+        self.addCleanup(reset_values)
+        # the connection was opened before the metrics were turned on
+        install_query_timer(connection)
+        self.addCleanup(connection.execute_wrappers.remove, time_query)
+        Game.objects.create(title='Game', release_date='2023-01-01')
+
+    def test_requests_are_counted_by_view(self):
+        """
+        /metrics should show the requests, their times, queries and page cache results by URL name
+        """
+        self.client.get(reverse('game_list'))
+        self.client.get(reverse('game_list'))
+        self.client.get('/no-such-page/')
+        response = self.client.get(reverse('metrics'))
+        assert response['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+        lines = response.content.decode().splitlines()
+
+        assert 'pra_http_requests_total{view="game_list",method="GET",status="200"} 2' in lines
+        assert 'pra_http_requests_total{view="<unmatched>",method="GET",status="404"} 1' in lines
+        assert 'pra_http_request_duration_seconds_bucket{view="game_list",le="+Inf"} 2' in lines
+        assert 'pra_http_request_duration_seconds_count{view="game_list"} 2' in lines
+        assert 'pra_response_cache_requests_total{view="game_list",result="miss"} 1' in lines
+        assert 'pra_response_cache_requests_total{view="game_list",result="hit"} 1' in lines
+        queries = [line for line in lines if line.startswith('pra_db_queries_total{view="game_list"}')]
+        assert len(queries) == 1 and int(queries[0].split()[-1]) > 0
+        buckets = [int(line.split()[-1]) for line in lines
+                   if line.startswith('pra_http_request_duration_seconds_bucket{view="game_list"')]
+        assert buckets == sorted(buckets) and len(buckets) == len(BUCKET_LABELS)
+
+    def test_values_of_all_processes_are_added_up(self):
+        """
+        Every worker process should write to its own file and /metrics should show the sums of all of them
+        """
+        key = ('pra_db_queries_total', (('view', 'game_list'),))
+        get_values().inc(key, 2)
+        worker = multiprocessing.get_context('fork').Process(target=lambda: get_values().inc(key, 3))
+        worker.start()
+        worker.join()
+        assert worker.exitcode == 0
+        assert len(os.listdir(self.directory.name)) == 2
+        assert get_values().read_all()[key] == 5
+
+        # series are added until the file has to grow, and read again when the process reopens its file
+        for number in range(2000):
+            get_values().inc(('pra_http_requests_total', (('view', f'view{number}'),)))
+        reset_values()
+        get_values().inc(key)
+        values = get_values().read_all()
+        assert values[key] == 6 and len(values) == 2001
+
+    def test_metrics_are_off_by_default(self):
+        with self.settings(PRA_METRICS=False):
+            assert Client().get(reverse('metrics')).status_code == 404
+            with mock.patch('pra_app.metrics.record_request') as record_request:
+                Client().get(reverse('game_list'))
+        record_request.assert_not_called()
+
+
+@override_settings(PRA_RESPONSE_CACHE=None)
+class TestsForProfiling(TestCase):
+    """
+    Group of tests for the Server-Timing header, the request profiler and the slow query log
+    """
+
+    def setUp(self):
+        Game.objects.create(title='Game', release_date='2023-01-01')
+        self.staff = User.objects.create_user(username='staff', password='testpassword', is_staff=True)
+        User.objects.create_user(username='testuser', password='testpassword')
+
+    def test_server_timing_splits_the_response_time(self):
+        """
+        With PRA_SERVER_TIMING responses should tell the time spent in SQL, templates and the rest
+        """
+        assert 'Server-Timing' not in self.client.get(reverse('game_list'))
+        with self.settings(PRA_SERVER_TIMING=True):
+            response = Client().get(reverse('game_list'))
+        parts = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+        assert parts == ['db', 'template', 'view', 'total']
+        assert re.search(r'desc="SQL \(\d+ queries\)"', response['Server-Timing'])
+
+    def test_staff_members_can_profile_a_request(self):
+        """
+        ?profile=1 should answer with the profile of the request for staff members only, stored when asked
+        """
+        with self.settings(PRA_PROFILING=True):
+            client = Client()
+            client.login(username='testuser', password='testpassword')
+            assert client.get(reverse('game_list'), {'profile': 1})['Content-Type'].startswith('text/html')
+
+            client.login(username='staff', password='testpassword')
+            with tempfile.TemporaryDirectory() as directory, self.settings(PRA_PROFILE_DIR=directory):
+                response = client.get(reverse('game_list'), HTTP_X_PROFILE='1')
+                assert os.listdir(directory) == [os.path.basename(response['X-Profile-File'])]
+        content = response.content.decode()
+        assert response['Content-Type'] == 'text/plain; charset=utf-8'
+        assert content.startswith('Profile of GET /games/ (status 200)')
+        assert 'function calls' in content and 'views.py' in content
+        assert 'Server-Timing' in response
+
+    def test_slow_queries_are_logged_with_their_plan(self):
+        """
+        Queries over PRA_SLOW_QUERY_MS should be logged with their EXPLAIN plan
+        """
+        with self.settings(PRA_SLOW_QUERY_MS=0):
+            install_slow_query_logger(connection)
+            self.addCleanup(connection.execute_wrappers.pop)
+            with self.assertLogs('pra_app.profiling', 'WARNING') as logs:
+                list(Game.objects.filter(title='Game'))
+        assert len(logs.output) == 1
+        assert 'Slow query' in logs.output[0] and 'FROM "pra_app_title"' in logs.output[0]
+        assert '\nplan:\n' in logs.output[0]
+
+        with self.settings(PRA_SLOW_QUERY_MS=None), self.assertNoLogs('pra_app.profiling'):
+            list(Game.objects.all())
+
+
+class TestsForDatabaseSettings(TestCase):
+
+    def test_database_from_env(self):
+        """
+        Connections should be persistent by default, and pooled when asked for
+        """
+        database = database_from_env({'PRA_DB_NAME': 'catalog', 'PRA_DB_CONN_MAX_AGE': 'none'})
+        assert (database['ENGINE'], database['NAME'], database['PORT']) == (
+            'django.db.backends.postgresql', 'catalog', 5432)
+        assert database['CONN_MAX_AGE'] is None and database['CONN_HEALTH_CHECKS']
+
+        database = database_from_env({'PRA_DB_POOL': '1', 'PRA_DB_POOL_MAX_SIZE': '20'})
+        assert (database['ENGINE'], database['CONN_MAX_AGE']) == ('pra.db_backends.pooled_postgresql', 0)
+        assert database['OPTIONS']['pool'] == {'min_size': 2, 'max_size': 20, 'timeout': 30.0, 'max_idle': 600.0}
+
+    def test_pool_stats_are_shown_to_the_staff_only(self):
+        User.objects.create_user(username='staff', password='testpassword', is_staff=True)
+        assert self.client.get('/db/pool/stats/').status_code == 302
+        self.client.login(username='staff', password='testpassword')
+        assert self.client.get('/db/pool/stats/').json() == {}
+
+
+@override_settings(PRA_DB_REPLICAS={'replica1': 2, 'replica2': 1})
+class TestsForReplicaRouter(SimpleTestCase):
+    """
+    Group of tests for routing the reads to the read replicas (without test transactions, as reads inside
+    transactions stay on the default database)
+    """
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def read_from(self, request):
+        """
+        Runs the request through the stickiness middleware, returning the databases a read was routed to
+        before and after a write of the view, and the response
+        """
+        routed = []
+
+        def view(request):
+            routed.append(self.router.db_for_read(Game))
+            if request.method == 'POST':
+                self.router.db_for_write(Review)
+            routed.append(self.router.db_for_read(Game))
+            return HttpResponse()
+
+        response = primary_stickiness_middleware(view)(request)
+        return routed, response
+
+    def test_reads_are_spread_by_weight(self):
+        routed = [self.router.db_for_read(Game) for _ in range(6)]
+        assert routed == ['replica1', 'replica2', 'replica1'] * 2
+        assert self.router.db_for_read(User) is None
+        assert self.router.allow_migrate('replica1', 'pra_app') is False
+
+    def test_client_reads_its_own_writes(self):
+        """
+        After writing, a client should read from the default database until the stickiness runs out
+        """
+        routed, response = self.read_from(RequestFactory().get('/games/'))
+        assert None not in routed and STICKINESS_COOKIE not in response.cookies
+
+        routed, response = self.read_from(RequestFactory().post('/games/review/1/'))
+        assert routed == [None, None]
+        cookie = response.cookies[STICKINESS_COOKIE]
+        assert cookie['max-age'] == 10
+
+        request = RequestFactory().get('/games/')
+        request.COOKIES[STICKINESS_COOKIE] = cookie.value
+        assert self.read_from(request)[0] == [None, None]
+        request.COOKIES[STICKINESS_COOKIE] = '0'
+        assert None not in self.read_from(request)[0]
+
+
+@override_settings(PRA_DB_REPLICAS={'replica1': 1})
+class TestsForReadYourWrites(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.game = Game.objects.create(title='Game', release_date='2023-01-01')
+
+    def test_review_redirect_is_read_from_the_default_database(self):
+        """
+        A user adding a review should be redirected to a page read from the default database
+        """
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.post(f'/games/review/{self.game.pk}/', {'rating': '8', 'description': 'Good'})
+        assert response.status_code == 302 and STICKINESS_COOKIE in response.cookies
+        response = self.client.get(response.url)
+        assert response.status_code == 200 and response.context['game'].review_count == 1
+
+    def test_pinned_clients_are_not_served_cached_pages(self):
+        """
+        A page cached before a review should not be shown to its author, who reads from the default database
+        """
+        url = reverse('game_details', args=[self.game.pk])
+        assert Client().get(url)['X-Cache'] == 'MISS'
+        self.client.login(username='testuser', password='testpassword')
+        self.client.post(f'/games/review/{self.game.pk}/', {'rating': '8', 'description': 'Good'})
+        response = self.client.get(url)
+        assert 'X-Cache' not in response and response.context['game'].review_count == 1
+
+    def test_pages_read_from_a_replica_are_kept_for_the_stickiness_window(self):
+        url = reverse('game_details', args=[self.game.pk])
+        with mock.patch.object(response_cache, 'set', wraps=response_cache.set) as cache_set:
+            with mock.patch('pra_app.cache.request_read_replica', return_value=True):
+                Client().get(url)
+            Client().get(reverse('game_list'))
+        assert [call.args[3] for call in cache_set.call_args_list] == [10, None]
@@ -7,6 +7,7 @@ from pra_app.models import Game, Movie, Genre, Review
 from pra_app.forms import LoginForm, ReviewForm
 from decimal import Decimal
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 
 
 # TESTS FOR VIEWS
@@ -210,17 +211,12 @@ class ReviewModelTestCase(TestCase):
 
     def test_review_no_game_or_movie(self):
         """
-        Test function that checks if it is possible to create review where no movie or game is selected or existing.
+        Test function that checks that a review where no movie or game is selected or existing can not be created.
         """
         review = Review(user=self.user, rating=Decimal('8.5'), description='Review without game or movie')
 
-        try:
+        with self.assertRaises(IntegrityError), transaction.atomic():
             review.save()
-        except ValidationError as e:
-            self.assertEqual(
-                e.message_dict,
-                {'__all__': ['A review must be associated with either a game or a movie, but not both.']}
-            )
 
     def test_review_with_movie(self):
         """
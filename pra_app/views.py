@@ -1,16 +1,107 @@
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.hashers import make_password
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Substr
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import get_template, render_to_string
 from django.urls import reverse_lazy
 from django.views import View
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import never_cache
 from django.views.generic import CreateView
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 
+from pra.database import pool_stats
+
+from .autocomplete import title_index
+from .cache import CachedResponseMixin, response_cache
+from .exporting import iter_export
 from .forms import ReviewForm, LoginForm, GameAddForm, MovieAddForm, AddGenreForm, SearchForm, GameEditForm
-from .models import Game, Movie, Review, Genre, User
+from .genres import genre_title_counts
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, exposition, metrics_enabled
+from .models import KIND_MODELS, Game, Movie, Genre, LeaderboardEntry, Title, User
+from .pagination import cursor_page, sort_expressions, wants_cursor_pagination
+from .ratings import RatingDistribution
+from .search import get_search_backend
+
+# sort_by values accepted by the game and movie lists -> their ordering, each one backed by an index
+# of the same columns (see the Meta of Title and the 0011_title migration)
+SORT_ORDERS = {
+    'title': ('title', 'id'),
+    'newest': ('-release_date', '-id'),
+    'oldest': ('release_date', 'id'),
+    'rating': ('-average_rating', '-id'),
+    'reviews': ('-review_count', '-id'),
+}
+DEFAULT_SORT_ORDER = 'title'
+
+
+# sort orders depending on the rating aggregates, their pages also change with every review
+RATING_SORT_ORDERS = {'rating', 'reviews'}
+
+
+# sort_by values accepted by the review lists of a title -> their ordering, backed by the indexes on the title
+# and the same columns (see the Meta of Review), newest first by the increasing ids of the reviews
+REVIEW_SORT_ORDERS = {
+    'newest': ('-id',),
+    'rating': ('-rating', '-id'),
+}
+DEFAULT_REVIEW_SORT_ORDER = 'newest'
+
+# characters of the description shown per review in the summary mode of the review lists
+REVIEW_EXCERPT_LENGTH = 200
+
+# order of the leaderboards, backed by the index of LeaderboardEntry
+LEADERBOARD_ORDER = ('-score', '-title')
+
+# rows rendered per chunk of a streamed review list
+STREAM_CHUNK_ROWS = 10
+
+
+def get_sort_order(request):
+    """
+    Returns the sort_by value of the request, or the default one for anything that is not in SORT_ORDERS
+    """
+    sort_by = request.GET.get('sort_by', DEFAULT_SORT_ORDER)
+    return sort_by if sort_by in SORT_ORDERS else DEFAULT_SORT_ORDER
+
+
+def sort_links_query(request, cursor_pagination):
+    """
+    Query string the sort links keep: the one of the request without sort_by and the position in the old order
+    (page, after, before), and paginate=cursor on cursor paginated lists
+    """
+    query = request.GET.copy()
+    for name in ('sort_by', 'page', 'after', 'before'):
+        query.pop(name, None)
+    if cursor_pagination:
+        query['paginate'] = 'cursor'
+    return query.urlencode()
+
+
+def stream_page(request, template_name, context, rows, row_template_name):
+    """
+    Renders the page in the parts before and after its rows (the place of the rows is marked by a rows_marker
+    in the context, see review-rows.html) and yields it in chunks: the part before the rows, the rows
+    STREAM_CHUNK_ROWS at a time and then the rest, so the first bytes leave before all rows are rendered.
+    """
+    marker = mark_safe('<!-- rows -->')
+    head, tail = render_to_string(template_name, {**context, 'rows_marker': marker}, request).split(marker, 1)
+    yield head
+    row_template = get_template(row_template_name)
+    chunk = []
+    for row in rows:
+        chunk.append(row_template.render({**context, 'review': row}, request))
+        if len(chunk) == STREAM_CHUNK_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk) + tail
 
 
 class LandingPageView(View):
@@ -22,6 +113,20 @@ class LandingPageView(View):
         return render(request, 'index.html')
 
 
+@method_decorator(never_cache, name='dispatch')
+class UserHeaderView(View):
+    """
+    Fragment of the page header showing who is logged in, fetched by user-header.js.
+    Kept out of base.html so that the catalog pages are the same for every user and can be cached whole.
+    """
+
+    def get(self, request):
+        next_url = request.GET.get('next', '/')
+        if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+            next_url = '/'
+        return render(request, 'user-header.html', {'next': next_url})
+
+
 class LoginView(View):
     """
     Login page view - used to log users to the app
@@ -74,17 +179,79 @@ class RegisterView(View):
         return redirect('/login/')
 
 
-class GamesView(View):
+class ReviewListMixin(CachedResponseMixin):
+    """
+    Review list of one game or movie, cursor paginated in one of the REVIEW_SORT_ORDERS, so a page reads
+    reviews_per_page reviews with an index seek however many reviews the title has.
+    With ?summary=1 the descriptions are cut to REVIEW_EXCERPT_LENGTH characters by the database, with
+    ?stream=1 the page is sent in chunks while its rows are rendered (streamed pages are not cached).
+    """
+    reviews_per_page = 20
+    cache_query_params = ('sort_by', 'after', 'before', 'summary', 'stream')
+
+    def get_review_options(self, request):
+        """
+        Returns the sort order and whether the summary mode is on
+        """
+        sort_by = request.GET.get('sort_by', DEFAULT_REVIEW_SORT_ORDER)
+        sort_by = sort_by if sort_by in REVIEW_SORT_ORDERS else DEFAULT_REVIEW_SORT_ORDER
+        return sort_by, bool(request.GET.get('summary'))
+
+    def get_review_queryset(self, title, summary):
+        # read through the title, so every review has it without a query of its own
+        reviews = title.reviews.select_related('user')
+        if summary:
+            # one character more than shown tells truncatechars whether the description was cut
+            reviews = reviews.defer('description').annotate(
+                excerpt=Substr('description', 1, REVIEW_EXCERPT_LENGTH + 1))
+        return reviews
+
+    def get_review_context(self, request, reviews, sort_by, summary):
+        return {
+            'reviews': reviews,
+            'sort_by': sort_by,
+            'summary': summary,
+            'excerpt_length': REVIEW_EXCERPT_LENGTH,
+            'links_query': urlencode({name: 1 for name in ('summary', 'stream') if request.GET.get(name)}),
+        }
+
+    def render_reviews(self, request, context):
+        if not request.GET.get('stream') or not context['reviews']:
+            return render(request, self.template_name, context)
+        return StreamingHttpResponse(
+            stream_page(request, self.template_name, context, context['reviews'], 'review-row.html'))
+
+    def get_reviews_page(self, request, title):
+        sort_by, summary = self.get_review_options(request)
+        reviews = cursor_page(request, self.get_review_queryset(title, summary), self.reviews_per_page,
+                              REVIEW_SORT_ORDERS[sort_by])
+        return self.get_review_context(request, reviews, sort_by, summary)
+
+
+class GamesView(CachedResponseMixin, View):
     """
     View containing list of all games that are on the database, sorted by their names alphabetically
+    (or by one of the other SORT_ORDERS)
     Paginator is set to include 5 results per page (can be extended)
+    With cursor pagination (see pra_app.pagination) pages are read with index seeks and without counting all games
     """
     template_name = 'games.html'
     games_per_page = 5
+    cache_query_params = ('sort_by', 'page', 'paginate', 'after', 'before')
+
+    def get_cache_tags(self, request):
+        return {'games', 'title-ratings'} if get_sort_order(request) in RATING_SORT_ORDERS else {'games'}
 
     def get(self, request):
-        sort_by = request.GET.get('sort_by', 'title')
-        games = Game.objects.all().order_by(sort_by)
+        sort_by = get_sort_order(request)
+        ordering = SORT_ORDERS[sort_by]
+        if wants_cursor_pagination(request):
+            games = cursor_page(request, Game.objects.all(), self.games_per_page, ordering)
+            return render(request, self.template_name,
+                          {'games': games, 'sort_by': sort_by, 'cursor_pagination': True,
+                           'links_query': sort_links_query(request, True)})
+
+        games = Game.objects.order_by(*sort_expressions(Game, ordering))
         paginator = Paginator(games, self.games_per_page)
         page = request.GET.get('page')
 
@@ -95,23 +262,27 @@ class GamesView(View):
         except EmptyPage:
             games = paginator.page(paginator.num_pages)
 
-        return render(request, self.template_name, {'games': games})
+        return render(request, self.template_name,
+                      {'games': games, 'sort_by': sort_by, 'links_query': sort_links_query(request, False)})
 
 
-class GameDetailsView(View):
+class GameDetailsView(CachedResponseMixin, View):
     """
     A view to show the specific game details once selected at GamesView view.
     """
 
     template_name = 'game-details.html'
 
+    def get_cache_tags(self, request, game_id):
+        return {f'title:{game_id}'} if game_id.isdigit() else None
+
     def get(self, request, game_id):
         game = get_object_or_404(Game, pk=game_id)
-        reviews = Review.objects.filter(game_id=game)
-        total_score = sum(review.rating for review in reviews)
-        average_score = total_score / len(reviews) if reviews else 0
-        genres = game.genres.all()
-        return render(request, self.template_name, {'game': game, 'average_score': average_score, 'genres': genres})
+        genres = list(game.genres.all())
+        self.add_cache_tags(*(f'genre:{genre.pk}' for genre in genres))
+        return render(request, self.template_name,
+                      {'game': game, 'average_score': game.average_rating, 'genres': genres,
+                       'ratings': RatingDistribution.of(game)})
 
 
 @method_decorator(login_required(login_url='/login/'), name='dispatch')
@@ -139,18 +310,19 @@ class AddGameReviewView(View):
         return render(request, self.template_name, {'game': game, 'form': form})
 
 
-class ViewGameReviewsView(View):
+class ViewGameReviewsView(ReviewListMixin, View):
     """
-    View containing a list of all reviews that a certain game received.
+    View containing the reviews that a certain game received, a page at a time (see ReviewListMixin).
     If accessed as unknown user (not logged in or anonymous) the user is redirected to login page
     """
     template_name = 'view-game-reviews.html'
 
+    def get_cache_tags(self, request, game_id):
+        return {f'title:{game_id}'} if game_id.isdigit() else None
+
     def get(self, request, game_id):
         game = get_object_or_404(Game, pk=game_id)
-        reviews = Review.objects.filter(game_id=game_id).select_related('user')
-
-        return render(request, self.template_name, {'game': game, 'reviews': reviews})
+        return self.render_reviews(request, {'game': game, **self.get_reviews_page(request, game)})
 
 
 @method_decorator(login_required(login_url='/login/'), name='dispatch')
@@ -174,17 +346,30 @@ class GameAddView(View):
         return render(request, self.template_name, {'form': form})
 
 
-class MoviesView(View):
+class MoviesView(CachedResponseMixin, View):
     """
     View containing list of all movies available on the database, sorted by their names
+    (or by one of the other SORT_ORDERS)
     Paginator is set to include 5 results per page (can be tweaked)
+    With cursor pagination (see pra_app.pagination) pages are read with index seeks and without counting all movies
     """
     template_name = 'movies.html'
     movies_per_page = 5
+    cache_query_params = ('sort_by', 'page', 'paginate', 'after', 'before')
+
+    def get_cache_tags(self, request):
+        return {'movies', 'title-ratings'} if get_sort_order(request) in RATING_SORT_ORDERS else {'movies'}
 
     def get(self, request):
-        sort_by = request.GET.get('sort_by', 'title')
-        movies = Movie.objects.all().order_by(sort_by)
+        sort_by = get_sort_order(request)
+        ordering = SORT_ORDERS[sort_by]
+        if wants_cursor_pagination(request):
+            movies = cursor_page(request, Movie.objects.all(), self.movies_per_page, ordering)
+            return render(request, self.template_name,
+                          {'movies': movies, 'sort_by': sort_by, 'cursor_pagination': True,
+                           'links_query': sort_links_query(request, True)})
+
+        movies = Movie.objects.order_by(*sort_expressions(Movie, ordering))
         paginator = Paginator(movies, self.movies_per_page)
         page = request.GET.get('page')
 
@@ -195,20 +380,27 @@ class MoviesView(View):
         except EmptyPage:
             movies = paginator.page(paginator.num_pages)
 
-        return render(request, self.template_name, {'movies': movies})
+        return render(request, self.template_name,
+                      {'movies': movies, 'sort_by': sort_by, 'links_query': sort_links_query(request, False)})
 
 
-class MovieDetailsView(View):
+class MovieDetailsView(CachedResponseMixin, View):
     """
     A view to show the specific movie details when selected from MoviesView view.
     """
 
     template_name = 'movie-details.html'
 
+    def get_cache_tags(self, request, movie_id):
+        return {f'title:{movie_id}'} if movie_id.isdigit() else None
+
     def get(self, request, movie_id):
         movie = get_object_or_404(Movie, pk=movie_id)
-        genres = movie.genres.all()
-        return render(request, self.template_name, {'movie': movie, 'genres': genres})
+        genres = list(movie.genres.all())
+        self.add_cache_tags(*(f'genre:{genre.pk}' for genre in genres))
+        return render(request, self.template_name,
+                      {'movie': movie, 'average_score': movie.average_rating, 'genres': genres,
+                       'ratings': RatingDistribution.of(movie)})
 
 
 @method_decorator(login_required(login_url='/login/'), name='dispatch')
@@ -237,17 +429,18 @@ class MovieReviewAddView(View):
         return render(request, self.template_name, {'movie': movie, 'form': form})
 
 
-class MovieReviewsView(View):
+class MovieReviewsView(ReviewListMixin, View):
     """
-    View containing a list of all reviews for a certain movie.
+    View containing the reviews of a certain movie, a page at a time (see ReviewListMixin).
     """
     template_name = 'view-movie-reviews.html'
 
+    def get_cache_tags(self, request, movie_id):
+        return {f'title:{movie_id}'} if movie_id.isdigit() else None
+
     def get(self, request, movie_id):
         movie = get_object_or_404(Movie, pk=movie_id)
-        reviews = Review.objects.filter(movie_id=movie_id).select_related('user')
-
-        return render(request, self.template_name, {'movie': movie, 'reviews': reviews})
+        return self.render_reviews(request, {'movie': movie, **self.get_reviews_page(request, movie)})
 
 
 @method_decorator(login_required(login_url='/login/'), name='dispatch')
@@ -283,41 +476,226 @@ class AddGenreView(CreateView):
     success_url = reverse_lazy('genre_add')
 
     def form_valid(self, form):
-        name = form.cleaned_data['name']
-        if Genre.objects.filter(name=name).exists():
+        # the form checked the name against the genre registry, the insert fails on a genre added meanwhile
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+        except IntegrityError:
             form.add_error('name', 'Genre already exists.')
             return self.form_invalid(form)
-
-        # Genre does not exist, proceed to save it
         messages.success(self.request, 'Genre added successfully.')
-        return super().form_valid(form)
+        return response
 
 
 class SearchResultsView(View):
     """
     Resource that searches on the game and movie database titles that fit the search criteria.
-    Returns list of games and movies that fit the search criteria
+    Returns list of games and movies that fit the search criteria, best ranked first (see pra_app.search)
+    Typo tolerant matching is used when asked for, or when nothing fits the search criteria exactly.
+    The results can be narrowed to a genre and a range of release years, the number of matches of every genre
+    and decade (the facets) is listed next to them, with links narrowing the search to each.
     """
     template_name = 'search-results.html'
+    results_per_kind = 20
 
     def get(self, request):
-        form = SearchForm()
+        return render(request, self.template_name, self.get_search_context(request))
+
+    def get_search_context(self, request):
+        form = SearchForm(request.GET or None)
         query = request.GET.get('query')
+        fuzzy = bool(request.GET.get('fuzzy'))
+        filters = form.get_filters() if form.is_valid() else {}
 
-        games = []
-        movies = []
+        results = {'games': [], 'movies': []}
+        facets = None
 
         if query:
-            games = Game.objects.filter(title__icontains=query)
-            movies = Movie.objects.filter(title__icontains=query)
-
-        context = {
+            backend = get_search_backend()
+            if not fuzzy:
+                results = backend.search(query, limit=self.results_per_kind, filters=filters)
+                fuzzy = not any(results.values())
+            if fuzzy:
+                results = backend.fuzzy_search(query, limit=self.results_per_kind, filters=filters)
+            facets = self.add_facet_links(request, backend.facets(query, fuzzy=fuzzy, filters=filters))
+
+        return {
             'form': form,
             'query': query,
-            'games': games,
-            'movies': movies,
+            'fuzzy': fuzzy,
+            'filtered': any(value is not None for value in filters.values()),
+            'unfiltered_url': self.search_url(request, genre=None, year_from=None, year_to=None),
+            'games': results['games'],
+            'movies': results['movies'],
+            'facets': facets,
         }
-        return render(request, self.template_name, context)
+
+    def add_facet_links(self, request, facets):
+        """
+        Adds the url of the search narrowed to every genre and decade of the facets
+        """
+        for kind_facets in facets.values():
+            for genre in kind_facets['genres']:
+                genre['url'] = self.search_url(request, genre=genre['id'])
+            for decade in kind_facets['decades']:
+                decade['url'] = self.search_url(request, year_from=decade['decade'], year_to=decade['decade'] + 9)
+        return facets
+
+    @staticmethod
+    def search_url(request, **params):
+        """
+        Query string of the current search with the params replaced, None values are left out
+        """
+        query = request.GET.copy()
+        for name, value in params.items():
+            query.pop(name, None)
+            if value is not None:
+                query[name] = value
+        return f'?{query.urlencode()}'
+
+
+class GenresView(CachedResponseMixin, View):
+    """
+    All genres with the number of their games and movies, from the cached genre -> title count map
+    """
+    template_name = 'genres.html'
+
+    def get_cache_tags(self, request):
+        return {'genres', 'genre-titles'}
+
+    def get(self, request):
+        counts = genre_title_counts()
+        genres = [(genre, counts.get(genre.pk, {})) for genre in Genre.objects.order_by('name')]
+        return render(request, self.template_name, {'genres': genres})
+
+
+class GenreDetailsView(CachedResponseMixin, View):
+    """
+    Titles of a genre (?kind=game or movie for one kind only), most recently added first and cursor paginated,
+    so a page is one range of the (genre, title) index of the genre assignments
+    """
+    template_name = 'genre-details.html'
+    titles_per_page = 20
+    cache_query_params = ('kind', 'after', 'before')
+
+    def get_cache_tags(self, request, genre_id):
+        return {f'genre:{genre_id}', 'genre-titles'}
+
+    def get(self, request, genre_id):
+        genre = get_object_or_404(Genre, pk=genre_id)
+        kind = request.GET.get('kind')
+        titles = Title.objects.filter(genres=genre)
+        if kind in KIND_MODELS:
+            titles = titles.filter(kind=kind)
+        else:
+            kind = None
+        titles = cursor_page(request, titles, self.titles_per_page, ('-id',))
+        self.add_cache_tags(*(f'title:{title.pk}' for title in titles))
+        return render(request, self.template_name, {
+            'genre': genre,
+            'kind': kind,
+            'titles': titles,
+            'counts': genre_title_counts().get(genre.pk, {}),
+        })
+
+
+class LeaderboardView(CachedResponseMixin, View):
+    """
+    Best rated games or movies by their weighted rating (see pra_app.leaderboards), overall or in one genre
+    (?genre=<id>). A page is one range read of the leaderboard index, cursor paginated.
+    """
+    template_name = 'leaderboard.html'
+    kind = None
+    titles_per_page = 20
+    cache_query_params = ('genre', 'after', 'before')
+
+    def get_cache_tags(self, request):
+        return {'leaderboards', 'genres'}
+
+    def get_genre(self, request):
+        genre = request.GET.get('genre', '')
+        return int(genre) if genre.isdigit() else None
+
+    def get_entries(self, genre):
+        return LeaderboardEntry.objects.filter(kind=self.kind, genre=genre).select_related('title')
+
+    def get_context(self, entries, genres, genre):
+        self.add_cache_tags(*(f'genre:{pk}' for pk, _ in genres))
+        return {'entries': entries, 'genres': genres, 'genre': genre, 'kind': self.kind,
+                'details_url': f'{self.kind}_details'}
+
+    def get(self, request):
+        genre = self.get_genre(request)
+        entries = cursor_page(request, self.get_entries(genre), self.titles_per_page, LEADERBOARD_ORDER)
+        genres = list(Genre.objects.order_by('name').values_list('pk', 'name'))
+        return render(request, self.template_name, self.get_context(entries, genres, genre))
+
+
+class AutocompleteView(View):
+    """
+    Resource answering the typeahead of the search box with the games and movies whose title has a word
+    starting with the typed text. Served from the in-memory title index, without database queries.
+    """
+    default_limit = 10
+    max_limit = 20
+
+    def get(self, request):
+        try:
+            limit = min(int(request.GET.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+        results = title_index.lookup(request.GET.get('q', ''), limit=max(limit, 0))
+        return JsonResponse({'results': results})
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class CacheStatsView(View):
+    """
+    Resource showing the hit and miss counters of the page cache (staff only)
+    """
+
+    def get(self, request):
+        return JsonResponse(response_cache.stats())
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class DatabasePoolStatsView(View):
+    """
+    Resource showing the sizes and counters of the database connection pools of the process answering it
+    (staff only, see pra/database.py), empty without pooling
+    """
+
+    def get(self, request):
+        return JsonResponse(pool_stats())
+
+
+class MetricsView(View):
+    """
+    Resource exposing the request metrics of all worker processes in the Prometheus text format, for scrapers
+    (see pra_app.metrics), not found when the metrics are off
+    """
+
+    def get(self, request):
+        if not metrics_enabled():
+            raise Http404
+        return HttpResponse(exposition(), content_type=METRICS_CONTENT_TYPE)
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class ExportView(View):
+    """
+    Resource streaming an export of the games, movies or reviews as CSV or JSON lines, gzip compressed when
+    the name ends with .gz (staff only, see pra_app.exporting)
+    """
+    content_types = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+    def get(self, request, export, file_format, compressed=None):
+        response = StreamingHttpResponse(
+            iter_export(export, file_format, compress=bool(compressed)),
+            content_type='application/gzip' if compressed else self.content_types[file_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export}.{file_format}{compressed or ""}"'
+        return response
 
 
 @method_decorator(login_required(login_url='/login/'), name='dispatch')